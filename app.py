@@ -1,187 +1,129 @@
-from flask import Flask, render_template, redirect, url_for, request, flash
-from flask_login import LoginManager, current_user, login_required
-from datetime import datetime
+from flask import Flask
+from flask_login import LoginManager
 import os
 
-# Initialize Flask app
-app = Flask(__name__)
-
-# ============================================
-# 🔧 DEPLOYMENT CONFIGURATION
-# ============================================
-# Check if running on Render (production) or local
-if os.environ.get('DATABASE_URL'):
-    # Production: Use PostgreSQL from Render
-    database_url = os.environ.get('DATABASE_URL')
-    # Fix postgres:// to postgresql:// (SQLAlchemy requirement)
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # Local development: Use SQLite
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hostelhub.db'
-
-# Use environment variable for SECRET_KEY in production
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
-# ============================================
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Import db from models FIRST
-from models import db
-
-# Initialize db with app
-db.init_app(app)
+from config import Config
+from models import db, User, Room, MaintenanceStaff
 
 # Initialize login manager
-login_manager = LoginManager(app)
+login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
-# Now import models
-from models import User, Student, Room, RoomAllocation, Complaint, Payment, Notification, AuditLog, MaintenanceStaff
-
 # User loader
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Import blueprints
-from routes.auth import auth_bp
-from routes.student import student_bp
-from routes.warden import warden_bp
-from routes.admin import admin_bp
-from routes.accountant import accountant_bp
-from routes.maintenance import maintenance_bp
-from routes.profile import profile_bp
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(student_bp, url_prefix='/student')
-app.register_blueprint(warden_bp, url_prefix='/warden')
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(accountant_bp, url_prefix='/accountant')
-app.register_blueprint(maintenance_bp, url_prefix='/maintenance')
-app.register_blueprint(profile_bp, url_prefix='/')
-
-# Home route
-@app.route('/')
-def index():
-    if current_user.is_authenticated:
-        if current_user.role == 'admin':
-            return redirect(url_for('admin.dashboard'))
-        elif current_user.role == 'warden':
-            return redirect(url_for('warden.dashboard'))
-        elif current_user.role == 'student':
-            return redirect(url_for('student.dashboard'))
-        elif current_user.role == 'accountant':
-            return redirect(url_for('accountant.dashboard'))
-        elif current_user.role == 'maintenance':
-            return redirect(url_for('maintenance.dashboard'))
-    return render_template('index.html')
-
-@app.route('/about')
-def about():
-    return render_template('about.html')
-
-@app.route('/contact', methods=['POST'])
-def contact():
-    name = request.form.get('name', '')
-    email = request.form.get('email', '')
-    message = request.form.get('message', '')
-    flash('Thank you for contacting us! We will get back to you soon.', 'success')
-    return redirect(url_for('about'))
-
-@app.route('/notifications')
-def notifications():
-    if not current_user.is_authenticated:
-        return redirect(url_for('auth.login'))
-    notifications = Notification.query.filter_by(
-        userid=current_user.userid
-    ).order_by(Notification.created_at.desc()).all()
-    return render_template('notifications.html', notifications=notifications)
-
-@app.route('/notification/read/<int:notification_id>')
-def mark_notification_read(notification_id):
-    if not current_user.is_authenticated:
-        return redirect(url_for('auth.login'))
-    notification = Notification.query.get_or_404(notification_id)
-    if notification.userid == current_user.userid:
-        notification.is_read = True
-        db.session.commit()
-    if notification.link:
-        return redirect(notification.link)
-    return redirect(url_for('notifications'))
-
-@app.route('/notifications/mark-all-read')
-@login_required
-def mark_all_read():
-    if not current_user.is_authenticated:
-        return redirect(url_for('auth.login'))
-    notifications = Notification.query.filter_by(
-        userid=current_user.userid,
-        is_read=False
-    ).all()
-    for notif in notifications:
-        notif.is_read = True
-    db.session.commit()
-    flash('✅ All notifications marked as read', 'success')
-    return redirect(url_for('notifications'))
-
-@app.route('/api/notifications/count')
-@login_required
-def notification_count_api():
-    count = Notification.query.filter_by(
-        userid=current_user.userid,
-        is_read=False
-    ).count()
-    from flask import jsonify
-    return jsonify({'count': count})
-
-@app.route('/receipt/<int:payment_id>')
-@login_required
-def generate_receipt(payment_id):
-    payment = Payment.query.get_or_404(payment_id)
+def create_app(config=None):
+    """Build the Flask app; heavy dependencies (reportlab, Flask-Mail) load on first use"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
     
-    # Verify payment belongs to current user or is admin/accountant
-    if current_user.role == 'student':
-        student = Student.query.filter_by(userid=current_user.userid).first()
-        if payment.studentid != student.studentid:
-            flash('Unauthorized access', 'danger')
-            return redirect(url_for('student.payments'))
-    elif current_user.role not in ['admin', 'accountant']:
-        flash('Unauthorized access', 'danger')
-        return redirect(url_for('index'))
+    # Engine/pool settings for server databases and the tuned SQLite profile
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('postgresql'):
+        from utils.db_engine import engine_options
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    elif uri.startswith('sqlite'):
+        from utils.sqlite_tuning import sqlite_engine_options, run_maintenance
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', sqlite_engine_options(app.config))
     
-    if payment.status != 'verified':
-        flash('Receipt can only be generated for verified payments', 'warning')
-        return redirect(url_for('student.payments'))
+    # Read-only views may be served by a replica bind
+    from utils.db_routing import REPLICA_BIND, init_routing
+    if app.config['REPLICA_DATABASE_URL']:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = app.config['REPLICA_DATABASE_URL']
     
-    from utils.pdf_generator import generate_payment_receipt
-    return generate_payment_receipt(payment)
-
-# Context processor for notifications
-@app.context_processor
-def inject_notifications():
-    if current_user.is_authenticated:
-        unread_count = Notification.query.filter_by(
-            userid=current_user.userid,
-            is_read=False
-        ).count()
-        return {'unread_notifications': unread_count}
-    return {'unread_notifications': 0}
-
-# Error handlers
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
+    # Initialize db with app
+    db.init_app(app)
+    init_routing(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'postgresql':
+                from utils.db_engine import install_engine_hooks
+                install_engine_hooks(engine, app.config)
+            elif engine.dialect.name == 'sqlite':
+                from utils.sqlite_tuning import install_sqlite_hooks
+                install_sqlite_hooks(engine, app.config)
+    
+    # Periodic WAL checkpoint + PRAGMA optimize
+    from utils.scheduler import start_periodic
+    if uri.startswith('sqlite'):
+        start_periodic(app, 'sqlite-maintenance', app.config['SQLITE_MAINTENANCE_INTERVAL'],
+                       lambda app: run_maintenance(db.engine))
+    login_manager.init_app(app)
+    
+    # Content-addressed uploads, streamed to disk while the request is read
+    from utils.attachments import init_attachments
+    init_attachments(app)
+    
+    # Batched complaint auto-assignment on a short tick
+    from utils.dispatcher import init_dispatcher
+    init_dispatcher(app)
+    
+    # SLA deadlines on new complaints and periodic escalation of breaches;
+    # importing complaint_events starts the status transition log
+    from utils.sla import init_sla
+    import utils.complaint_events  # noqa: F401
+    init_sla(app)
+    
+    # Near-duplicate complaint detection; prunes the similarity index's expired window
+    from utils.duplicates import init_duplicates
+    init_duplicates(app)
+    
+    # Compiled templates persist across workers and deploys
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        from jinja2 import FileSystemBytecodeCache
+        cache_dir = app.config['TEMPLATE_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    
+    # Fingerprinted static bundles (build with: flask --app app build-assets)
+    from utils.assets import init_assets
+    init_assets(app)
+    
+    # Initialize dashboard cache (invalidated when a write to a tagged table commits)
+    from utils.cache import cache
+    cache.init_app(app)
+    
+    # Import blueprints
+    from routes.main import register_main_routes
+    from routes.auth import auth_bp
+    from routes.student import student_bp
+    from routes.warden import warden_bp
+    from routes.admin import admin_bp
+    from routes.accountant import accountant_bp
+    from routes.maintenance import maintenance_bp
+    from routes.profile import profile_bp
+    
+    # Register blueprints
+    register_main_routes(app)
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(student_bp, url_prefix='/student')
+    app.register_blueprint(warden_bp, url_prefix='/warden')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(accountant_bp, url_prefix='/accountant')
+    app.register_blueprint(maintenance_bp, url_prefix='/maintenance')
+    app.register_blueprint(profile_bp, url_prefix='/')
+    
+    from cli import register_commands
+    register_commands(app)
+    
+    return app
 
-@app.errorhandler(500)
-def internal_error(error):
-    db.session.rollback()
-    return render_template('errors/500.html'), 500
+def __getattr__(name):
+    # `gunicorn app:app`, `flask --app app` and `from app import app` build the
+    # default app on first access instead of at import time
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_default_maintenance_staff():
     """Create maintenance staff members for each complaint category"""
@@ -209,6 +151,7 @@ def create_default_maintenance_staff():
 
 # Database initialization (LOCAL DEVELOPMENT ONLY)
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         print("🔨 Creating database...")
         db.create_all()
@@ -0,0 +1,90 @@
+# bench_sqlite.py - Multi-worker SQLite write throughput, default vs tuned profile
+#
+#   python bench_sqlite.py                    # 4 workers x 500 transactions
+#   python bench_sqlite.py --workers 8 --transactions 1000
+#
+# Each worker mimics create_notification + audit logging: a small read followed
+# by two inserts and a commit, on its own connection (like separate gunicorn workers).
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from config import Config
+from utils.sqlite_tuning import apply_pragmas
+
+SCHEMA = """
+CREATE TABLE notifications (notifid INTEGER PRIMARY KEY, userid INTEGER, title TEXT,
+                            message TEXT, is_read BOOLEAN, created_at TEXT);
+CREATE TABLE audit_logs (logid INTEGER PRIMARY KEY, userid INTEGER, action TEXT,
+                         details TEXT, timestamp TEXT);
+"""
+
+
+def tuned_config():
+    return {key: getattr(Config, key) for key in dir(Config) if key.startswith('SQLITE_')}
+
+
+def worker(path, profile, transactions, worker_id, results):
+    conn = sqlite3.connect(path, timeout=5.0)
+    if profile == 'tuned':
+        apply_pragmas(conn, tuned_config())
+    locked = 0
+    for i in range(transactions):
+        try:
+            conn.execute("SELECT COUNT(*) FROM notifications WHERE userid = ? AND is_read = 0", (worker_id,)).fetchone()
+            conn.execute("INSERT INTO notifications (userid, title, message, is_read, created_at) "
+                         "VALUES (?, 'Payment', 'New payment submitted', 0, datetime('now'))", (worker_id,))
+            conn.execute("INSERT INTO audit_logs (userid, action, details, timestamp) "
+                         "VALUES (?, 'payment_submitted', 'bench', datetime('now'))", (worker_id,))
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            conn.rollback()
+            locked += 1
+    conn.close()
+    results.put(locked)
+
+
+def run(profile, workers, transactions):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.db')
+    setup = sqlite3.connect(path)
+    setup.executescript(SCHEMA)
+    if profile == 'tuned':
+        apply_pragmas(setup, tuned_config())
+    setup.close()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(path, profile, transactions, w, results))
+             for w in range(workers)]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    locked = sum(results.get() for _ in procs)
+    committed = workers * transactions - locked
+    return elapsed, committed, locked
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-worker SQLite write benchmark')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--transactions', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"🔨 {args.workers} workers x {args.transactions} write transactions")
+    for profile in ('default', 'tuned'):
+        elapsed, committed, locked = run(profile, args.workers, args.transactions)
+        print(f"   {profile:8} {elapsed:7.2f} s  {committed / elapsed:8.0f} commits/s  {locked} 'database is locked' errors")
+
+
+if __name__ == '__main__':
+    main()
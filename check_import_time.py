@@ -0,0 +1,53 @@
+# check_import_time.py - Cold-start budget check (run in CI / before deploy)
+#
+#   python check_import_time.py            # budget from IMPORT_TIME_BUDGET_MS
+#   python check_import_time.py 600        # explicit budget in milliseconds
+#
+# Runs `python -X importtime` on a fresh interpreter that imports the app and
+# builds it with create_app(), then fails if the total import time is over budget.
+
+import subprocess
+import sys
+
+from config import Config
+
+STARTUP = "import app; app.create_app()"
+
+
+def measure_import_time():
+    """Return (total_ms, slowest top-level imports) for a cold app start"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        capture_output=True, text=True, check=True
+    )
+    total_us = 0
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only top-level imports: their cumulative time already includes children
+        if not name.startswith('  '):
+            total_us += int(cumulative)
+            imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    return total_us / 1000, imports[:10]
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else Config.IMPORT_TIME_BUDGET_MS
+    total_ms, slowest = measure_import_time()
+
+    print(f"⏱️  Cold start import time: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)")
+    for cumulative_us, name in slowest:
+        print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if total_ms > budget_ms:
+        print("❌ Import time budget exceeded")
+        return 1
+    print("✅ Within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
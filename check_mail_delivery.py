@@ -0,0 +1,75 @@
+# check_mail_delivery.py - End-to-end check of batched, pooled email delivery
+#
+#   python check_mail_delivery.py              # 120 messages in batches of 25
+#   python check_mail_delivery.py 500 50       # explicit message count and batch size
+#
+# Starts a local aiosmtpd server (pip install aiosmtpd), queues messages on a
+# MailDispatcher inside a `with` block and fails unless every one arrives.
+
+import socket
+import sys
+import threading
+
+from flask import Flask
+
+from config import Config
+
+
+class Inbox:
+    """aiosmtpd handler that keeps the recipients of every delivered message"""
+
+    def __init__(self):
+        self.recipients = []
+        self._lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.recipients.extend(envelope.rcpt_tos)
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    try:
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("❌ aiosmtpd is not installed (pip install aiosmtpd)")
+        return 1
+
+    inbox = Inbox()
+    port = free_port()
+    controller = Controller(inbox, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False,
+                          MAIL_USERNAME=None, MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False)
+        from utils.mailer import MailDispatcher
+        with app.app_context():
+            with MailDispatcher(batch_size=batch_size) as dispatcher:
+                for i in range(count):
+                    dispatcher.queue(f'student{i}@example.com', f'Check {i}', 'Delivery check')
+    finally:
+        controller.stop()
+
+    expected = {f'student{i}@example.com' for i in range(count)}
+    delivered = set(inbox.recipients) & expected
+    print(f"📬 {len(delivered)} of {count} messages delivered in {len(dispatcher.stats)} batch(es), "
+          f"{len(dispatcher.failed)} failed")
+    if delivered != expected or dispatcher.failed:
+        print("❌ Delivery check failed")
+        return 1
+    print("✅ All messages delivered")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import click
+from flask import current_app
+
+
+def register_commands(app):
+    """Attach the `flask --app app <command>` maintenance commands"""
+
+    # Run from a scheduler (e.g. cron every hour): flask --app app send-notification-digests
+    @app.cli.command('send-notification-digests')
+    def send_notification_digests_command():
+        """Email staff a digest of their unread notifications"""
+        from utils.notifications import send_notification_digests
+        if not current_app.config['NOTIFICATION_EMAIL_DIGEST']:
+            print("ℹ️  Email digests are disabled (set NOTIFICATION_EMAIL_DIGEST=true)")
+            return
+        sent = send_notification_digests()
+        print(f"✅ Sent {sent} notification digest(s)")
+
+    # Run from a scheduler (e.g. cron on the 1st of each month): flask --app app run-billing
+    @app.cli.command('run-billing')
+    @click.option('--month', 'period', help='Month to bill as YYYY-MM (default: the current month)')
+    def run_billing_command(period):
+        """Raise the month's rent bills for every occupied room (students already billed are skipped)"""
+        from datetime import date
+        from utils.billing import run_billing, parse_period
+        from utils.audit import log_billing_run
+        try:
+            year, month = parse_period(period) if period else (date.today().year, date.today().month)
+        except ValueError:
+            raise click.BadParameter('use YYYY-MM', param_hint='--month')
+        run = run_billing(year, month, current_app.config['BILLING_CHUNK_SIZE'])
+        log_billing_run(run)
+        print(f"✅ {run.billed} rent bill(s) raised for {run.label} (₹{run.total:,.2f}), "
+              f"{run.skipped} student(s) with nothing to bill")
+
+    # Run at build time, after the code is in place and before workers start
+    @app.cli.command('precompile-templates')
+    def precompile_templates_command():
+        """Compile every template into the Jinja bytecode cache"""
+        from jinja2 import TemplateSyntaxError
+        env = current_app.jinja_env
+        if env.bytecode_cache is None:
+            print("ℹ️  Template bytecode cache is disabled (TEMPLATE_BYTECODE_CACHE=false)")
+            return
+        compiled, failed = 0, 0
+        for name in env.list_templates(extensions=['html']):
+            try:
+                env.get_template(name)
+                compiled += 1
+            except TemplateSyntaxError as e:
+                print(f"❌ {name}:{e.lineno}: {e.message}")
+                failed += 1
+        print(f"✅ Precompiled {compiled} template(s), {failed} failed")
+
+    @app.cli.command('sqlite-maintenance')
+    def sqlite_maintenance_command():
+        """Truncate the SQLite WAL and run PRAGMA optimize"""
+        from models import db
+        from utils.sqlite_tuning import run_maintenance
+        if db.engine.dialect.name != 'sqlite':
+            print("ℹ️  Not a SQLite database, nothing to do")
+            return
+        result = run_maintenance(db.engine, checkpoint='TRUNCATE')
+        print(f"✅ Checkpointed {result['checkpointed']}/{result['log_frames']} WAL frames")
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Bundle, minify, fingerprint and precompress static assets"""
+        from utils.assets import build_assets
+        manifest = build_assets(current_app.static_folder)
+        for name, filename in manifest.items():
+            print(f"✅ {name} -> dist/{filename}")
+
+    # Run from a scheduler (e.g. nightly cron): flask --app app backup-db
+    @app.cli.command('backup-db')
+    def backup_db_command():
+        """Snapshot the database into the backup store and apply retention"""
+        from models import db
+        from utils.backup import BackupStore
+        store = BackupStore(current_app.config['BACKUP_DIR'], current_app.config)
+        backup = store.create(db.engine)
+        removed, freed = store.prune()
+        print(f"✅ {backup['id']}: {backup['size'] / 1024:.2f} KB, {backup['stored'] / 1024:.2f} KB new "
+              f"({backup['chunks']} chunks, sha256 {backup['sha256'][:12]})")
+        print(f"🧹 Pruned {removed} backup(s), freed {freed / 1024:.2f} KB")
+
+    @app.cli.command('import-backups')
+    def import_backups_command():
+        """Move standalone .db / .db.gz / .sql.gz backups into the chunk store"""
+        import os
+        from utils.backup import BackupStore
+        backup_dir = current_app.config['BACKUP_DIR']
+        store = BackupStore(backup_dir, current_app.config)
+        for filename in sorted(os.listdir(backup_dir)):
+            if not filename.endswith(('.db', '.db.gz', '.sql.gz')):
+                continue
+            path = os.path.join(backup_dir, filename)
+            backup = store.import_file(path, 'sql' if filename.endswith('.sql.gz') else 'sqlite')
+            os.remove(path)
+            if os.path.exists(path + '.sha256'):
+                os.remove(path + '.sha256')
+            print(f"✅ {filename} -> {backup['id']} ({backup['stored'] / 1024:.2f} KB new)")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Create the complaint full-text index and re-index every complaint"""
+        from models import db
+        from utils.search import install_search_index
+        with db.engine.begin() as connection:
+            install_search_index(connection, rebuild=True)
+        print("✅ Complaint search index rebuilt")
+
+    @app.cli.command('rebuild-directory-index')
+    def rebuild_directory_index_command():
+        """Rebuild the user/student directory search index"""
+        from models import db
+        from utils.directory import rebuild_directory_index
+        with db.engine.begin() as connection:
+            count = rebuild_directory_index(connection)
+        print(f"✅ Directory search index rebuilt ({count} users indexed)")
+
+    @app.cli.command('normalize-complaint-priorities')
+    def normalize_complaint_priorities_command():
+        """Lowercase legacy complaint priorities and fill in their queue rank"""
+        from models import db
+        from utils.work_queue import normalize_priorities
+        with db.engine.begin() as connection:
+            count = normalize_priorities(connection)
+        print(f"✅ Normalized priority on {count} complaint(s)")
+
+    @app.cli.command('dispatch-complaints')
+    def dispatch_complaints_command():
+        """Assign every waiting complaint to the least-loaded matching staff member"""
+        from utils.dispatcher import dispatch_pending
+        total = 0
+        while True:
+            assigned = dispatch_pending(current_app.config)
+            total += assigned
+            if not assigned:
+                break
+        print(f"✅ Dispatched {total} complaint(s)")
+
+    @app.cli.command('escalate-complaints')
+    def escalate_complaints_command():
+        """Escalate every complaint past its SLA deadline and notify wardens"""
+        from utils.sla import escalate_breaches
+        total = 0
+        while True:
+            escalated = escalate_breaches(current_app.config)
+            total += escalated
+            if not escalated:
+                break
+        print(f"✅ Escalated {total} complaint(s)")
+
+    @app.cli.command('backfill-complaint-sla')
+    def backfill_complaint_sla_command():
+        """Give unresolved complaints lodged before SLAs existed a deadline"""
+        from models import db
+        from utils.sla import backfill_due_dates
+        with db.engine.begin() as connection:
+            count = backfill_due_dates(connection)
+        print(f"✅ Set SLA deadlines on {count} complaint(s)")
+
+    @app.cli.command('backfill-complaint-events')
+    def backfill_complaint_events_command():
+        """Seed the complaint event log for complaints lodged before it existed"""
+        from models import db
+        from utils.complaint_events import backfill_events
+        with db.engine.begin() as connection:
+            count = backfill_events(connection)
+        print(f"✅ Backfilled events for {count} complaint(s)")
+
+    @app.cli.command('backfill-complaint-signatures')
+    def backfill_complaint_signatures_command():
+        """Compute similarity signatures for complaints lodged before duplicate detection existed"""
+        from models import db
+        from utils.duplicates import backfill_signatures
+        with db.engine.begin() as connection:
+            count = backfill_signatures(connection)
+        print(f"✅ Computed signatures for {count} complaint(s)")
+
+    # Started by each upload on the import page; also safe to run from cron to pick up stragglers
+    @app.cli.command('run-import-jobs')
+    def run_import_jobs_command():
+        """Run queued CSV imports"""
+        from utils.importer import run_import_jobs
+        count = run_import_jobs()
+        print(f"✅ Ran {count} import job(s)")
+
+    # e.g. flask --app app reconcile-statement statements/june.csv
+    @app.cli.command('reconcile-statement')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--no-verify', is_flag=True, help='Queue exact matches for review instead of verifying them')
+    def reconcile_statement_command(path, no_verify):
+        """Match a bank statement (CSV or OFX) against submitted payments"""
+        from utils.reconciliation import reconcile_statement
+        kind = 'csv' if path.lower().endswith('.csv') else 'ofx'
+        with open(path, 'rb') as stream:
+            report = reconcile_statement(stream, kind, current_app.config, auto_verify=not no_verify)
+        print(f"✅ {report.rows} line(s): {report.verified} verified, {report.review} queued for review, "
+              f"{report.unmatched} unmatched, {report.duplicates} already imported, {report.failed} unreadable")
+
+    @app.cli.command('backfill-ledger')
+    def backfill_ledger_command():
+        """Post ledger entries for payments raised before the ledger existed and rebuild balances"""
+        from models import db
+        from utils.ledger import backfill_ledger
+        with db.engine.begin() as connection:
+            count = backfill_ledger(connection)
+        print(f"✅ Posted ledger entries for {count} payment(s)")
+
+    # Run from a scheduler (e.g. cron nightly): flask --app app reconcile-ledger
+    @app.cli.command('reconcile-ledger')
+    @click.option('--fix', is_flag=True, help='Overwrite stored balances that disagree with the ledger')
+    def reconcile_ledger_command(fix):
+        """Check every student and account balance against the ledger entries"""
+        from models import db
+        from utils.ledger import reconcile_balances
+        with db.engine.begin() as connection:
+            mismatches = reconcile_balances(connection, fix=fix)
+        for kind, key, diff in mismatches[:50]:
+            print(f"  {kind} {key}: " + ', '.join(f"{column} stored {have}, ledger {want}"
+                                                  for column, (have, want) in diff.items()))
+        if not mismatches:
+            print("✅ All balances agree with the ledger")
+        else:
+            print(f"{'✅ Fixed' if fix else '⚠️  Found'} {len(mismatches)} balance mismatch(es)")
+            if not fix:
+                raise SystemExit(1)
@@ -0,0 +1,153 @@
+import os
+
+
+def _database_url(name='DATABASE_URL', default='sqlite:///hostelhub.db'):
+    # Check if running on Render (production) or local
+    database_url = os.environ.get(name)
+    if not database_url:
+        # Local development: Use SQLite
+        return default
+    # Fix postgres:// to postgresql:// (SQLAlchemy requirement)
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+
+def _flag(name, default='false'):
+    return os.environ.get(name, default).lower() == 'true'
+
+
+class Config:
+    """Default configuration, read from the environment"""
+
+    # ============================================
+    # 🔧 DEPLOYMENT CONFIGURATION
+    # ============================================
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    # Use environment variable for SECRET_KEY in production
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here-change-in-production')
+    # ============================================
+
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # PostgreSQL connection pool (per gunicorn worker); see utils.db_engine
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING = _flag('DB_POOL_PRE_PING', 'true')
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))  # 0 disables
+    DB_PGBOUNCER = _flag('DB_PGBOUNCER')  # PgBouncer in transaction pooling mode
+    # Read replica for @read_only views (utils.db_routing); unset = everything on the primary
+    REPLICA_DATABASE_URL = _database_url('REPLICA_DATABASE_URL', None)
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))  # Seconds behind before falling back
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 2))
+    REPLICA_RYW_WINDOW = float(os.environ.get('REPLICA_RYW_WINDOW', 10))  # Seconds on primary after own write
+    # SQLite production profile (utils.sqlite_tuning), applied on every new connection
+    SQLITE_WAL = _flag('SQLITE_WAL', 'true')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # Negative = KiB
+    SQLITE_MAINTENANCE_INTERVAL = int(os.environ.get('SQLITE_MAINTENANCE_INTERVAL', 600))  # Seconds, 0 disables
+
+    # Database backups (utils.backup): store directory, online-backup pages per step and pause between steps
+    BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+    BACKUP_STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES', 256))
+    BACKUP_STEP_SLEEP = float(os.environ.get('BACKUP_STEP_SLEEP', 0.01))
+    BACKUP_CHUNK_PAGES = int(os.environ.get('BACKUP_CHUNK_PAGES', 16))  # SQLite pages per deduplicated chunk
+    # Grandfather-father-son retention: every backup of the last N hours, then the
+    # newest backup of each of the last N days / weeks / months
+    BACKUP_KEEP_HOURS = int(os.environ.get('BACKUP_KEEP_HOURS', 24))
+    BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 7))
+    BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY', 4))
+    BACKUP_KEEP_MONTHLY = int(os.environ.get('BACKUP_KEEP_MONTHLY', 12))
+
+    # Bulk CSV import (utils.importer): rows per insert/commit batch, password hashing processes (0 = one per CPU)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', 0))
+    # Uploads wait here until `flask run-import-jobs` (started per upload, or from cron) picks them up
+    IMPORT_DIR = os.environ.get('IMPORT_DIR', 'imports')
+    IMPORT_REPORT_ERRORS = int(os.environ.get('IMPORT_REPORT_ERRORS', 500))  # Row errors kept per job report
+
+    # Bank statement reconciliation (utils.reconciliation): lines per insert/verify batch, how many days a
+    # statement date may be from the submitted payment date, and the share of the payer's name words
+    # that must appear on the line for a fuzzy match
+    RECONCILE_CHUNK_SIZE = int(os.environ.get('RECONCILE_CHUNK_SIZE', 1000))
+    RECONCILE_DATE_WINDOW_DAYS = int(os.environ.get('RECONCILE_DATE_WINDOW_DAYS', 3))
+    RECONCILE_NAME_THRESHOLD = float(os.environ.get('RECONCILE_NAME_THRESHOLD', 0.6))
+
+    # Uploaded attachments (utils.attachments): content-addressed store directory, per-file size limit,
+    # how files are sent ('flask', 'x-accel' behind nginx, 'x-sendfile' behind Apache/lighttpd),
+    # the nginx internal location mapped to ATTACHMENT_DIR, and thumbnail size / worker threads
+    ATTACHMENT_DIR = os.environ.get('ATTACHMENT_DIR', 'attachments')
+    ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', 5 * 1024 * 1024))
+    ATTACHMENT_SERVE = os.environ.get('ATTACHMENT_SERVE', 'flask')
+    ATTACHMENT_ACCEL_PREFIX = os.environ.get('ATTACHMENT_ACCEL_PREFIX', '/_attachments/')
+    ATTACHMENT_THUMBNAIL_SIZE = int(os.environ.get('ATTACHMENT_THUMBNAIL_SIZE', 320))
+    ATTACHMENT_THUMBNAIL_WORKERS = int(os.environ.get('ATTACHMENT_THUMBNAIL_WORKERS', 2))
+
+    # Duplicate complaint detection (utils.duplicates): how far back to look, minimum estimated
+    # similarity (0-1) to flag, and seconds between pruning expired index entries
+    DUPLICATE_WINDOW_HOURS = float(os.environ.get('DUPLICATE_WINDOW_HOURS', 48))
+    DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.5))
+    DUPLICATE_PRUNE_INTERVAL = float(os.environ.get('DUPLICATE_PRUNE_INTERVAL', 3600))
+
+    # Complaint auto-dispatch (utils.dispatcher): tick seconds (0 disables), complaints per tick,
+    # seconds between workload heap rebuilds, and whether open complaints skip warden forwarding
+    DISPATCH_INTERVAL = float(os.environ.get('DISPATCH_INTERVAL', 5))
+    DISPATCH_BATCH_SIZE = int(os.environ.get('DISPATCH_BATCH_SIZE', 200))
+    DISPATCH_REBUILD_INTERVAL = float(os.environ.get('DISPATCH_REBUILD_INTERVAL', 300))
+    DISPATCH_OPEN_COMPLAINTS = _flag('DISPATCH_OPEN_COMPLAINTS', 'false')  # opt-in: bypasses warden triage
+
+    # Complaint resolution SLA (utils.sla): hours allowed per priority, and seconds between breach checks
+    SLA_HOURS = {
+        'urgent': float(os.environ.get('SLA_HOURS_URGENT', 4)),
+        'high': float(os.environ.get('SLA_HOURS_HIGH', 24)),
+        'medium': float(os.environ.get('SLA_HOURS_MEDIUM', 72)),
+        'low': float(os.environ.get('SLA_HOURS_LOW', 168)),
+    }
+    SLA_CHECK_INTERVAL = float(os.environ.get('SLA_CHECK_INTERVAL', 60))
+    SLA_BATCH_SIZE = int(os.environ.get('SLA_BATCH_SIZE', 500))
+
+    # Monthly rent billing (utils.billing): allocations per insert/commit batch
+    BILLING_CHUNK_SIZE = int(os.environ.get('BILLING_CHUNK_SIZE', 1000))
+
+    # Background tasks run inside each worker (utils.scheduler)
+    SCHEDULER_ENABLED = _flag('SCHEDULER_ENABLED', 'true')
+
+    # Token required by /metrics (unset = metrics endpoint disabled)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+
+    # Email (Flask-Mail)
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = _flag('MAIL_USE_TLS')
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@hostelhub.com')
+    # Batched delivery (utils.mailer): messages per batch, pooled SMTP connections, max messages/sec (0 = unlimited)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE', 50))
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE', 2))
+    MAIL_POOL_TIMEOUT = int(os.environ.get('MAIL_POOL_TIMEOUT', 30))  # seconds a batch waits for a free connection
+    MAIL_RATE_LIMIT = float(os.environ.get('MAIL_RATE_LIMIT', 0))
+
+    # Notification coalescing: merge same-kind events per recipient within this many seconds (0 disables)
+    NOTIFICATION_COALESCE_WINDOW = int(os.environ.get('NOTIFICATION_COALESCE_WINDOW', 900))
+    # Periodic email digest of unread notifications for staff accounts
+    NOTIFICATION_EMAIL_DIGEST = _flag('NOTIFICATION_EMAIL_DIGEST')
+
+    # Dashboard cache: per-worker LRU size, entry TTL in seconds, optional shared Redis backend
+    CACHE_LOCAL_SIZE = int(os.environ.get('CACHE_LOCAL_SIZE', 256))
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', 300))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    # Worker processes (gunicorn reads the same variable); more than one requires CACHE_REDIS_URL for caching
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+    # Jinja bytecode cache shared by all workers (precompile with: flask --app app precompile-templates)
+    TEMPLATE_BYTECODE_CACHE = _flag('TEMPLATE_BYTECODE_CACHE', 'true')
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # Defaults to instance/jinja_cache
+
+    # Cold-start budget for `python check_import_time.py` (milliseconds)
+    IMPORT_TIME_BUDGET_MS = int(os.environ.get('IMPORT_TIME_BUDGET_MS', 1000))
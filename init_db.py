@@ -4,8 +4,63 @@ from app import app, db
 from models import User, Student, Room, RoomAllocation, Complaint, Payment, MaintenanceStaff, Notification
 from werkzeug.security import generate_password_hash
 from datetime import datetime
+from sqlalchemy import inspect, literal, text
 import os
 
+# Backfills for columns added to existing tables, beyond their column default
+# (rows raised before billing existed were all approval payments)
+COLUMN_BACKFILLS = {
+    ('payments', 'payment_type'): "UPDATE payments SET payment_type = 'rent_and_deposit'",
+    ('payments', 'updated_at'): "UPDATE payments SET updated_at = COALESCE(verification_date, created_at)",
+    ('complaints', 'updated_at'): "UPDATE complaints SET updated_at = COALESCE(resolvedat, created_at)",
+    ('complaints', 'status_changed_at'): "UPDATE complaints SET status_changed_at = COALESCE(resolvedat, created_at)",
+}
+
+def upgrade_existing_tables(connection):
+    """Add columns and indexes that create_all() skips on tables that already exist; safe to re-run.
+
+    NOT NULL columns are added with their default so existing rows satisfy the
+    constraint; nullable ones are backfilled from COLUMN_BACKFILLS or their
+    default. Returns the 'table.column' names added.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    preparer = connection.dialect.identifier_preparer
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all() built it complete
+        present = {column['name'] for column in inspector.get_columns(table.name)}
+        backfills = []  # run once the table has all its columns (updates touch onupdate columns)
+        for column in table.columns:
+            if column.name in present:
+                continue
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            ddl = f'{preparer.format_column(column)} {column.type.compile(dialect=connection.dialect)}'
+            if not column.nullable:
+                ddl += ' NOT NULL DEFAULT ' + str(literal(default).compile(
+                    dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+            for fk in column.foreign_keys:
+                ddl += f' REFERENCES {preparer.quote(fk.column.table.name)} ({preparer.quote(fk.column.name)})'
+            connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}'))
+            added.append(f'{table.name}.{column.name}')
+            if (table.name, column.name) in COLUMN_BACKFILLS:
+                backfills.append(text(COLUMN_BACKFILLS[table.name, column.name]))
+            elif (table.name, column.name) == ('complaints', 'priority_rank'):
+                from utils.work_queue import normalize_priorities
+                backfills.append(normalize_priorities)  # rank from each row's priority
+            elif column.nullable and default is not None:
+                backfills.append(text(f'UPDATE {preparer.format_table(table)} SET {preparer.format_column(column)} = :value')
+                                 .bindparams(value=default))
+        for backfill in backfills:
+            if callable(backfill):
+                backfill(connection)
+            else:
+                connection.execute(backfill)
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    return added
+
 def init_database():
     """Initialize database with tables (ONLY if they don't exist) and default users"""
     
@@ -16,6 +71,26 @@ def init_database():
         db.create_all()
         print("✅ All tables ensured to exist!")
         
+        # Columns and indexes added to tables that already existed (create_all skips them)
+        with db.engine.begin() as connection:
+            added = upgrade_existing_tables(connection)
+        if added:
+            print(f"✅ Added columns: {', '.join(added)}")
+            print("ℹ️  Run the backfill commands for existing data: flask backfill-complaint-sla, "
+                  "backfill-complaint-events, backfill-complaint-signatures, backfill-ledger")
+        print("✅ Existing tables upgraded!")
+        
+        # Complaint full-text index (new tables get it from create_all; existing ones need it added)
+        from utils.search import install_search_index
+        with db.engine.begin() as connection:
+            install_search_index(connection)
+        print("✅ Complaint search index ensured!")
+        
+        from utils.directory import install_directory_index
+        with db.engine.begin() as connection:
+            install_directory_index(connection)
+        print("✅ Directory search index ensured!")
+        
         # Check if database is empty (no users exist)
         user_count = User.query.count()
         
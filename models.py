@@ -1,9 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+import json
 from datetime import datetime
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
+from utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # ============= MAINTENANCE STAFF TABLE =============
 class MaintenanceStaff(db.Model):
@@ -28,6 +31,7 @@ class User(UserMixin, db.Model):
     role = db.Column(db.String(20), nullable=False)
     is_active = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    profile_picture = db.Column(db.String(200))  # Attachment store key (utils.attachments)
     
     # Relationships
     notifications = db.relationship('Notification', backref='user', lazy=True, foreign_keys='Notification.userid')
@@ -62,6 +66,10 @@ class Student(db.Model):
     user = db.relationship('User', backref='student', uselist=False)
     allocations = db.relationship('RoomAllocation', backref='student', lazy=True)
     payments = db.relationship('Payment', backref='student', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_students_userid', 'userid'),  # User -> Student lookups (directory search)
+    )
     complaints = db.relationship('Complaint', backref='student', lazy=True)
 
 # ============= ROOM TABLE =============
@@ -117,8 +125,10 @@ class Payment(db.Model):
     transactionid = db.Column(db.String(100))
     status = db.Column(db.String(20), default='pending')  # ✅ FIXED DEFAULT
     receiptpath = db.Column(db.String(200))
-    month = db.Column(db.String(20))
+    month = db.Column(db.String(20))  # Month name ('June') of the period billed
     year = db.Column(db.Integer)
+    # rent_and_deposit (raised on approval, covers its month) or monthly_rent (utils.billing)
+    payment_type = db.Column(db.String(30), default='monthly_rent')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # ✅ NEW FIELDS FOR PAYMENT SUBMISSION:
@@ -131,8 +141,90 @@ class Payment(db.Model):
     verified_by = db.Column(db.Integer, db.ForeignKey('users.userid'))  # Accountant who verified
     verification_date = db.Column(db.DateTime)  # When verified
     rejection_reason = db.Column(db.Text)  # Why rejected (if rejected)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Conditional GET validator
+    
+    # Reconciliation looks payments up by bank reference, and submissions are checked for reuse
+    __table_args__ = (
+        db.Index('ix_payments_transactionid', 'transactionid'),
+        # The billing run's "already billed this month?" check; overlapping runs
+        # cannot raise a second monthly rent bill (utils.billing)
+        db.Index('ix_payments_student_period', 'studentid', 'year', 'month'),
+        db.Index('uq_payments_monthly_rent', 'studentid', 'year', 'month', unique=True,
+                 sqlite_where=db.text("payment_type = 'monthly_rent'"),
+                 postgresql_where=db.text("payment_type = 'monthly_rent'")),
+    )
+
+# ============= LEDGER =============
+class LedgerEntry(db.Model):
+    """One double-entry posting: `amount` moves from credit_account to debit_account (utils.ledger)"""
+    __tablename__ = 'ledger_entries'
+    
+    entryid = db.Column(db.Integer, primary_key=True)
+    studentid = db.Column(db.Integer, db.ForeignKey('students.studentid'), nullable=False)
+    paymentid = db.Column(db.Integer, db.ForeignKey('payments.paymentid'))
+    entry_type = db.Column(db.String(20), nullable=False)  # charge, deposit, payment, refund
+    debit_account = db.Column(db.String(30), nullable=False)
+    credit_account = db.Column(db.String(30), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    memo = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_ledger_entries_student', 'studentid', 'entryid'),
+        db.Index('ix_ledger_entries_payment', 'paymentid'),
+    )
+
+class StudentBalance(db.Model):
+    """A student's running totals, maintained with every posting so dues are a one-row read"""
+    __tablename__ = 'student_balances'
+    
+    studentid = db.Column(db.Integer, db.ForeignKey('students.studentid'), primary_key=True)
+    balance = db.Column(db.Float, nullable=False, default=0)  # Owed: charges less payments received
+    deposit_held = db.Column(db.Float, nullable=False, default=0)  # Security deposits billed, not refunded
+    submitted = db.Column(db.Float, nullable=False, default=0)  # Payments submitted, awaiting verification
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class LedgerAccount(db.Model):
+    """Running balance (debits less credits) of each ledger account"""
+    __tablename__ = 'ledger_accounts'
+    
+    account = db.Column(db.String(30), primary_key=True)
+    balance = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# ============= BANK STATEMENT LINES =============
+class BankStatementLine(db.Model):
+    """One credit from an imported bank statement and what reconciliation made of it (utils.reconciliation)"""
+    __tablename__ = 'bank_statement_lines'
+    
+    lineid = db.Column(db.Integer, primary_key=True)
+    import_id = db.Column(db.String(32), nullable=False)  # One per uploaded statement
+    fingerprint = db.Column(db.String(64), nullable=False, unique=True)  # Re-imported lines are skipped
+    posted_date = db.Column(db.Date)
+    amount = db.Column(db.Float, nullable=False)
+    transactionid = db.Column(db.String(100))
+    payer_name = db.Column(db.String(200))
+    description = db.Column(db.Text)
+    # matched (verified automatically or on review), review (candidates queued), unmatched, ignored
+    status = db.Column(db.String(20), nullable=False, default='unmatched')
+    match_type = db.Column(db.String(20))  # transaction, fuzzy, manual
+    paymentid = db.Column(db.Integer, db.ForeignKey('payments.paymentid'))
+    candidate_ids = db.Column(db.String(200))  # Comma-separated payment ids offered for review
+    note = db.Column(db.String(200))
+    reviewed_by = db.Column(db.Integer, db.ForeignKey('users.userid'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    payment = db.relationship('Payment', backref='statement_lines')
+    
+    __table_args__ = (
+        db.Index('ix_bank_statement_lines_status', 'status', 'lineid'),
+    )
 
 # ============= COMPLAINT TABLE =============
+# Work-queue order: lower rank is served first
+PRIORITY_RANKS = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
 class Complaint(db.Model):
     __tablename__ = 'complaints'
     
@@ -146,20 +238,94 @@ class Complaint(db.Model):
     category = db.Column(db.String(50))  # ✅ ADD THIS
     description = db.Column(db.Text, nullable=False)
     location = db.Column(db.String(200))  # ✅ ADD THIS
-    attachment = db.Column(db.String(200))  # ✅ ADD THIS for file uploads
+    attachment = db.Column(db.String(200))  # Attachment store key (older rows: path under static/)
     
     # Status fields
     status = db.Column(db.String(20), default='open')
     priority = db.Column(db.String(20), default='medium')
+    priority_rank = db.Column(db.SmallInteger, default=PRIORITY_RANKS['medium'], nullable=False)
     
     # Assignment & Resolution
     assigned_staff_id = db.Column(db.Integer, db.ForeignKey('maintenance_staff.staff_id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     resolvedat = db.Column(db.DateTime)
     resolutionnotes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Conditional GET validator
+    due_at = db.Column(db.DateTime)  # Resolution deadline from the priority's SLA (utils.sla)
+    escalated_at = db.Column(db.DateTime)  # When the deadline passed unresolved
+    
+    # Time spent in each status so far, kept up to date on every transition (utils.complaint_events)
+    status_changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    open_seconds = db.Column(db.Integer, default=0, nullable=False)
+    forwarded_seconds = db.Column(db.Integer, default=0, nullable=False)
+    assigned_seconds = db.Column(db.Integer, default=0, nullable=False)
+    in_progress_seconds = db.Column(db.Integer, default=0, nullable=False)
+    resolution_seconds = db.Column(db.Integer)  # Lodged -> resolved
+    
+    # Near-duplicate detection (utils.duplicates): MinHash of title + description, and the
+    # complaint this one looks like (suspected until status becomes 'merged')
+    minhash = db.Column(db.LargeBinary)
+    duplicate_of = db.Column(db.Integer, db.ForeignKey('complaints.complaintid'))
     
     # Relationships
     staff = db.relationship('MaintenanceStaff', backref='complaints')
+    primary = db.relationship('Complaint', remote_side=[complaintid], backref='duplicates')
+    
+    # Search facets and the default newest-first listing (full-text index: utils.search)
+    __table_args__ = (
+        db.Index('ix_complaints_status_created', 'status', 'created_at'),
+        db.Index('ix_complaints_category_created', 'category', 'created_at'),
+        db.Index('ix_complaints_created', 'created_at'),
+        # Per-staff work queue, most urgent then oldest first (utils.work_queue)
+        db.Index('ix_complaints_staff_queue', 'assigned_staff_id', 'priority_rank', 'created_at'),
+        # Only complaints still on the SLA clock, in deadline order (utils.sla)
+        db.Index('ix_complaints_sla_pending', 'due_at',
+                 sqlite_where=db.text('escalated_at IS NULL AND resolvedat IS NULL'),
+                 postgresql_where=db.text('escalated_at IS NULL AND resolvedat IS NULL')),
+    )
+
+    @validates('priority')
+    def _normalize_priority(self, key, value):
+        # Stored lowercase ('High' and 'high' used to be different priorities)
+        value = (value or 'medium').strip().lower()
+        if value not in PRIORITY_RANKS:
+            value = 'medium'
+        self.priority_rank = PRIORITY_RANKS[value]
+        return value
+
+# ============= COMPLAINT EVENT LOG =============
+class ComplaintEvent(db.Model):
+    """One row per complaint status transition (from_status is NULL when lodged)"""
+    __tablename__ = 'complaint_events'
+    
+    eventid = db.Column(db.Integer, primary_key=True)
+    complaintid = db.Column(db.Integer, db.ForeignKey('complaints.complaintid'), nullable=False)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    staff_id = db.Column(db.Integer, db.ForeignKey('maintenance_staff.staff_id'))  # Assignee at the time
+    actor_userid = db.Column(db.Integer, db.ForeignKey('users.userid'))  # NULL for the dispatcher
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    complaint = db.relationship('Complaint', backref=db.backref('events', lazy='dynamic',
+                                                                order_by='ComplaintEvent.created_at'))
+    
+    __table_args__ = (
+        db.Index('ix_complaint_events_complaint', 'complaintid', 'created_at'),
+    )
+
+# ============= COMPLAINT SIMILARITY INDEX =============
+class ComplaintBucket(db.Model):
+    """LSH band buckets of recent complaints' MinHash signatures (see utils.duplicates)"""
+    __tablename__ = 'complaint_buckets'
+    
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    complaintid = db.Column(db.Integer, db.ForeignKey('complaints.complaintid', ondelete='CASCADE'),
+                            primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_complaint_buckets_created', 'created_at'),
+    )
 
 # ============= NOTIFICATION TABLE (NEW!) =============
 class Notification(db.Model):
@@ -173,6 +339,15 @@ class Notification(db.Model):
     link = db.Column(db.String(200))  # ✅ ADD THIS
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Digest coalescing: events of the same group merge into one rolling row
+    group_key = db.Column(db.String(50))
+    group_count = db.Column(db.Integer, default=1)
+    emailed_at = db.Column(db.DateTime)  # When included in an email digest
+    
+    __table_args__ = (
+        db.Index('ix_notifications_user_group', 'userid', 'group_key', 'is_read'),
+    )
 
 # ============= AUDIT LOG TABLE =============
 class AuditLog(db.Model):
@@ -189,3 +364,44 @@ class AuditLog(db.Model):
     
     # Relationships
     user = db.relationship('User', backref='audit_logs')
+
+# ============= BULK IMPORT JOBS =============
+class ImportJob(db.Model):
+    """A CSV import queued from the admin page and run outside the web request (utils.importer)"""
+    __tablename__ = 'import_jobs'
+    
+    jobid = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # students, users, rooms
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    rows = db.Column(db.Integer, default=0)
+    inserted = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    errors_json = db.Column(db.Text)  # [[line, [messages]], ...], the first IMPORT_REPORT_ERRORS of them
+    message = db.Column(db.String(500))  # Why the whole job failed
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.userid'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def errors(self):
+        return json.loads(self.errors_json) if self.errors_json else []
+    
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+# ============= DIRECTORY SEARCH INDEX (SQLite) =============
+class DirectoryNgram(db.Model):
+    """Trigrams and short prefixes of each user's searchable names (see utils.directory).
+    Only maintained on SQLite; PostgreSQL uses pg_trgm indexes on the source columns.
+    """
+    __tablename__ = 'directory_ngrams'
+    
+    gram = db.Column(db.String(8), primary_key=True)
+    userid = db.Column(db.Integer, db.ForeignKey('users.userid', ondelete='CASCADE'), primary_key=True)
+    
+    __table_args__ = (
+        db.Index('ix_directory_ngrams_user', 'userid'),
+    )
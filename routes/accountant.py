@@ -1,10 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from models import db, Payment, Student, RoomAllocation, Room
+from models import db, Payment, Student, RoomAllocation, BankStatementLine
 from functools import wraps
-from datetime import datetime
+from datetime import date
 from utils.notifications import create_notification
-from utils.audit import log_payment_verification
+from utils.audit import log_payment_verification, log_billing_run
+from utils.cache import cached_context
+from utils.conditional import conditional, table_version
+from utils.db_routing import read_only
+from utils.payments import verify_payments, BULK_VERIFY_LIMIT
+from utils.billing import run_billing, parse_period
+from utils.ledger import adjust_submitted, account_balances, BANK, RECEIVABLE
+from utils.reconciliation import reconcile_statement, review_queue, confirm_line, ignore_line
 
 accountant_bp = Blueprint('accountant', __name__)
 
@@ -23,17 +30,6 @@ def accountant_required(f):
 def dashboard():
     status_filter = request.args.get('status', 'all')
     
-    pending_count = Payment.query.filter_by(status='paid').count()
-    verified_count = Payment.query.filter_by(status='verified').count()
-    
-    total_revenue = db.session.query(db.func.sum(Payment.amount)).filter(
-        Payment.status == 'verified'
-    ).scalar() or 0
-    
-    outstanding_amount = db.session.query(db.func.sum(Payment.amount)).filter(
-        Payment.status.in_(['pending', 'paid'])
-    ).scalar() or 0
-    
     if status_filter == 'paid':
         payments = Payment.query.filter_by(status='paid').order_by(Payment.created_at.desc()).limit(50).all()
     elif status_filter == 'verified':
@@ -42,15 +38,30 @@ def dashboard():
         payments = Payment.query.order_by(Payment.created_at.desc()).limit(50).all()
     
     return render_template('accountant/dashboard.html',
-                           pending_count=pending_count,
-                           verified_count=verified_count,
-                           total_revenue=float(total_revenue),
-                           outstanding_amount=float(outstanding_amount),
-                           payments=payments)
+                           payments=payments,
+                           billing_period=date.today().strftime('%Y-%m'),
+                           **_dashboard_stats())
+
+@cached_context('accountant_dashboard', tags=('payments',))
+def _dashboard_stats():
+    """Global payment totals, shared by every accountant until a payment changes"""
+    pending_count = Payment.query.filter_by(status='paid').count()
+    verified_count = Payment.query.filter_by(status='verified').count()
+    
+    # Ledger account balances: money received, and billed but not yet received
+    accounts = account_balances()
+    total_revenue = accounts.get(BANK, 0)
+    outstanding_amount = accounts.get(RECEIVABLE, 0)
+    
+    return dict(pending_count=pending_count,
+                verified_count=verified_count,
+                total_revenue=float(total_revenue),
+                outstanding_amount=float(outstanding_amount))
 
 @accountant_bp.route('/pending-payments')
 @login_required
 @accountant_required
+@conditional(lambda: table_version(Payment, Payment.status == 'paid'))
 def pending_payments():
     payments = Payment.query.filter_by(
         status='paid'
@@ -82,38 +93,97 @@ def verify_payment(payment_id):
         flash('This payment has already been processed', 'warning')
         return redirect(url_for('accountant.pending_payments'))
     
-    payment.status = 'verified'
-    payment.verified_by = current_user.userid
-    payment.verification_date = datetime.utcnow()
-    
-    allocation = RoomAllocation.query.filter_by(
-        studentid=payment.studentid,
-        status='pending_payment'
-    ).first()
+    student_name = payment.student.fullname
+    room = verify_payments([payment_id], current_user.userid).get(payment_id)
+    if room:
+        flash(f'✅ Payment verified and Room {room} allocated to {student_name}', 'success')
+    else:
+        flash(f'✅ Payment verified for {student_name}', 'success')
     
-    if allocation:
-        allocation.status = 'active'
-        allocation.allocation_date = datetime.utcnow()
-        
-        room = Room.query.get(allocation.roomid)
-        if room:
-            room.current_occupancy = (room.current_occupancy or 0) + 1
-            
-            create_notification(
-                user_id=payment.student.userid,
-                title="🎉 Payment Verified & Room Allocated!",
-                message=f"Your payment has been verified and Room {room.block}-{room.roomnumber} has been allocated to you. Welcome!",
-                type='success',
-                link='/student/my-room'
-            )
-            
-            flash(f'✅ Payment verified and Room {room.block}-{room.roomnumber} allocated to {payment.student.fullname}', 'success')
+    return redirect(url_for('accountant.pending_payments'))
+
+@accountant_bp.route('/verify-payments', methods=['POST'])
+@login_required
+@accountant_required
+def verify_selected_payments():
+    payment_ids = request.form.getlist('payment_ids', type=int)
+    if not payment_ids:
+        flash('Select the payments to verify', 'warning')
+        return redirect(url_for('accountant.pending_payments'))
+    if len(payment_ids) > BULK_VERIFY_LIMIT:
+        flash(f'Verify at most {BULK_VERIFY_LIMIT} payments at a time', 'warning')
+        return redirect(url_for('accountant.pending_payments'))
     
-    db.session.commit()
-    log_payment_verification(payment, 'verified')
+    results = verify_payments(payment_ids, current_user.userid)
+    allocated = sum(1 for room in results.values() if room)
+    skipped = len(set(payment_ids)) - len(results)
+    flash(f'✅ Verified {len(results)} payment(s); {allocated} room allocation(s) activated', 'success')
+    if skipped:
+        flash(f'{skipped} selected payment(s) had already been processed and were skipped', 'info')
     
     return redirect(url_for('accountant.pending_payments'))
 
+@accountant_bp.route('/run-billing', methods=['POST'])
+@login_required
+@accountant_required
+def run_monthly_billing():
+    try:
+        year, month = parse_period(request.form.get('period', ''))
+    except ValueError:
+        flash('Choose the month to bill', 'warning')
+        return redirect(url_for('accountant.dashboard'))
+    
+    run = run_billing(year, month, current_app.config['BILLING_CHUNK_SIZE'])
+    log_billing_run(run)
+    flash(f'✅ {run.billed} rent bill(s) raised for {run.label} (₹{run.total:,.2f})', 'success')
+    return redirect(url_for('accountant.dashboard'))
+
+# ============= BANK STATEMENT RECONCILIATION =============
+@accountant_bp.route('/reconcile', methods=['GET', 'POST'])
+@login_required
+@accountant_required
+def reconcile():
+    """Import a bank statement, auto-verify exact matches and review the rest"""
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        name = (upload.filename or '').lower() if upload else ''
+        if not name.endswith(('.csv', '.ofx', '.qfx')):
+            flash('Please upload a .csv or .ofx bank statement', 'danger')
+        else:
+            report = reconcile_statement(upload.stream, 'csv' if name.endswith('.csv') else 'ofx',
+                                         current_app.config, verifier_id=current_user.userid,
+                                         auto_verify=request.form.get('auto_verify') == 'on')
+            flash(f'✅ {report.verified} payment(s) verified, {report.review} line(s) queued for review, '
+                  f'{report.unmatched} unmatched', 'success' if not report.failed else 'warning')
+    return render_template('accountant/reconcile.html', report=report, queue=review_queue())
+
+@accountant_bp.route('/reconcile/line/<int:line_id>/confirm', methods=['POST'])
+@login_required
+@accountant_required
+def confirm_statement_line(line_id):
+    line = BankStatementLine.query.get_or_404(line_id)
+    payment_id = request.form.get('payment_id', type=int)
+    if line.status != 'review' or payment_id is None:
+        flash('This statement line has already been reviewed', 'warning')
+        return redirect(url_for('accountant.reconcile'))
+    try:
+        room = confirm_line(line, payment_id, current_user.userid)
+        flash(f'✅ Payment #{payment_id} verified' + (f' and Room {room} allocated' if room else ''), 'success')
+    except ValueError as e:
+        flash(str(e), 'warning')
+    return redirect(url_for('accountant.reconcile'))
+
+@accountant_bp.route('/reconcile/line/<int:line_id>/ignore', methods=['POST'])
+@login_required
+@accountant_required
+def ignore_statement_line(line_id):
+    line = BankStatementLine.query.get_or_404(line_id)
+    if line.status == 'review':
+        ignore_line(line, current_user.userid)
+        flash('Statement line dismissed', 'info')
+    return redirect(url_for('accountant.reconcile'))
+
 @accountant_bp.route('/reject-payment/<int:payment_id>', methods=['POST'])
 @login_required
 @accountant_required
@@ -127,6 +197,7 @@ def reject_payment(payment_id):
     reason = request.form.get('reason', 'Invalid payment details')
     
     payment.status = 'pending'
+    adjust_submitted({payment.studentid: -payment.amount})
     payment.rejection_reason = reason
     payment.transactionid = None
     payment.bank_name = None
@@ -152,6 +223,8 @@ def reject_payment(payment_id):
 @accountant_bp.route('/payment-history')
 @login_required
 @accountant_required
+@read_only
+@conditional(lambda: table_version(Payment))
 def payment_history():
     payments = Payment.query.order_by(Payment.created_at.desc()).all()
     return render_template('accountant/payment_history.html', payments=payments)
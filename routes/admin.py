@@ -1,17 +1,24 @@
 from datetime import datetime, timedelta  # ← Add timedelta here
-import shutil
 import os
-from werkzeug.utils import secure_filename
-from flask import send_file, Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, Response, jsonify
 from flask_login import login_required, current_user
-from models import db, User, Student, Room, RoomAllocation, Payment, Complaint, AuditLog
+from models import db, User, Student, Room, RoomAllocation, Payment, Complaint, AuditLog, MaintenanceStaff, ImportJob
 from functools import wraps
 import calendar
-from utils.export import export_users_to_csv, export_rooms_to_csv, export_complaints_to_csv
 from utils.audit import log_user_activation, log_room_creation
+from utils.cache import cached_context
+from utils.conditional import conditional, table_version
+from utils.db_routing import read_only
+from utils.search import search_complaints, search_args
+from utils.directory import search_directory, search_directory_page
+from utils.dispatcher import assign_to_staff
+from utils.notifications import create_notification
+from utils.work_queue import CLOSED_STATUSES
 
 admin_bp = Blueprint('admin', __name__)
 
+USERS_PER_PAGE = 50
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -25,7 +32,14 @@ def admin_required(f):
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
+@read_only
 def dashboard():
+    stats = _dashboard_stats(datetime.today().strftime('%Y-%m'))
+    return render_template('admin/dashboard.html', **stats)
+
+@cached_context('admin_dashboard', tags=('rooms', 'users', 'allocations', 'payments', 'complaints'))
+def _dashboard_stats(current_month):
+    """Global dashboard numbers, shared by every admin until a relevant write"""
     total_rooms = Room.query.count()
     total_students = Student.query.count()
     total_users = User.query.count()
@@ -35,7 +49,7 @@ def dashboard():
     active_allocations = RoomAllocation.query.filter_by(status='active').count()
     pending_users = User.query.filter_by(is_active=False).count()
     
-    today = datetime.today()
+    today = datetime.strptime(current_month, '%Y-%m')
     months = []
     monthly_revenue = []
     
@@ -62,20 +76,19 @@ def dashboard():
     in_progress_complaints = Complaint.query.filter_by(status='in_progress').count()
     resolved_complaints = Complaint.query.filter_by(status='resolved').count()
     
-    return render_template('admin/dashboard.html',
-                         total_rooms=total_rooms,
-                         occupied_rooms=occupied_rooms,
-                         vacant_rooms=vacant_rooms,
-                         maintenance_rooms=maintenance_rooms,
-                         total_students=total_students,
-                         total_users=total_users,
-                         active_allocations=active_allocations,
-                         pending_users=pending_users,
-                         months=months,
-                         monthly_revenue=monthly_revenue,
-                         open_complaints=open_complaints,
-                         in_progress_complaints=in_progress_complaints,
-                         resolved_complaints=resolved_complaints)
+    return dict(total_rooms=total_rooms,
+                occupied_rooms=occupied_rooms,
+                vacant_rooms=vacant_rooms,
+                maintenance_rooms=maintenance_rooms,
+                total_students=total_students,
+                total_users=total_users,
+                active_allocations=active_allocations,
+                pending_users=pending_users,
+                months=months,
+                monthly_revenue=monthly_revenue,
+                open_complaints=open_complaints,
+                in_progress_complaints=in_progress_complaints,
+                resolved_complaints=resolved_complaints)
 
 # ============= USERS =============
 @admin_bp.route('/users')
@@ -85,24 +98,40 @@ def users():
     search = request.args.get('search', '')
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
-    query = User.query
+    active = {'active': True, 'inactive': False}.get(status_filter)
     
+    page = request.args.get('page', 1, type=int)
     if search:
-        query = query.filter(
-            db.or_(
-                User.username.ilike(f'%{search}%'),
-                User.email.ilike(f'%{search}%')
-            )
-        )
+        results = search_directory_page(search, role=role_filter or None, active=active,
+                                        page=page, per_page=USERS_PER_PAGE)
+        return render_template('admin/users.html', users=[user for user, student in results.items], results=results)
+    
+    query = User.query
     if role_filter:
         query = query.filter_by(role=role_filter)
-    if status_filter == 'active':
-        query = query.filter_by(is_active=True)
-    elif status_filter == 'inactive':
-        query = query.filter_by(is_active=False)
+    if active is not None:
+        query = query.filter_by(is_active=active)
     
-    users = query.order_by(User.created_at.desc()).all()
-    return render_template('admin/users.html', users=users)
+    results = query.order_by(User.created_at.desc()).paginate(
+        page=page, per_page=USERS_PER_PAGE, error_out=False)
+    return render_template('admin/users.html', users=results.items, results=results)
+
+@admin_bp.route('/api/directory')
+@login_required
+@admin_required
+def directory_search():
+    """Typeahead over usernames, emails, student names and roll numbers"""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    matches = search_directory(request.args.get('q', ''), limit=limit)
+    return jsonify([{
+        'userid': user.userid,
+        'username': user.username,
+        'email': user.email,
+        'role': user.role,
+        'is_active': user.is_active,
+        'fullname': student.fullname if student else None,
+        'rollnumber': student.rollnumber if student else None,
+    } for user, student in matches])
 
 @admin_bp.route('/activate/<int:user_id>')
 @login_required
@@ -170,6 +199,40 @@ def room_new():
         return redirect(url_for('admin.rooms'))
     return render_template('admin/room_form.html', room=None)
 
+# ============= BULK CSV IMPORT =============
+@admin_bp.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def bulk_import():
+    """Queue a CSV of students, staff accounts or rooms; it runs outside this request"""
+    from utils.importer import queue_import, start_import_runner, REQUIRED_COLUMNS
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in REQUIRED_COLUMNS:
+            flash('Choose what to import', 'danger')
+        elif not upload or not upload.filename.lower().endswith('.csv'):
+            flash('Please upload a .csv file', 'danger')
+        else:
+            job = queue_import(upload, kind, current_user.userid)
+            if start_import_runner():
+                flash(f'⏳ Import of {kind} started. This page updates when it finishes.', 'info')
+            else:
+                flash(f'⏳ Import of {kind} queued; it will run on the next scheduled import run.', 'warning')
+            return redirect(url_for('admin.import_status', job_id=job.jobid))
+    jobs = ImportJob.query.order_by(ImportJob.jobid.desc()).limit(10).all()
+    return render_template('admin/import.html', report=None, jobs=jobs, columns=REQUIRED_COLUMNS)
+
+@admin_bp.route('/import/<int:job_id>')
+@login_required
+@admin_required
+def import_status(job_id):
+    """An import's progress, then its report (the page refreshes itself until the job finishes)"""
+    from utils.importer import REQUIRED_COLUMNS
+    job = ImportJob.query.get_or_404(job_id)
+    jobs = ImportJob.query.order_by(ImportJob.jobid.desc()).limit(10).all()
+    return render_template('admin/import.html', report=job, jobs=jobs, columns=REQUIRED_COLUMNS)
+
 @admin_bp.route('/room/edit/<int:room_id>', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -193,21 +256,10 @@ def room_edit(room_id):
 @admin_bp.route('/complaints')
 @login_required
 @admin_required
+@conditional(lambda: table_version(Complaint))
 def complaints():
-    status = request.args.get('status', None)
-    priority = request.args.get('priority', None)
-    query = Complaint.query.join(Student)
-    
-    if status:
-        query = query.filter_by(status=status)
-    if priority:
-        query = query.filter_by(priority=priority)
-    
-    complaints = query.options(
-        db.joinedload(Complaint.student)
-    ).order_by(Complaint.created_at.desc()).all()
-    
-    return render_template('admin/complaints.html', complaints=complaints)
+    results, facets = search_complaints(**search_args(request.args))
+    return render_template('admin/complaints.html', complaints=results.items, results=results, facets=facets)
 
 @admin_bp.route('/complaint/<int:complaint_id>')
 @login_required
@@ -217,16 +269,11 @@ def complaint_detail(complaint_id):
         db.joinedload(Complaint.student)
     ).filter(Complaint.complaintid == complaint_id).first_or_404()
     
-    # Get all active maintenance staff
-    maintenance_staff = User.query.filter_by(
-        role='maintenance',
-        is_active=True
+    # Active maintenance staff, specialists for this category first
+    maintenance_staff = MaintenanceStaff.query.filter_by(is_active=True).order_by(
+        (MaintenanceStaff.specialization != complaint.category), MaintenanceStaff.name
     ).all()
     
-    print(f"DEBUG: Found {len(maintenance_staff)} maintenance staff members")
-    for staff in maintenance_staff:
-        print(f"  - {staff.username} (ID: {staff.userid})")
-    
     return render_template('admin/complaint_detail.html', 
                          complaint=complaint, 
                          maintenance_staff=maintenance_staff)
@@ -236,47 +283,42 @@ def complaint_detail(complaint_id):
 @login_required
 @admin_required
 def assign_complaint(complaint_id):
-    """Assign a complaint to maintenance staff"""
+    """Assign (or reassign) a complaint to maintenance staff, overriding the dispatcher"""
     complaint = Complaint.query.get_or_404(complaint_id)
     
-    maintenance_id = request.form.get('maintenance_id')
+    staff_id = request.form.get('staff_id', type=int)
+    staff = MaintenanceStaff.query.filter_by(staff_id=staff_id, is_active=True).first() if staff_id else None
     
-    if not maintenance_id:
-        flash('Please select a maintenance staff member.', 'danger')
+    if not staff:
+        flash('Please select an active maintenance staff member.', 'danger')
         return redirect(url_for('admin.complaint_detail', complaint_id=complaint_id))
     
-    # Verify the user is maintenance staff
-    maintenance_staff = User.query.filter_by(
-        userid=maintenance_id,
-        role='maintenance',
-        is_active=True
-    ).first()
-    
-    if not maintenance_staff:
-        flash('Invalid maintenance staff selected.', 'danger')
+    if complaint.status in CLOSED_STATUSES:
+        flash('Closed complaints cannot be reassigned.', 'warning')
         return redirect(url_for('admin.complaint_detail', complaint_id=complaint_id))
     
-    # Assign the complaint
-    complaint.assignedto = maintenance_id
-    complaint.status = 'in_progress'
+    assign_to_staff(complaint, staff)
     db.session.commit()
     
-    # Notify the maintenance staff
-    create_notification(
-        user_id=maintenance_id,
-        title="🔧 New Complaint Assigned",
-        message=f"You have been assigned complaint #{complaint.complaintid}: {complaint.description[:50]}...",
-        type='info',
-        link=f'/maintenance/complaints/{complaint.complaintid}'
-    )
+    # Notify the student
+    student = complaint.student
+    if student and student.userid:
+        create_notification(
+            user_id=student.userid,
+            title="🔧 Complaint Assigned",
+            message=f"Your complaint '{complaint.title}' has been assigned to {staff.name}.",
+            type='info',
+            link='/student/complaints'
+        )
     
-    flash(f'Complaint assigned to {maintenance_staff.username} successfully.', 'success')
+    flash(f'Complaint assigned to {staff.name} successfully.', 'success')
     return redirect(url_for('admin.complaint_detail', complaint_id=complaint_id))
 
 # ============= REPORTS =============
 @admin_bp.route('/reports')
 @login_required
 @admin_required
+@read_only
 def reports():
     try:
         # Total counts
@@ -317,14 +359,11 @@ def reports():
             'pending_payments': pending_payments
         }
         
-        # DEBUG: Print stats to console
-        print("=" * 50)
-        print("REPORTS STATS DEBUG:")
-        for key, value in stats.items():
-            print(f"{key}: {value}")
-        print("=" * 50)
+        # Resolution-time percentiles from the complaint event log
+        from utils.complaint_analytics import resolution_report
+        resolution = resolution_report()
         
-        return render_template('admin/reports.html', stats=stats)
+        return render_template('admin/reports.html', stats=stats, resolution=resolution)
         
     except Exception as e:
         flash(f'Error generating reports: {str(e)}', 'danger')
@@ -336,6 +375,7 @@ def reports():
 @admin_bp.route('/audit-logs')
 @login_required
 @admin_required
+@read_only
 def audit_logs():
     try:
         # Get filter parameters
@@ -366,27 +406,23 @@ def audit_logs():
         return redirect(url_for('admin.dashboard'))
 
 # ============= BACKUP & RESTORE =============
+def _backup_store():
+    from utils.backup import BackupStore
+    return BackupStore(current_app.config['BACKUP_DIR'], current_app.config)
+
 @admin_bp.route('/backup')
 @login_required
 @admin_required
 def backup_page():
     """Display backup management page"""
-    backup_dir = 'backups'
-    backups = []
-    
-    if os.path.exists(backup_dir):
-        for filename in os.listdir(backup_dir):
-            if filename.endswith('.db'):
-                filepath = os.path.join(backup_dir, filename)
-                size = os.path.getsize(filepath)
-                timestamp = os.path.getmtime(filepath)
-                backups.append({
-                    'filename': filename,
-                    'size': f'{size / 1024:.2f} KB',
-                    'date': datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-                })
-    
-    backups.sort(key=lambda x: x['date'], reverse=True)
+    backups = [{
+        'id': b['id'],
+        'kind': b['kind'],
+        'size': f"{b['size'] / 1024:.2f} KB",
+        'stored': f"{b['stored'] / 1024:.2f} KB",
+        'date': b['created'].replace('T', ' '),
+        'sha256': b['sha256'],
+    } for b in _backup_store().snapshots()]
     return render_template('admin/backup.html', backups=backups)
 
 @admin_bp.route('/backup/create', methods=['POST'])
@@ -395,77 +431,61 @@ def backup_page():
 def create_backup():
     """Create database backup"""
     try:
-        backup_dir = 'backups'
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_name = f'hostelhub_backup_{timestamp}.db'
-        backup_path = os.path.join(backup_dir, backup_name)
-        
-        db_path = 'instance/hostelhub.db'
-        if not os.path.exists(db_path):
-            db_path = 'hostelhub.db'
-        
-        shutil.copy2(db_path, backup_path)
-        flash(f'✅ Backup created successfully: {backup_name}', 'success')
+        store = _backup_store()
+        backup = store.create(db.engine)
+        removed, freed = store.prune()
+        flash(f"✅ Backup created successfully: {backup['id']} ({backup['stored'] / 1024:.2f} KB of new data)", 'success')
+        if removed:
+            flash(f'🧹 Retention policy removed {removed} old backup(s), freed {freed / 1024:.2f} KB', 'info')
     except Exception as e:
         flash(f'❌ Backup failed: {str(e)}', 'danger')
     
     return redirect(url_for('admin.backup_page'))
 
-@admin_bp.route('/backup/download/<filename>')
+@admin_bp.route('/backup/download/<backup_id>')
 @login_required
 @admin_required
-def download_backup(filename):
-    """Download backup file"""
-    try:
-        backup_path = os.path.join('backups', secure_filename(filename))
-        if os.path.exists(backup_path):
-            return send_file(backup_path, as_attachment=True)
-        else:
-            flash('Backup file not found', 'danger')
-    except Exception as e:
-        flash(f'Download failed: {str(e)}', 'danger')
+def download_backup(backup_id):
+    """Download backup as a single gzip file, reassembled from the chunk store"""
+    from utils.backup import stream_gzip
+    store = _backup_store()
+    backup = store.get(backup_id)
+    if not backup:
+        flash('Backup file not found', 'danger')
+        return redirect(url_for('admin.backup_page'))
     
-    return redirect(url_for('admin.backup_page'))
+    extension = 'db' if backup['format'] == 'sqlite' else 'sql'
+    return Response(stream_gzip(store.read(backup_id)), mimetype='application/gzip', headers={
+        'Content-Disposition': f'attachment; filename=hostelhub_backup_{backup_id}.{extension}.gz'
+    })
 
-@admin_bp.route('/backup/restore/<filename>', methods=['POST'])
+@admin_bp.route('/backup/restore/<backup_id>', methods=['POST'])
 @login_required
 @admin_required
-def restore_backup(filename):
+def restore_backup(backup_id):
     """Restore database from backup"""
     try:
-        backup_path = os.path.join('backups', secure_filename(filename))
-        
-        if not os.path.exists(backup_path):
-            flash('Backup file not found', 'danger')
-            return redirect(url_for('admin.backup_page'))
-        
-        db_path = 'instance/hostelhub.db'
-        if not os.path.exists(db_path):
-            db_path = 'hostelhub.db'
-        
-        safety_backup = f'backups/pre_restore_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db'
-        shutil.copy2(db_path, safety_backup)
-        shutil.copy2(backup_path, db_path)
+        # Release this request's connection before the pool is disposed
+        db.session.remove()
+        safety = _backup_store().restore(db.engine, backup_id)
         
-        flash(f'✅ Database restored successfully from {filename}', 'success')
-        flash(f'⚠️ Safety backup created: {os.path.basename(safety_backup)}', 'info')
+        flash(f'✅ Database restored successfully from {backup_id}', 'success')
+        flash(f"⚠️ Safety backup created: {safety['id']}", 'info')
     except Exception as e:
         flash(f'❌ Restore failed: {str(e)}', 'danger')
     
     return redirect(url_for('admin.backup_page'))
 
-@admin_bp.route('/backup/delete/<filename>', methods=['POST'])
+@admin_bp.route('/backup/delete/<backup_id>', methods=['POST'])
 @login_required
 @admin_required
-def delete_backup(filename):
-    """Delete backup file"""
+def delete_backup(backup_id):
+    """Delete backup and any chunks no other backup shares"""
     try:
-        backup_path = os.path.join('backups', secure_filename(filename))
-        if os.path.exists(backup_path):
-            os.remove(backup_path)
-            flash(f'✅ Backup deleted: {filename}', 'success')
+        store = _backup_store()
+        if store.get(backup_id):
+            store.delete(backup_id)
+            flash(f'✅ Backup deleted: {backup_id}', 'success')
         else:
             flash('Backup file not found', 'danger')
     except Exception as e:
@@ -477,20 +497,26 @@ def delete_backup(filename):
 @admin_bp.route('/export/users')
 @login_required
 @admin_required
+@read_only
 def export_users():
+    from utils.export import export_users_to_csv
     users = User.query.all()
     return export_users_to_csv(users)
 
 @admin_bp.route('/export/rooms')
 @login_required
 @admin_required
+@read_only
 def export_rooms():
+    from utils.export import export_rooms_to_csv
     rooms = Room.query.all()
     return export_rooms_to_csv(rooms)
 
 @admin_bp.route('/export/complaints')
 @login_required
 @admin_required
+@read_only
 def export_complaints():
+    from utils.export import export_complaints_to_csv
     complaints = Complaint.query.all()
     return export_complaints_to_csv(complaints)
@@ -1,8 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, User, Student, Notification
+from models import db, User, Student
 from flask_login import login_user, logout_user, login_required
 from datetime import datetime
+from utils.notifications import create_notification
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -61,22 +62,21 @@ def register():
                 gender=gender
             )
             db.session.add(student)
-
-            # ✅ NOTIFY ADMIN - NEW STUDENT REGISTRATION
+        
+        db.session.commit()
+        
+        # ✅ NOTIFY ADMIN - NEW STUDENT REGISTRATION
+        if role == 'student':
             admins = User.query.filter_by(role='admin').all()
             for admin in admins:
-                notification = Notification(
-                    userid=admin.userid,
+                create_notification(
+                    user_id=admin.userid,
                     title='👤 New Student Registered',
                     message=f'New student {fullname} has registered (Email: {email})',
                     type='success',
                     link='/admin/users',
-                    is_read=False,
-                    created_at=datetime.utcnow()
+                    group='student_registered'
                 )
-                db.session.add(notification)
-        
-        db.session.commit()
         
         flash('Registration successful! Please wait for admin approval before logging in.', 'success')
         return redirect(url_for('auth.login'))
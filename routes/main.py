@@ -0,0 +1,158 @@
+from flask import render_template, redirect, url_for, request, flash, jsonify, current_app, abort
+from flask_login import current_user, login_required
+from models import db, Student, Payment, Notification
+from utils.conditional import conditional
+
+# Home route
+def index():
+    if current_user.is_authenticated:
+        if current_user.role == 'admin':
+            return redirect(url_for('admin.dashboard'))
+        elif current_user.role == 'warden':
+            return redirect(url_for('warden.dashboard'))
+        elif current_user.role == 'student':
+            return redirect(url_for('student.dashboard'))
+        elif current_user.role == 'accountant':
+            return redirect(url_for('accountant.dashboard'))
+        elif current_user.role == 'maintenance':
+            return redirect(url_for('maintenance.dashboard'))
+    return render_template('index.html')
+
+def about():
+    return render_template('about.html')
+
+def contact():
+    name = request.form.get('name', '')
+    email = request.form.get('email', '')
+    message = request.form.get('message', '')
+    flash('Thank you for contacting us! We will get back to you soon.', 'success')
+    return redirect(url_for('about'))
+
+def notifications_version():
+    if not current_user.is_authenticated:
+        return None
+    return db.session.query(
+        db.func.count(Notification.notifid),
+        db.func.max(Notification.created_at)
+    ).filter(Notification.userid == current_user.userid).one()
+
+def receipt_version(payment_id):
+    # Only validate for callers allowed to see the receipt; anyone else falls
+    # through to the view's own checks, so a 304 never reveals that it exists
+    if not current_user.is_authenticated:
+        return None
+    query = db.session.query(Payment.status, Payment.updated_at).filter(Payment.paymentid == payment_id)
+    if current_user.role == 'student':
+        query = query.join(Student, Student.studentid == Payment.studentid).filter(
+            Student.userid == current_user.userid)
+    elif current_user.role not in ['admin', 'accountant']:
+        return None
+    payment = query.first()
+    if not payment or payment.status != 'verified':
+        return None
+    return (payment_id, payment.updated_at)
+
+@conditional(notifications_version)
+def notifications():
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login'))
+    notifications = Notification.query.filter_by(
+        userid=current_user.userid
+    ).order_by(Notification.created_at.desc()).all()
+    return render_template('notifications.html', notifications=notifications)
+
+def mark_notification_read(notification_id):
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login'))
+    notification = Notification.query.get_or_404(notification_id)
+    if notification.userid == current_user.userid:
+        notification.is_read = True
+        db.session.commit()
+    if notification.link:
+        return redirect(notification.link)
+    return redirect(url_for('notifications'))
+
+@login_required
+def mark_all_read():
+    if not current_user.is_authenticated:
+        return redirect(url_for('auth.login'))
+    notifications = Notification.query.filter_by(
+        userid=current_user.userid,
+        is_read=False
+    ).all()
+    for notif in notifications:
+        notif.is_read = True
+    db.session.commit()
+    flash('✅ All notifications marked as read', 'success')
+    return redirect(url_for('notifications'))
+
+@login_required
+def notification_count_api():
+    count = Notification.query.filter_by(
+        userid=current_user.userid,
+        is_read=False
+    ).count()
+    return jsonify({'count': count})
+
+@login_required
+@conditional(receipt_version, badge=False)
+def generate_receipt(payment_id):
+    payment = Payment.query.get_or_404(payment_id)
+
+    # Verify payment belongs to current user or is admin/accountant
+    if current_user.role == 'student':
+        student = Student.query.filter_by(userid=current_user.userid).first()
+        if payment.studentid != student.studentid:
+            flash('Unauthorized access', 'danger')
+            return redirect(url_for('student.payments'))
+    elif current_user.role not in ['admin', 'accountant']:
+        flash('Unauthorized access', 'danger')
+        return redirect(url_for('index'))
+
+    if payment.status != 'verified':
+        flash('Receipt can only be generated for verified payments', 'warning')
+        return redirect(url_for('student.payments'))
+
+    from utils.pdf_generator import generate_payment_receipt
+    return generate_payment_receipt(payment)
+
+def metrics():
+    """Prometheus scrape endpoint for this worker's DB pool metrics"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        abort(404)
+    from utils.db_engine import render_metrics
+    return render_metrics(db.engine), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+# Context processor for notifications
+def inject_notifications():
+    if current_user.is_authenticated:
+        unread_count = Notification.query.filter_by(
+            userid=current_user.userid,
+            is_read=False
+        ).count()
+        return {'unread_notifications': unread_count}
+    return {'unread_notifications': 0}
+
+# Error handlers
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+def internal_error(error):
+    db.session.rollback()
+    return render_template('errors/500.html'), 500
+
+def register_main_routes(app):
+    """Attach the app-level (non-blueprint) routes, keeping their endpoint names"""
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/about', 'about', about)
+    app.add_url_rule('/contact', 'contact', contact, methods=['POST'])
+    app.add_url_rule('/notifications', 'notifications', notifications)
+    app.add_url_rule('/notification/read/<int:notification_id>', 'mark_notification_read', mark_notification_read)
+    app.add_url_rule('/notifications/mark-all-read', 'mark_all_read', mark_all_read)
+    app.add_url_rule('/api/notifications/count', 'notification_count_api', notification_count_api)
+    app.add_url_rule('/receipt/<int:payment_id>', 'generate_receipt', generate_receipt)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    app.context_processor(inject_notifications)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, internal_error)
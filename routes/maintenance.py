@@ -1,9 +1,17 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from models import db, Complaint
+from models import db, Complaint, MaintenanceStaff
 from functools import wraps
 from datetime import datetime, date
 from utils.notifications import create_notification
+from utils.cache import cached_context
+from utils.conditional import conditional, table_version
+from utils.search import search_complaints, search_args
+from utils.dispatcher import dispatcher
+from utils.duplicates import notify_merged
+from utils.work_queue import QUEUE_STATUSES, status_counts, staff_loads, staff_queue, assigned_queue, urgent_queue, next_up
+
+DASHBOARD_QUEUE_SIZE = 10
 
 maintenance_bp = Blueprint('maintenance', __name__, url_prefix='/maintenance')
 
@@ -22,54 +30,30 @@ def maintenance_required(f):
 @login_required
 @maintenance_required
 def dashboard():
-    all_complaints = Complaint.query.all()
-    
-    # NEW STATUS NAMES
-    assigned = Complaint.query.filter_by(status='assigned').all()
-    in_progress = Complaint.query.filter_by(status='in_progress').all()
-    resolved = Complaint.query.filter_by(status='resolved').all()
-    
-    my_assigned = assigned + in_progress
-    
-    urgent_issues = Complaint.query.filter_by(priority='High').filter(
-        Complaint.status != 'resolved'
-    ).all()
-    
-    today = date.today()
-    resolved_today = [c for c in resolved if c.resolvedat and c.resolvedat.date() == today]
-    
-    recent_complaints = Complaint.query.order_by(
-        Complaint.created_at.desc()
-    ).limit(10).all()
-    
+    my_assigned = next_up(DASHBOARD_QUEUE_SIZE)
     return render_template('maintenance/dashboard.html',
                            my_assigned=my_assigned,
-                           my_assigned_count=len(my_assigned),
-                           urgent_count=len(urgent_issues),
-                           resolved_count=len(resolved),
-                           resolved_today_count=len(resolved_today),
-                           total_complaints_count=len(all_complaints),
-                           assigned_count=len(assigned),
-                           in_progress_count=len(in_progress),
-                           urgent_complaints=urgent_issues,
-                           recent_complaints=recent_complaints)
+                           **_dashboard_counts(date.today().isoformat()))
+
+
+@cached_context('maintenance_dashboard', tags=('complaints',))
+def _dashboard_counts(today):
+    """Global complaint counts, shared by all maintenance users until a complaint changes"""
+    return status_counts(datetime.fromisoformat(today))
 
 
 @maintenance_bp.route('/complaints')
 @login_required
 @maintenance_required
+@conditional(lambda: table_version(Complaint))
 def complaints():
-    status_filter = request.args.get('status', None)
-    if status_filter:
-        complaints = Complaint.query.filter_by(status=status_filter).order_by(
-            Complaint.created_at.desc()
-        ).all()
-    else:
-        complaints = Complaint.query.order_by(Complaint.created_at.desc()).all()
-    
+    args = search_args(request.args)
+    results, facets = search_complaints(**args)
     return render_template('maintenance/all_complaints.html',
-                           complaints=complaints,
-                           current_filter=status_filter,
+                           complaints=results.items,
+                           results=results,
+                           facets=facets,
+                           current_filter=args['status'],
                            page_title='All Complaints')
 
 
@@ -77,13 +61,11 @@ def complaints():
 @login_required
 @maintenance_required
 def my_assigned():
-    # Assigned + In Progress
-    complaints = Complaint.query.filter(
-        Complaint.status.in_(['assigned', 'in_progress'])
-    ).order_by(Complaint.created_at.desc()).all()
-    
+    # Assigned + In Progress, most urgent first
+    pages = assigned_queue(page=request.args.get('page', 1, type=int))
     return render_template('maintenance/all_complaints.html',
-                           complaints=complaints,
+                           complaints=pages.items,
+                           pages=pages,
                            current_filter='my_assigned',
                            page_title='My Assigned Complaints')
 
@@ -92,12 +74,10 @@ def my_assigned():
 @login_required
 @maintenance_required
 def urgent():
-    complaints = Complaint.query.filter_by(priority='High').filter(
-        Complaint.status != 'resolved'
-    ).order_by(Complaint.created_at.desc()).all()
-    
+    pages = urgent_queue(page=request.args.get('page', 1, type=int))
     return render_template('maintenance/all_complaints.html',
-                           complaints=complaints,
+                           complaints=pages.items,
+                           pages=pages,
                            current_filter='urgent',
                            page_title='Urgent Issues')
 
@@ -106,16 +86,36 @@ def urgent():
 @login_required
 @maintenance_required
 def resolved():
-    complaints = Complaint.query.filter_by(status='resolved').order_by(
+    pages = Complaint.query.filter_by(status='resolved').order_by(
         Complaint.resolvedat.desc()
-    ).all()
-    
+    ).paginate(page=request.args.get('page', 1, type=int), per_page=20, error_out=False)
     return render_template('maintenance/all_complaints.html',
-                           complaints=complaints,
+                           complaints=pages.items,
+                           pages=pages,
                            current_filter='resolved',
                            page_title='Resolved Complaints')
 
 
+@maintenance_bp.route('/queue')
+@login_required
+@maintenance_required
+def queues():
+    return render_template('maintenance/queues.html', staff_loads=staff_loads())
+
+
+@maintenance_bp.route('/queue/<int:staff_id>')
+@login_required
+@maintenance_required
+def staff_queue_view(staff_id):
+    staff = MaintenanceStaff.query.get_or_404(staff_id)
+    pages = staff_queue(staff_id, page=request.args.get('page', 1, type=int))
+    return render_template('maintenance/all_complaints.html',
+                           complaints=pages.items,
+                           pages=pages,
+                           current_filter='queue',
+                           page_title=f'Queue: {staff.name} ({staff.specialization.title()})')
+
+
 @maintenance_bp.route('/complaint/<int:id>')
 @login_required
 @maintenance_required
@@ -135,6 +135,7 @@ def update_status(id):
     resolution_notes = request.form.get('resolution_notes', '').strip()
     
     # Update complaint
+    leaving_queue = complaint.status in QUEUE_STATUSES and new_status not in QUEUE_STATUSES
     complaint.status = new_status
     
     if resolution_notes:
@@ -143,6 +144,12 @@ def update_status(id):
     if new_status == 'resolved':
         complaint.resolvedat = datetime.utcnow()
     
+    if leaving_queue:
+        dispatcher.adjust(complaint.assigned_staff_id, -1)
+    
+    if new_status == 'resolved':
+        notify_merged(complaint)
+    
     db.session.commit()
     
     # NOTIFY STUDENT
@@ -1,16 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db, User, Student
-from werkzeug.utils import secure_filename
-from datetime import datetime
-import os
+from utils.attachments import get_store, streams_attachments, AttachmentError, IMAGE_TYPES
 
 profile_bp = Blueprint('profile', __name__)
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+PROFILE_PICTURE_MAX_BYTES = 2 * 1024 * 1024
 
 @profile_bp.route('/profile')
 @login_required
@@ -57,42 +52,23 @@ def edit_profile():
 
 @profile_bp.route('/profile/upload-picture', methods=['POST'])
 @login_required
+@streams_attachments
 def upload_picture():
-    if 'profile_picture' not in request.files:
-        flash('No file selected', 'danger')
-        return redirect(url_for('profile.view_profile'))
+    file = request.files.get('profile_picture')
     
-    file = request.files['profile_picture']
-    
-    if file.filename == '':
+    if not file or file.filename == '':
         flash('No file selected', 'danger')
         return redirect(url_for('profile.view_profile'))
     
-    if file and allowed_file(file.filename):
-        # Create unique filename
-        filename = secure_filename(f"{current_user.userid}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join('static/uploads/profiles', filename)
-        
-        # Ensure directory exists
-        os.makedirs('static/uploads/profiles', exist_ok=True)
-        
-        # Delete old profile picture if not default
-        if current_user.profile_picture != 'default.png':
-            old_path = os.path.join('static/uploads/profiles', current_user.profile_picture)
-            if os.path.exists(old_path):
-                os.remove(old_path)
-        
-        # Save new picture
-        file.save(filepath)
-        
-        # Update database
-        current_user.profile_picture = filename
-        db.session.commit()
-        
-        flash('Profile picture updated successfully!', 'success')
-    else:
-        flash('Invalid file type. Only PNG, JPG, JPEG, and GIF are allowed.', 'danger')
+    # Stored by content hash: re-uploading the same picture reuses the stored file
+    try:
+        current_user.profile_picture = get_store().save(file, PROFILE_PICTURE_MAX_BYTES, types=IMAGE_TYPES)
+    except AttachmentError as e:
+        flash(f'Picture not accepted: {e}', 'danger')
+        return redirect(url_for('profile.view_profile'))
     
+    db.session.commit()
+    flash('Profile picture updated successfully!', 'success')
     return redirect(url_for('profile.view_profile'))
 
 @profile_bp.route('/profile/change-password', methods=['GET', 'POST'])
@@ -3,14 +3,19 @@ from flask_login import login_required, current_user
 from models import db, Student, Room, RoomAllocation, Complaint, Payment, Notification, User
 from functools import wraps
 from datetime import datetime
-from werkzeug.utils import secure_filename
 from utils.audit import log_complaint_creation
-from utils.notifications import create_notification
-from utils.pdf_generator import generate_payment_receipt  # ← ADD THIS IMPORT
-import os
+from utils.notifications import create_notification, notify_role
+from utils.conditional import conditional, table_version
+from routes.main import receipt_version
+from utils.attachments import get_store, streams_attachments, AttachmentError
+from utils.duplicates import flag_duplicate
+from utils.payments import normalize_reference, reference_in_use
+from utils.ledger import adjust_submitted, student_balance
 
 student_bp = Blueprint('student', __name__)
 
+COMPLAINT_ATTACHMENT_MAX_BYTES = 5 * 1024 * 1024
+
 def student_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -31,20 +36,18 @@ def dashboard():
         status='active'
     ).first()
     
-    pending_payments = Payment.query.filter_by(
-        studentid=student.studentid
-    ).filter(Payment.status.in_(['pending', 'paid'])).all()
-    
     complaints = Complaint.query.filter_by(
         studentid=student.studentid
     ).order_by(Complaint.created_at.desc()).limit(5).all()
     
-    total_dues = sum(p.amount for p in pending_payments)
+    # Maintained by every posting (utils.ledger), so dues are a single-row read
+    balance = student_balance(student.studentid)
     
     return render_template('student/dashboard.html',
                          student=student,
                          allocation=allocation,
-                         total_dues=total_dues,
+                         total_dues=balance.balance,
+                         awaiting_verification=balance.submitted,
                          complaints=complaints)
 
 @student_bp.route('/my-room')
@@ -135,7 +138,8 @@ def request_room():
                 title="🏠 New Room Request",
                 message=f"New room request from {student.fullname} for Room {room.block}-{room.roomnumber}",
                 type='info',
-                link='/warden/pending-requests'
+                link='/warden/pending-requests',
+                group='room_request'
             )
         
         flash('Room request submitted successfully. Await approval.', 'success')
@@ -146,6 +150,7 @@ def request_room():
 @student_bp.route('/complaint', methods=['GET', 'POST'])
 @login_required
 @student_required
+@streams_attachments
 def lodge_complaint():
     student = Student.query.filter_by(userid=current_user.userid).first()
     
@@ -205,42 +210,45 @@ def lodge_complaint():
             status='open'
         )
         
-        # Handle file attachment
+        # Handle file attachment (streamed into the attachment store while the form was read)
         if 'attachment' in request.files:
             file = request.files['attachment']
             if file and file.filename:
-                file.seek(0, 2)
-                file_size = file.tell()
-                file.seek(0)
-                
-                if file_size > 5 * 1024 * 1024:
-                    flash('⚠️ Attachment file size must be less than 5MB', 'warning')
+                try:
+                    complaint.attachment = get_store().save(file, COMPLAINT_ATTACHMENT_MAX_BYTES)
+                except AttachmentError as e:
+                    flash(f'⚠️ Attachment not accepted: {e}', 'warning')
                     return render_template('student/complaint_form.html',
                                          allocation=active_allocation,
                                          any_allocation=any_allocation)
-                
-                filename = secure_filename(f"{int(datetime.now().timestamp())}_{file.filename}")
-                filepath = os.path.join('static', 'uploads', 'complaints', filename)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                file.save(filepath)
-                complaint.attachment = f'uploads/complaints/{filename}'
         
-        db.session.add(complaint)
+        original = flag_duplicate(complaint)
+        if original is not None:
+            # Same issue already reported: wardens see one rolling digest instead of a
+            # notification per report, and the dispatcher leaves it for them to merge
+            notify_role('warden', 'complaint_duplicate', 1, link='/warden/complaints')
         db.session.commit()
         
         # ✅ NOTIFY WARDENS
-        wardens = User.query.filter_by(role='warden', is_active=True).all()
-        for warden in wardens:
-            create_notification(
-                user_id=warden.userid,
-                title="⚠️ New Complaint Lodged",
-                message=f"New {category} complaint from {student.fullname}: {title}",
-                type='warning',
-                link='/warden/complaints'
-            )
+        if original is None:
+            wardens = User.query.filter_by(role='warden', is_active=True).all()
+            for warden in wardens:
+                create_notification(
+                    user_id=warden.userid,
+                    title="⚠️ New Complaint Lodged",
+                    message=f"New {category} complaint from {student.fullname}: {title}",
+                    type='warning',
+                    link='/warden/complaints',
+                    group='complaint_lodged'
+                )
         
         log_complaint_creation(complaint)
-        flash(f'✅ Complaint submitted successfully for {location_text}.', 'success')
+        if original is not None:
+            flash(f'ℹ️ Complaint submitted. It looks like complaint #{original.complaintid} '
+                  f'("{original.title}"), already reported for {location_text}; the warden will merge them '
+                  f'if it is the same issue.', 'info')
+        else:
+            flash(f'✅ Complaint submitted successfully for {location_text}.', 'success')
         return redirect(url_for('student.complaints_list'))
     
     # ✅ HANDLE GET REQUEST (SHOW FORM) - THIS IS MANDATORY!
@@ -248,9 +256,16 @@ def lodge_complaint():
                          allocation=active_allocation,
                          any_allocation=any_allocation)
 
+def _own_rows_version(model):
+    student = Student.query.filter_by(userid=current_user.userid).first()
+    if not student:
+        return None
+    return table_version(model, model.studentid == student.studentid)
+
 @student_bp.route('/complaints')
 @login_required
 @student_required
+@conditional(lambda: _own_rows_version(Complaint))
 def complaints_list():
     student = Student.query.filter_by(userid=current_user.userid).first()
     
@@ -263,6 +278,7 @@ def complaints_list():
 @student_bp.route('/payments')
 @login_required
 @student_required
+@conditional(lambda: _own_rows_version(Payment))
 def payments():
     student = Student.query.filter_by(userid=current_user.userid).first()
     payments = Payment.query.filter_by(studentid=student.studentid).order_by(Payment.created_at.desc()).all()
@@ -294,13 +310,21 @@ def submit_payment(payment_id):
             flash('All fields are required', 'warning')
             return render_template('student/submit_payment.html', payment=payment)
         
-        payment.transactionid = transaction_id  # ← FIXED: was transaction_id, should be transactionid
+        # The same bank reference can only pay for one fee (re-submissions and copied receipts)
+        if reference_in_use(transaction_id, payment.paymentid):
+            flash('⚠️ This transaction ID has already been submitted for another payment. '
+                  'Please check the reference on your bank receipt.', 'warning')
+            return render_template('student/submit_payment.html', payment=payment)
+        
+        payment.transactionid = normalize_reference(transaction_id)  # ← FIXED: was transaction_id, should be transactionid
         payment.payer_name = payer_name
         payment.paymentdate = datetime.strptime(payment_date_str, '%Y-%m-%d')
+        payment.payment_date = payment.paymentdate.date()  # Matched against bank statement dates
         payment.payment_time = datetime.strptime(payment_time_str, '%H:%M').time()
         payment.bank_name = bank_name
         payment.paymentmethod = request.form.get('paymentmethod', 'Online')  # ← ADD THIS
         payment.status = 'paid'
+        adjust_submitted({payment.studentid: payment.amount})
         
         db.session.commit()
         
@@ -312,7 +336,8 @@ def submit_payment(payment_id):
                 title="💰 New Payment Submitted",
                 message=f"Payment of ₹{payment.amount} submitted by {student.fullname} (TXN: {payment.transactionid})",
                 type='info',
-                link='/accountant/pending-payments'
+                link='/accountant/pending-payments',
+                group='payment_submitted'
             )
         
         flash('✅ Payment details submitted successfully! Awaiting accountant verification.', 'success')
@@ -323,6 +348,7 @@ def submit_payment(payment_id):
 @student_bp.route('/payment/receipt/<int:payment_id>')
 @login_required
 @student_required
+@conditional(receipt_version, badge=False)  # scoped to the caller, like the app-level receipt route
 def download_receipt(payment_id):
     """Generate and download payment receipt PDF"""
     payment = Payment.query.get_or_404(payment_id)
@@ -344,5 +370,6 @@ def download_receipt(payment_id):
         flash('Receipt only available for verified payments', 'warning')
         return redirect(url_for('student.payments'))
     
-    # Generate PDF receipt using pdf_generator utility
+    # Generate PDF receipt using pdf_generator utility (imports reportlab on first use)
+    from utils.pdf_generator import generate_payment_receipt
     return generate_payment_receipt(payment)
@@ -4,6 +4,13 @@ from models import db, RoomAllocation, Student, Room, Complaint, User, Payment
 from functools import wraps
 from datetime import datetime, timedelta
 from utils.notifications import create_notification
+from utils.cache import cached_context
+from utils.conditional import conditional, table_version
+from utils.search import search_complaints, search_args
+from utils.dispatcher import dispatcher
+from utils.duplicates import merge_duplicate
+from utils.work_queue import QUEUE_STATUSES
+from utils.ledger import post, payment_entries, DEPOSIT_MULTIPLE
 
 warden_bp = Blueprint('warden', __name__)
 
@@ -20,16 +27,15 @@ def warden_required(f):
 @login_required
 @warden_required
 def dashboard():
-    total_rooms = Room.query.count()
-    occupied_rooms = Room.query.filter(Room.current_occupancy > 0).count()
-    pending_requests = RoomAllocation.query.filter_by(status='pending_approval').count()
-    open_complaints = Complaint.query.filter_by(status='open').count()
-    
-    return render_template('warden/dashboard.html',
-                         total_rooms=total_rooms,
-                         occupied_rooms=occupied_rooms,
-                         pending_requests=pending_requests,
-                         open_complaints=open_complaints)
+    return render_template('warden/dashboard.html', **_dashboard_stats())
+
+@cached_context('warden_dashboard', tags=('rooms', 'allocations', 'complaints'))
+def _dashboard_stats():
+    """Global dashboard numbers, shared by every warden until a relevant write"""
+    return dict(total_rooms=Room.query.count(),
+                occupied_rooms=Room.query.filter(Room.current_occupancy > 0).count(),
+                pending_requests=RoomAllocation.query.filter_by(status='pending_approval').count(),
+                open_complaints=Complaint.query.filter_by(status='open').count())
 
 @warden_bp.route('/pending-requests')
 @login_required
@@ -53,7 +59,9 @@ def approve_request(allocation_id):
     room = Room.query.get_or_404(allocation.roomid)
     
     # Check if payment already exists
-    existing_payment = Payment.query.filter_by(studentid=student.studentid, status='pending').first()
+    existing_payment = Payment.query.filter_by(studentid=student.studentid, status='pending').filter(
+        db.or_(Payment.payment_type.is_(None), Payment.payment_type != 'monthly_rent')  # rent bills don't count
+    ).first()
     
     if existing_payment:
         flash('⚠️ Payment already created for this student.', 'warning')
@@ -63,18 +71,21 @@ def approve_request(allocation_id):
     allocation.status = 'pending_payment'
     
     # Calculate total (rent + 2x security)
-    total_amount = room.monthly_rent + (room.monthly_rent * 2)
+    total_amount = room.monthly_rent + (room.monthly_rent * DEPOSIT_MULTIPLE)
     
     # CREATE PAYMENT with correct status
     payment = Payment(
         studentid=student.studentid,
         amount=total_amount,
         status='pending',  # ✅ CORRECT STATUS
+        payment_type='rent_and_deposit',
         month=datetime.now().strftime('%B'),
         year=datetime.now().year
     )
     
     db.session.add(payment)
+    db.session.flush()
+    post(payment_entries(student.studentid, payment.paymentid, total_amount, payment.payment_type))
     db.session.commit()
     
     # Notify student
@@ -115,11 +126,10 @@ def reject_request(allocation_id):
 @warden_bp.route('/complaints')
 @login_required
 @warden_required
+@conditional(lambda: table_version(Complaint))
 def complaints():
-    complaints = Complaint.query.join(Student).options(
-        db.joinedload(Complaint.student)
-    ).order_by(Complaint.created_at.desc()).all()
-    return render_template('warden/complaints.html', complaints=complaints)
+    results, facets = search_complaints(**search_args(request.args))
+    return render_template('warden/complaints.html', complaints=results.items, results=results, facets=facets)
 
 @warden_bp.route('/complaint/<int:id>')
 @login_required
@@ -130,6 +140,39 @@ def complaint_detail(id):
     ).filter(Complaint.complaintid == id).first_or_404()  # ✅ CORRECT
     return render_template('warden/complaint_detail.html', complaint=complaint)
 
+@warden_bp.route('/merge-complaint/<int:complaint_id>', methods=['POST'])
+@login_required
+@warden_required
+def merge_complaint(complaint_id):
+    complaint = Complaint.query.get_or_404(complaint_id)
+    if complaint.duplicate_of is None or complaint.status in ('merged', 'resolved'):
+        flash('This complaint is not awaiting a merge', 'warning')
+        return redirect(url_for('warden.complaint_detail', id=complaint_id))
+    
+    if complaint.status in QUEUE_STATUSES and complaint.assigned_staff_id:
+        dispatcher.adjust(complaint.assigned_staff_id, -1)
+    original = merge_duplicate(complaint, request.form.get('note', '').strip() or None)
+    db.session.commit()
+    
+    flash(f'✅ Complaint merged into #{original.complaintid}', 'success')
+    return redirect(url_for('warden.complaint_detail', id=original.complaintid))
+
+@warden_bp.route('/not-duplicate/<int:complaint_id>', methods=['POST'])
+@login_required
+@warden_required
+def not_duplicate(complaint_id):
+    complaint = Complaint.query.get_or_404(complaint_id)
+    if complaint.status == 'merged':
+        flash('This complaint has already been merged', 'warning')
+        return redirect(url_for('warden.complaint_detail', id=complaint_id))
+    
+    # Cleared complaints are treated like any other: forwarded and dispatched as usual
+    complaint.duplicate_of = None
+    db.session.commit()
+    
+    flash('✅ Complaint marked as a separate issue', 'success')
+    return redirect(url_for('warden.complaint_detail', id=complaint_id))
+
 # NEW: Forward complaint to maintenance (single button)
 @warden_bp.route('/forward-complaint/<int:complaint_id>', methods=['POST'])
 @login_required
@@ -140,20 +183,18 @@ def forward_complaint(complaint_id):
         flash('This complaint has already been forwarded', 'warning')
         return redirect(url_for('warden.complaints'))
     
-    # Update complaint status to forwarded
+    # Forwarded complaints are picked up by the dispatcher on its next tick
     complaint.status = 'forwarded'
-    complaint.forwarded_at = datetime.utcnow()
     db.session.commit()
     
-    # Get maintenance user to notify
-    maintenance_user = User.query.filter_by(role='maintenance', is_active=True).first()
-    if maintenance_user:
+    for maintenance_user in User.query.filter_by(role='maintenance', is_active=True).all():
         create_notification(
             user_id=maintenance_user.userid,
             title="🔧 New Complaint Forwarded",
-            message=f"Complaint '{complaint.title}' ({complaint.category}) has been forwarded to you. Please assign staff.",
+            message=f"Complaint '{complaint.title}' ({complaint.category}) has been forwarded for assignment.",
             type='info',
-            link='/maintenance/dashboard'
+            link='/maintenance/queue',
+            group='complaint_forwarded'
         )
     
     flash('✅ Complaint forwarded to maintenance successfully', 'success')
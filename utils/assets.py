@@ -0,0 +1,143 @@
+"""Bundled, fingerprinted and precompressed static assets.
+
+Run at build time (e.g. in the Render build command):
+
+    flask --app app build-assets
+
+Templates reference bundles with asset_url('base.css'); the fingerprinted
+files under static/dist are served with immutable far-future caching, so
+they can also be handed straight to a CDN or front proxy.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from flask import current_app, request, send_file, abort
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are produced without it
+    brotli = None
+
+# Bundle name -> (source files under static/, minify?)
+BUNDLES = {
+    'base.css': (['css/style.css', 'css/animate.min.css'], True),
+    'base.js': (['js/main.js'], True),
+    'chart.js': (['js/chart.js'], False),  # Already minified upstream
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+FAR_FUTURE = 365 * 24 * 3600
+
+_manifest = None
+
+
+# ============= MINIFIERS =============
+def minify_css(text):
+    """Strip comments and collapse whitespace around CSS punctuation"""
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Conservative: drop whole-line comments, indentation and blank lines, keep line breaks"""
+    text = re.sub(r'^\s*/\*(?!!).*?\*/\s*$', '', text, flags=re.S | re.M)
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+# ============= BUILD =============
+def build_assets(static_folder):
+    """Concatenate, minify, fingerprint and precompress every bundle; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+
+    for name, (sources, minify) in BUNDLES.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        content = '\n'.join(parts)
+        if minify:
+            content = minify_css(content) if name.endswith('.css') else minify_js(content)
+        data = content.encode('utf-8')
+
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(dist, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+            with open(path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                with open(path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data, quality=11))
+        manifest[name] = filename
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _load_manifest():
+    global _manifest
+    static_folder = current_app.static_folder
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+
+    stale = _manifest is None
+    if current_app.debug and not stale and os.path.exists(path):
+        built = os.path.getmtime(path)
+        stale = any(os.path.getmtime(os.path.join(static_folder, s)) > built
+                    for sources, _ in BUNDLES.values() for s in sources)
+
+    if stale:
+        if os.path.exists(path) and not current_app.debug:
+            with open(path) as f:
+                _manifest = json.load(f)
+        else:
+            _manifest = build_assets(static_folder)
+    return _manifest
+
+
+# ============= TEMPLATE HELPER & SERVING =============
+def asset_url(name):
+    """url_for-style helper: URL of the fingerprinted build of a bundle"""
+    return f'/assets/{_load_manifest()[name]}'
+
+
+def serve_asset(filename):
+    """Serve a fingerprinted file, preferring a precompressed variant the client accepts"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    path = os.path.join(dist, os.path.basename(filename))
+    if filename == MANIFEST or not os.path.isfile(path):
+        abort(404)
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in accepted and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    mimetype = 'text/css' if filename.endswith('.css') else 'application/javascript'
+    response = send_file(path, mimetype=mimetype, max_age=FAR_FUTURE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = f'public, max-age={FAR_FUTURE}, immutable'
+    return response
+
+
+def init_assets(app):
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
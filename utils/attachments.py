@@ -0,0 +1,255 @@
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Request, Response, current_app, abort, send_file, url_for
+from flask_login import login_required
+
+# Optional: without Pillow attachments are stored and served without thumbnails.
+# Only looked up here; Pillow itself is imported by the first thumbnail.
+HAS_PIL = importlib.util.find_spec('PIL') is not None
+
+COPY_CHUNK = 64 * 1024
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.(png|jpg|gif|webp|pdf)$')
+
+# Leading bytes -> (extension, mimetype); the extension a client sends is never trusted
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'GIF87a', ('gif', 'image/gif')),
+    (b'GIF89a', ('gif', 'image/gif')),
+    (b'%PDF-', ('pdf', 'application/pdf')),
+)
+IMAGE_TYPES = ('png', 'jpg', 'gif', 'webp')
+MIMETYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'gif': 'image/gif',
+             'webp': 'image/webp', 'pdf': 'application/pdf'}
+
+
+class AttachmentError(Exception):
+    pass
+
+
+def sniff(head):
+    """(extension, mimetype) from a file's first bytes, or None for unsupported content"""
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    return None
+
+
+class UploadSpool:
+    """Writable upload target that hashes as it writes and stops storing past `limit`.
+
+    Installed as the multipart parser's file stream, so an upload is hashed and
+    written to the store's temp directory once, while the request body is read;
+    an oversized file is dropped as soon as it crosses the limit instead of
+    being buffered whole first.
+    """
+
+    def __init__(self, tmp_dir, limit):
+        os.makedirs(tmp_dir, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, prefix='upload-', delete=False)
+        self.path = self._file.name
+        self.limit = limit
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.exceeded = False
+        self.stored = False
+
+    def write(self, data):
+        if self.exceeded:
+            return len(data)
+        self.size += len(data)
+        if self.size > self.limit:
+            self.exceeded = True
+            self.discard()
+            return len(data)
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def read(self, *args):
+        return b'' if self._file.closed else self._file.read(*args)
+
+    def seek(self, *args):
+        return 0 if self._file.closed else self._file.seek(*args)
+
+    def tell(self):
+        return self.size if self._file.closed else self._file.tell()
+
+    def flush(self):
+        if not self._file.closed:
+            self._file.flush()
+
+    def move_to(self, dest):
+        """Keep the upload at dest, or drop it if identical content is already there"""
+        self._file.close()
+        if os.path.exists(dest):
+            os.remove(self.path)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(self.path, dest)
+        self.stored = True
+
+    def discard(self):
+        self._file.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        # Werkzeug closes request files at teardown; anything not stored is removed
+        self.discard()
+
+
+def streams_attachments(f):
+    """Mark a view whose file uploads go straight into the attachment store's spool"""
+    f.streams_attachments = True
+    return f
+
+
+class AttachmentRequest(Request):
+    """Streams multipart file parts of @streams_attachments views into an UploadSpool"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        store = current_app.extensions.get('attachments')
+        view = current_app.view_functions.get(self.endpoint)
+        if store is None or not getattr(view, 'streams_attachments', False):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return UploadSpool(store.tmp_dir, current_app.config['ATTACHMENT_MAX_BYTES'])
+
+
+class AttachmentStore:
+    """Content-addressed files under <root>/<aa>/<sha256>.<ext>, thumbnails under <root>/thumbs"""
+
+    def __init__(self, root, thumbnail_size=320, workers=2):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, 'tmp')
+        self.thumbnail_size = thumbnail_size
+        self.workers = workers
+        self._pool = None
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def thumbnail_path(self, key):
+        return os.path.join(self.root, 'thumbs', key[:2], key.rsplit('.', 1)[0] + '.jpg')
+
+    def save(self, file, max_bytes, types=IMAGE_TYPES + ('pdf',)):
+        """Store an uploaded FileStorage and return its key; raises AttachmentError"""
+        spool = file.stream
+        if not isinstance(spool, UploadSpool):
+            # Not parsed by AttachmentRequest (e.g. a test client stream): copy in chunks
+            spool = UploadSpool(self.tmp_dir, max_bytes)
+            for chunk in iter(lambda: file.stream.read(COPY_CHUNK), b''):
+                spool.write(chunk)
+                if spool.exceeded:
+                    break
+        try:
+            if spool.exceeded or spool.size > max_bytes:
+                raise AttachmentError(f'File must be smaller than {max_bytes // (1024 * 1024)}MB')
+            if not spool.size:
+                raise AttachmentError('The file is empty')
+            kind = sniff(spool.head)
+            if kind is None or kind[0] not in types:
+                raise AttachmentError(f'Unsupported file type (allowed: {", ".join(types).upper()})')
+            key = f'{spool.sha256.hexdigest()}.{kind[0]}'
+            spool.move_to(self.path(key))
+        finally:
+            spool.discard()
+        if kind[0] in IMAGE_TYPES:
+            self.queue_thumbnail(key)
+        return key
+
+    def queue_thumbnail(self, key):
+        if not HAS_PIL or not self.workers or os.path.exists(self.thumbnail_path(key)):
+            return None
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnail')
+        return self._pool.submit(self._make_thumbnail, key)
+
+    def _make_thumbnail(self, key):
+        from PIL import Image, ImageOps
+        dest = self.thumbnail_path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            with Image.open(self.path(key)) as image:
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.jpg')
+                with os.fdopen(fd, 'wb') as out:
+                    image.convert('RGB').save(out, 'JPEG', quality=80, optimize=True)
+            os.replace(tmp, dest)
+        except Exception as e:
+            print(f"Thumbnail error for {key}: {e}")
+
+    def send(self, key, thumbnail=False):
+        """Response for a stored file, handed to the front-end server when configured"""
+        path = self.path(key)
+        mimetype = MIMETYPES[key.rsplit('.', 1)[1]]
+        if thumbnail and os.path.exists(self.thumbnail_path(key)):
+            path, mimetype = self.thumbnail_path(key), 'image/jpeg'
+        if not os.path.exists(path):
+            abort(404)
+
+        mode = current_app.config['ATTACHMENT_SERVE']
+        if mode == 'x-accel':
+            # nginx: `location <prefix> { internal; alias <ATTACHMENT_DIR>/; }`
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = (current_app.config['ATTACHMENT_ACCEL_PREFIX'].rstrip('/') + '/' +
+                                                    os.path.relpath(path, self.root).replace(os.sep, '/'))
+        elif mode == 'x-sendfile':
+            response = Response(mimetype=mimetype)
+            response.headers['X-Sendfile'] = path
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=True, etag=False)
+        # Content never changes under a key
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
+
+def attachment_url(value, thumbnail=False):
+    """URL for an attachment key; older rows still hold a path under static/uploads"""
+    if not value:
+        return None
+    if KEY_PATTERN.match(value):
+        return url_for('attachment_thumbnail' if thumbnail else 'attachment', key=value)
+    if not value.startswith('uploads/'):
+        value = f'uploads/complaints/{value}'
+    return url_for('static', filename=value)
+
+
+def is_image(value):
+    return bool(value) and value.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'))
+
+
+def get_store():
+    return current_app.extensions['attachments']
+
+
+def init_attachments(app):
+    app.request_class = AttachmentRequest
+    app.extensions['attachments'] = AttachmentStore(app.config['ATTACHMENT_DIR'],
+                                                    app.config['ATTACHMENT_THUMBNAIL_SIZE'],
+                                                    app.config['ATTACHMENT_THUMBNAIL_WORKERS'])
+
+    @login_required
+    def attachment(key):
+        if not KEY_PATTERN.match(key):
+            abort(404)
+        return get_store().send(key)
+
+    @login_required
+    def attachment_thumbnail(key):
+        if not KEY_PATTERN.match(key):
+            abort(404)
+        return get_store().send(key, thumbnail=True)
+
+    app.add_url_rule('/attachments/<key>', 'attachment', attachment)
+    app.add_url_rule('/attachments/<key>/thumbnail', 'attachment_thumbnail', attachment_thumbnail)
+    app.jinja_env.globals.update(attachment_url=attachment_url, is_image=is_image)
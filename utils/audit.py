@@ -1,6 +1,6 @@
 from models import db, AuditLog
 from flask_login import current_user
-from flask import request
+from flask import request, has_request_context
 from datetime import datetime
 
 def log_login(user):
@@ -222,3 +222,38 @@ def log_settings_change(setting_name, old_value, new_value):
     except Exception as e:
         print(f"Audit log error: {e}")
         db.session.rollback()
+
+def log_bulk_import(kind, inserted, failed, userid=None):
+    """Record a finished import; runs in the import job, so the request may be long gone"""
+    try:
+        log = AuditLog(
+            userid=userid if userid is not None else (
+                current_user.userid if has_request_context() and current_user.is_authenticated else None),
+            action='bulk_import',
+            entity_type=kind,
+            details=f'CSV import of {kind}: {inserted} inserted, {failed} rejected',
+            ipaddress=request.remote_addr if has_request_context() else None,
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(log)
+        db.session.commit()
+    except Exception as e:
+        print(f"Audit log error: {e}")
+        db.session.rollback()
+
+def log_billing_run(run):
+    """Record a billing run, from the dashboard or from `flask run-billing` (no request)"""
+    try:
+        log = AuditLog(
+            userid=current_user.userid if has_request_context() and current_user.is_authenticated else None,
+            action='billing_run',
+            entity_type='payment',
+            details=f'Rent billing for {run.label}: {run.billed} bills raised, total {run.total:.2f}',
+            ipaddress=request.remote_addr if has_request_context() else None,
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(log)
+        db.session.commit()
+    except Exception as e:
+        print(f"Audit log error: {e}")
+        db.session.rollback()
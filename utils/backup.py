@@ -0,0 +1,390 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from utils.cache import cache
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: single process, no locking needed
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024
+
+# Line-based content-defined chunking for SQL dumps: cut after a line whose crc32
+# has the low bits clear (~1 in 512 lines), within these size bounds
+SQL_CHUNK_MIN = 16 * 1024
+SQL_CHUNK_MAX = 512 * 1024
+SQL_BOUNDARY_MASK = 0x1FF
+
+
+class BackupError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ============= SQLITE =============
+def sqlite_snapshot(db_path, target_path, pages=256, sleep=0.01):
+    """Consistent copy of a live database via the online backup API.
+
+    Copies `pages` pages per step and sleeps in between, so writers only wait
+    for one step at a time; the API restarts by itself if a writer changes the source.
+    """
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(target_path)
+    try:
+        src.backup(dst, pages=pages, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+
+
+def sqlite_restore(live_path, source_path):
+    """Overwrite the live database page by page under SQLite's own locking (WAL safe)"""
+    src = sqlite3.connect(source_path)
+    dst = sqlite3.connect(live_path, timeout=30)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def sqlite_page_chunks(path, pages_per_chunk):
+    """Fixed chunks aligned to database pages, so an unchanged page range hashes the same"""
+    conn = sqlite3.connect(path)
+    try:
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        conn.close()
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(page_size * pages_per_chunk), b'')
+
+
+# ============= POSTGRESQL =============
+def _pg_connection(url):
+    """libpq arguments for pg_dump/psql; the password goes in the environment, not argv"""
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    args = ['--dbname', url.database or '']
+    if url.host:
+        args += ['--host', url.host]
+    if url.port:
+        args += ['--port', str(url.port)]
+    if url.username:
+        args += ['--username', url.username]
+    return args, env
+
+
+def pg_dump_lines(url):
+    args, env = _pg_connection(url)
+    proc = subprocess.Popen(['pg_dump', '--format=plain', '--clean', '--if-exists', '--no-owner', *args],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    yield from proc.stdout
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise BackupError(f'pg_dump failed: {stderr.decode(errors="replace").strip()}')
+
+
+def pg_restore(url, chunks):
+    """Feed a plain SQL dump to psql in a single transaction"""
+    args, env = _pg_connection(url)
+    proc = subprocess.Popen(['psql', '--single-transaction', '--quiet', '-v', 'ON_ERROR_STOP=1', *args],
+                            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    try:
+        for chunk in chunks:
+            proc.stdin.write(chunk)
+    finally:
+        proc.stdin.close()
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise BackupError(f'psql restore failed: {stderr.decode(errors="replace").strip()}')
+
+
+def line_chunks(lines):
+    """Group dump lines into content-defined chunks; an edited row only changes its own chunk"""
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= SQL_CHUNK_MAX or (size >= SQL_CHUNK_MIN and zlib.crc32(line) & SQL_BOUNDARY_MASK == 0):
+            yield b''.join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b''.join(buf)
+
+
+# ============= CHUNK STORE =============
+class BackupStore:
+    """Content-addressed snapshots: chunks/<sha256> shared between snapshots,
+    one manifest per snapshot, and index.json so listing never touches the chunks.
+    """
+
+    def __init__(self, root, config=None):
+        config = config or {}
+        self.root = root
+        self.chunk_dir = os.path.join(root, 'chunks')
+        self.manifest_dir = os.path.join(root, 'snapshots')
+        self.index_path = os.path.join(root, 'index.json')
+        self.pages_per_chunk = config.get('BACKUP_CHUNK_PAGES', 16)
+        self.step_pages = config.get('BACKUP_STEP_PAGES', 256)
+        self.step_sleep = config.get('BACKUP_STEP_SLEEP', 0.01)
+        self.retention = (config.get('BACKUP_KEEP_HOURS', 24),
+                          config.get('BACKUP_KEEP_DAILY', 7),
+                          config.get('BACKUP_KEEP_WEEKLY', 4),
+                          config.get('BACKUP_KEEP_MONTHLY', 12))
+        os.makedirs(self.chunk_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+
+    # ----- locking and index -----
+    @contextmanager
+    def lock(self):
+        with open(os.path.join(self.root, '.lock'), 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def snapshots(self):
+        """Snapshot summaries, newest first (reads only index.json)"""
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)['snapshots']
+        except FileNotFoundError:
+            return []
+
+    def get(self, snapshot_id):
+        return next((s for s in self.snapshots() if s['id'] == snapshot_id), None)
+
+    def _write_json(self, path, data):
+        tmp_path = path + '.part'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _save_index(self, snapshots):
+        snapshots.sort(key=lambda s: (s['created'], s['id']), reverse=True)
+        self._write_json(self.index_path, {'snapshots': snapshots})
+
+    def _manifest(self, snapshot_id):
+        try:
+            with open(os.path.join(self.manifest_dir, f'{snapshot_id}.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise BackupError(f'Backup {snapshot_id} not found')
+
+    # ----- chunks -----
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _put_chunk(self, data):
+        """Store a chunk unless it already exists; returns (digest, bytes written)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data, 6)
+        tmp_path = f'{path}.{os.getpid()}.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return digest, len(compressed)
+
+    def _get_chunk(self, digest):
+        try:
+            with open(self._chunk_path(digest), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            raise BackupError(f'Missing chunk {digest[:12]}, backup is incomplete')
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f'Chunk {digest[:12]} is corrupt')
+        return data
+
+    def read(self, snapshot_id):
+        """Yield the snapshot's raw content, verifying every chunk"""
+        for digest in self._manifest(snapshot_id)['chunks']:
+            yield self._get_chunk(digest)
+
+    # ----- snapshots -----
+    def create(self, engine, kind='manual'):
+        """Snapshot the database; only chunks not already in the store are written"""
+        if engine.dialect.name == 'sqlite':
+            with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+                snapshot = os.path.join(tmp, 'snapshot.db')
+                sqlite_snapshot(engine.url.database, snapshot, pages=self.step_pages, sleep=self.step_sleep)
+                return self._ingest(sqlite_page_chunks(snapshot, self.pages_per_chunk), 'sqlite', kind)
+        if engine.dialect.name == 'postgresql':
+            return self._ingest(line_chunks(pg_dump_lines(engine.url)), 'sql', kind)
+        raise BackupError(f'Backups are not supported for {engine.dialect.name}')
+
+    def import_file(self, path, fmt, kind='imported'):
+        """Ingest a standalone backup file (.db, .db.gz or .sql.gz) into the store"""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            if fmt == 'sqlite':
+                # Legacy files are whole database copies, so page alignment still holds
+                with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+                    plain = os.path.join(tmp, 'import.db')
+                    with open(plain, 'wb') as out:
+                        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                            out.write(block)
+                    created = datetime.fromtimestamp(os.path.getmtime(path))
+                    return self._ingest(sqlite_page_chunks(plain, self.pages_per_chunk), fmt, kind, created)
+            return self._ingest(line_chunks(f), fmt, kind, datetime.fromtimestamp(os.path.getmtime(path)))
+
+    def _ingest(self, chunks, fmt, kind, created=None):
+        # Held throughout so garbage collection never removes a chunk this snapshot reuses
+        with self.lock():
+            created = created or datetime.now()
+            content = hashlib.sha256()
+            digests, size, stored = [], 0, 0
+            for data in chunks:
+                content.update(data)
+                size += len(data)
+                digest, written = self._put_chunk(data)
+                digests.append(digest)
+                stored += written
+
+            snapshot_id = created.strftime('%Y%m%d_%H%M%S_%f')
+            summary = {
+                'id': snapshot_id,
+                'created': created.isoformat(timespec='seconds'),
+                'kind': kind,
+                'format': fmt,
+                'size': size,
+                'stored': stored,
+                'chunks': len(digests),
+                'sha256': content.hexdigest(),
+            }
+            self._write_json(os.path.join(self.manifest_dir, f'{snapshot_id}.json'),
+                             dict(summary, chunks=digests))
+            snapshots = self.snapshots()
+            snapshots.append(summary)
+            self._save_index(snapshots)
+        return summary
+
+    def restore(self, engine, snapshot_id):
+        """Swap a snapshot into the live database; returns the pre_restore safety snapshot"""
+        summary = self.get(snapshot_id)
+        if summary is None:
+            raise BackupError(f'Backup {snapshot_id} not found')
+        expected = {'sqlite': 'sqlite', 'postgresql': 'sql'}.get(engine.dialect.name)
+        if summary['format'] != expected:
+            raise BackupError(f"A {summary['format']} backup cannot be restored into {engine.dialect.name}")
+
+        with tempfile.TemporaryDirectory(dir=self.root) as tmp:
+            # Reassemble and verify before touching the live database
+            source = os.path.join(tmp, 'restore')
+            with open(source, 'wb') as out:
+                for data in self.read(snapshot_id):
+                    out.write(data)
+            if file_sha256(source) != summary['sha256']:
+                raise BackupError(f'Checksum mismatch for backup {snapshot_id}')
+
+            safety = self.create(engine, kind='pre_restore')
+
+            # No pooled connection may keep a transaction (or cached schema) across the swap
+            engine.dispose()
+            try:
+                if engine.dialect.name == 'sqlite':
+                    sqlite_restore(engine.url.database, source)
+                else:
+                    with open(source, 'rb') as f:
+                        pg_restore(engine.url, iter(lambda: f.read(CHUNK_SIZE), b''))
+            finally:
+                engine.dispose()
+                cache.invalidate_all()  # cached pages describe the replaced data
+        return safety
+
+    def delete(self, snapshot_id):
+        with self.lock():
+            snapshots = [s for s in self.snapshots() if s['id'] != snapshot_id]
+            self._save_index(snapshots)
+            manifest = os.path.join(self.manifest_dir, f'{snapshot_id}.json')
+            if os.path.exists(manifest):
+                os.remove(manifest)
+            return self._collect_garbage()
+
+    # ----- retention -----
+    def prune(self):
+        """Apply the grandfather-father-son policy, then drop unreferenced chunks"""
+        with self.lock():
+            snapshots = self.snapshots()
+            keep = retained_ids(snapshots, *self.retention)
+            removed = [s for s in snapshots if s['id'] not in keep]
+            for s in removed:
+                manifest = os.path.join(self.manifest_dir, f"{s['id']}.json")
+                if os.path.exists(manifest):
+                    os.remove(manifest)
+            self._save_index([s for s in snapshots if s['id'] in keep])
+            freed = self._collect_garbage()
+        return len(removed), freed
+
+    def _collect_garbage(self):
+        """Delete chunks no manifest references; caller holds the lock"""
+        live = set()
+        for name in os.listdir(self.manifest_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.manifest_dir, name)) as f:
+                    live.update(json.load(f)['chunks'])
+        freed = 0
+        for prefix in os.listdir(self.chunk_dir):
+            prefix_dir = os.path.join(self.chunk_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if name not in live:
+                    path = os.path.join(prefix_dir, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return freed
+
+
+def retained_ids(snapshots, hours, daily, weekly, monthly, now=None):
+    """Everything from the last `hours`, plus the newest snapshot of each of the
+    last `daily` days, `weekly` ISO weeks and `monthly` months
+    """
+    ordered = sorted(snapshots, key=lambda s: (s['created'], s['id']), reverse=True)
+    keep = {ordered[0]['id']} if ordered else set()
+    cutoff = (now or datetime.now()) - timedelta(hours=hours)
+    keep.update(s['id'] for s in ordered if datetime.fromisoformat(s['created']) >= cutoff)
+    for count, period in ((daily, lambda d: d.date()),
+                          (weekly, lambda d: d.isocalendar()[:2]),
+                          (monthly, lambda d: (d.year, d.month))):
+        seen = []
+        for s in ordered:
+            key = period(datetime.fromisoformat(s['created']))
+            if key not in seen:
+                if len(seen) == count:
+                    break
+                seen.append(key)
+                keep.add(s['id'])
+    return keep
+
+
+def stream_gzip(chunks):
+    """gzip-compress raw chunks on the fly for download"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for data in chunks:
+        out = compressor.compress(data)
+        if out:
+            yield out
+    yield compressor.flush()
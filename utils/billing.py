@@ -0,0 +1,158 @@
+import calendar
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Notification, Payment, Room, RoomAllocation, Student
+from utils.ledger import entry, post
+
+MONTHLY_RENT_INDEX = 'uq_payments_monthly_rent'
+MAX_CHUNK_RETRIES = 3  # Re-reads of one chunk after overlapping runs before giving up
+
+
+class BillingRun:
+    """Outcome of billing one month: bills raised, their total, and students with nothing to bill"""
+
+    def __init__(self, year, month):
+        self.year, self.month = year, month
+        self.period = calendar.month_name[month]
+        self.billed = 0
+        self.total = 0.0
+        self.skipped = 0
+
+    @property
+    def label(self):
+        return f'{self.period} {self.year}'
+
+
+def parse_period(value):
+    """(year, month) from 'YYYY-MM'; raises ValueError"""
+    parsed = datetime.strptime(value, '%Y-%m')
+    return parsed.year, parsed.month
+
+
+def prorated_rent(monthly_rent, year, month, start=None, end=None):
+    """Rent for the days of the month inside [start, end]; whole months are billed in full"""
+    days = calendar.monthrange(year, month)[1]
+    first, last = date(year, month, 1), date(year, month, days)
+    start = max(start.date() if isinstance(start, datetime) else start or first, first)
+    end = min(end.date() if isinstance(end, datetime) else end or last, last)
+    billable = (end - start).days + 1
+    if billable <= 0:
+        return 0.0
+    if billable >= days:
+        return float(monthly_rent)
+    return round(monthly_rent * billable / days, 2)
+
+
+def student_rent(allocations, year, month):
+    """(rent, room labels) for one student's allocations in the month, in move-in order.
+
+    Each room is billed for its own days; a day already covered by the
+    previous room (the move-out day is also the next move-in day) is not
+    billed twice.
+    """
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    total, rooms, covered_until = 0.0, [], None
+    for allocation in allocations:
+        start, end = (value.date() if isinstance(value, datetime) else value
+                      for value in (allocation.allocationdate, allocation.checkout_date))
+        if covered_until and (start is None or start <= covered_until):
+            start = covered_until + timedelta(days=1)
+        amount = prorated_rent(allocation.monthly_rent or 0, year, month, start, end)
+        if amount > 0:
+            total += amount
+            rooms.append(f'{allocation.block}-{allocation.roomnumber}')
+        covered_until = max(covered_until or date.min, end or last)
+    return round(total, 2), rooms
+
+
+def _billed_concurrently(error):
+    """Whether an IntegrityError came from the one-rent-bill-per-month index (another run got there first)"""
+    message = str(error.orig)
+    index = next(i for i in Payment.__table__.indexes if i.name == MONTHLY_RENT_INDEX)
+    sqlite_message = 'UNIQUE constraint failed: ' + ', '.join(f'payments.{c.name}' for c in index.columns)
+    return MONTHLY_RENT_INDEX in message or sqlite_message in message
+
+
+def run_billing(year, month, chunk_size=1000):
+    """Raise the month's rent bill for every student in a room during it; safe to re-run.
+
+    Students are read a chunk at a time in id order, each chunk already
+    excluding students who have a payment for the month (including the
+    rent-and-deposit payment raised on approval, which covers its own month).
+    A student who changed rooms during the month gets one bill covering the
+    days in each room. Bills go in with their ledger charges and notifications
+    in one transaction per chunk, so a re-run, or a run resumed after a
+    failure, only bills who is left.
+    """
+    run = BillingRun(year, month)
+    first = datetime(year, month, 1)
+    next_month = first + timedelta(days=calendar.monthrange(year, month)[1])
+    in_month = (
+        # Still in the room, or left during the month being billed
+        or_(RoomAllocation.status == 'active', RoomAllocation.checkout_date >= first),
+        or_(RoomAllocation.allocationdate.is_(None), RoomAllocation.allocationdate < next_month),
+    )
+    billed = (select(Payment.paymentid)
+              .where(Payment.studentid == RoomAllocation.studentid,
+                     Payment.year == year, Payment.month == run.period)
+              .exists())
+    last_id, retries = 0, 0
+    while True:
+        student_ids = db.session.scalars(
+            select(RoomAllocation.studentid)
+            .where(RoomAllocation.studentid > last_id, *in_month, ~billed)
+            .group_by(RoomAllocation.studentid)
+            .order_by(RoomAllocation.studentid)
+            .limit(chunk_size)
+        ).all()
+        if not student_ids:
+            return run
+        last_id = student_ids[-1]
+        rows = db.session.execute(
+            select(RoomAllocation.studentid, RoomAllocation.allocationdate, RoomAllocation.checkout_date,
+                   Room.monthly_rent, Room.block, Room.roomnumber, Student.userid)
+            .join(Room, Room.roomid == RoomAllocation.roomid)
+            .join(Student, Student.studentid == RoomAllocation.studentid)
+            .where(RoomAllocation.studentid.in_(student_ids), *in_month)
+            .order_by(RoomAllocation.studentid, RoomAllocation.allocationdate, RoomAllocation.allocationid)
+        ).all()
+
+        now, payments, notifications = datetime.utcnow(), [], []
+        for studentid, allocations in groupby(rows, key=lambda row: row.studentid):
+            allocations = list(allocations)
+            amount, rooms = student_rent(allocations, year, month)
+            if amount <= 0:
+                run.skipped += 1
+                continue
+            payments.append({'studentid': studentid, 'amount': amount, 'status': 'pending',
+                             'payment_type': 'monthly_rent', 'month': run.period, 'year': year,
+                             'paymentdate': now, 'created_at': now, 'updated_at': now})
+            notifications.append({
+                'userid': allocations[0].userid, 'title': f"🧾 Rent Due for {run.label}",
+                'message': f"Your rent of ₹{amount:,.2f} for Room {' and '.join(rooms)} "
+                           f"for {run.label} is due. Please submit your payment details.",
+                'type': 'info', 'link': '/student/payments', 'created_at': now})
+            run.total += amount
+        try:
+            if payments:
+                paymentids = db.session.scalars(
+                    insert(Payment).returning(Payment.paymentid, sort_by_parameter_order=True), payments
+                ).all()
+                post([entry(p['studentid'], 'charge', p['amount'], paymentid, f'Rent for {run.label}')
+                      for p, paymentid in zip(payments, paymentids)], now)
+                db.session.execute(insert(Notification), notifications)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            retries += 1
+            if not _billed_concurrently(e) or retries > MAX_CHUNK_RETRIES:
+                raise
+            # An overlapping run billed some of these first: re-read the chunk without them
+            run.skipped -= len(student_ids) - len(payments)
+            run.total -= sum(p['amount'] for p in payments)
+            last_id = student_ids[0] - 1
+            continue
+        retries = 0
+        run.billed += len(payments)
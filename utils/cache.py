@@ -0,0 +1,199 @@
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from utils.db_routing import on_primary
+
+# Which cache tags a write to each table invalidates
+TABLE_TAGS = {
+    'payments': 'payments',
+    'ledger_accounts': 'payments',
+    'rooms': 'rooms',
+    'complaints': 'complaints',
+    'room_allocations': 'allocations',
+    'users': 'users',
+    'students': 'users',
+}
+
+
+# ============= BACKENDS =============
+class LocalBackend:
+    """In-process tag versions; values live only in the per-worker LRU"""
+
+    def __init__(self):
+        self.versions = {}
+        self._lock = threading.Lock()
+
+    def get_versions(self, tags):
+        return [self.versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self.versions[tag] = self.versions.get(tag, 0) + 1
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+
+class RedisBackend:
+    """Shared tag versions and values, so a write in one worker invalidates all workers"""
+
+    def __init__(self, url, prefix='hostelhub:cache:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_versions(self, tags):
+        values = self.client.mget([f'{self.prefix}tag:{tag}' for tag in tags])
+        return [int(v) if v else 0 for v in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f'{self.prefix}tag:{tag}')
+        pipe.execute()
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+
+# ============= CACHE =============
+class TaggedCache:
+    """Per-worker LRU in front of a pluggable backend; keys embed the versions of their tags"""
+
+    def __init__(self):
+        self.backend = LocalBackend()
+        self.enabled = True
+        self.max_entries = 256
+        self.ttl = 300
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('CACHE_LOCAL_SIZE', 256)
+        self.ttl = app.config.get('CACHE_TTL', 300)
+        redis_url = app.config.get('CACHE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisBackend(redis_url)
+        elif app.config.get('WEB_CONCURRENCY', 1) > 1:
+            # Local tag versions only see this worker's writes; the others would serve stale pages
+            self.enabled = False
+            print("Dashboard cache disabled: several workers need CACHE_REDIS_URL to share invalidations")
+
+    def get_or_compute(self, name, tags, compute, *key_parts):
+        if not self.enabled:
+            return compute()
+        versions = self.backend.get_versions(tags)
+        key = ':'.join([name] + [str(p) for p in key_parts] + [str(v) for v in versions])
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = self.backend.get(key)
+        if value is None:
+            value = compute()
+            self.backend.set(key, value, self.ttl)
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, tags):
+        if tags:
+            self.backend.bump(tags)
+
+    def invalidate_all(self):
+        """Forget everything, e.g. after the database was restored underneath the app"""
+        self.invalidate(set(TABLE_TAGS.values()))
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = TaggedCache()
+
+
+def cached_context(name, tags):
+    """Cache a function's returned template context until a write touches one of `tags`.
+
+    The value is computed on the primary: it is stored under the current tag
+    versions, so a lagging replica's answer would be served as fresh until the
+    next write.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args):
+            def compute():
+                with on_primary():
+                    return f(*args)
+            return cache.get_or_compute(name, tags, compute, *args)
+        return decorated_function
+    return decorator
+
+
+# ============= WRITE TRACKING =============
+# Every write reaches the database as one of these, whether it came from an
+# ORM flush, a bulk statement, Core, text() or exec_driver_sql
+WRITE_SQL = re.compile(r'\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)'
+                       r'\s+["`\[]?(\w+)', re.IGNORECASE)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _track_write(conn, cursor, statement, parameters, context, executemany):
+    match = WRITE_SQL.match(statement)
+    if match and match.group(1).lower() in TABLE_TAGS:
+        conn.info.setdefault('changed_tables', set()).add(match.group(1).lower())
+
+
+@event.listens_for(Engine, 'commit')
+def _hold_until_committed(conn):
+    # Fires just before the COMMIT; bumping now would let another worker cache
+    # pre-commit data under the new versions, so wait for the connection's
+    # next transaction or its return to the pool
+    tables = conn.info.pop('changed_tables', None)
+    if tables:
+        conn.info.setdefault('committed_tables', set()).update(tables)
+
+
+@event.listens_for(Engine, 'rollback')
+def _discard_on_rollback(conn):
+    conn.info.pop('changed_tables', None)
+
+
+def _invalidate_committed(info):
+    tables = info.pop('committed_tables', None)
+    if tables:
+        cache.invalidate({TABLE_TAGS[t] for t in tables})
+
+
+@event.listens_for(Engine, 'begin')
+def _invalidate_before_next_transaction(conn):
+    _invalidate_committed(conn.info)
+
+
+@event.listens_for(Pool, 'checkin')
+def _invalidate_on_checkin(dbapi_connection, connection_record):
+    if connection_record is not None:
+        _invalidate_committed(connection_record.info)
@@ -0,0 +1,126 @@
+import numpy as np
+from sqlalchemy import select
+from models import db, Complaint, ComplaintEvent, MaintenanceStaff, Room
+
+STATUSES = ('open', 'forwarded', 'assigned', 'in_progress', 'resolved')
+PERCENTILES = (50, 90, 95)
+
+
+def _epoch_seconds(values):
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def load_event_log(since=None):
+    """The event log as parallel arrays sorted by (complaint, time): complaint, status code, epoch seconds"""
+    query = select(ComplaintEvent.complaintid, ComplaintEvent.to_status, ComplaintEvent.created_at)
+    if since is not None:
+        lodged = select(ComplaintEvent.complaintid).where(ComplaintEvent.from_status.is_(None),
+                                                          ComplaintEvent.created_at >= since)
+        query = query.where(ComplaintEvent.complaintid.in_(lodged))
+    rows = db.session.execute(query).all()
+    if not rows:
+        empty = np.array([], dtype=np.int64)
+        return {'complaint': empty, 'status': empty.astype(np.int8), 'ts': empty}
+    complaint, status, created_at = zip(*rows)
+    codes = {name: i for i, name in enumerate(STATUSES)}
+    log = {
+        'complaint': np.array(complaint, dtype=np.int64),
+        'status': np.array([codes.get(s, -1) for s in status], dtype=np.int8),
+        'ts': _epoch_seconds(created_at),
+    }
+    order = np.lexsort((log['ts'], log['complaint']))
+    return {key: values[order] for key, values in log.items()}
+
+
+def resolution_times(log):
+    """(complaint ids, seconds from lodged to first resolution) for every resolved complaint"""
+    complaint, status, ts = log['complaint'], log['status'], log['ts']
+    ids, first = np.unique(complaint, return_index=True)
+    resolved = status == STATUSES.index('resolved')
+    resolved_ids, first_resolved = np.unique(complaint[resolved], return_index=True)
+    lodged_at = ts[first][np.searchsorted(ids, resolved_ids)]
+    return resolved_ids, ts[resolved][first_resolved] - lodged_at
+
+
+def status_seconds(log):
+    """Average seconds a complaint spends in each status it passes through"""
+    complaint, status, ts = log['complaint'], log['status'], log['ts']
+    same = complaint[1:] == complaint[:-1]
+    spans = (ts[1:] - ts[:-1])[same]
+    states = status[:-1][same].astype(np.int64)
+    valid = states >= 0
+    total = np.bincount(states[valid], weights=spans[valid], minlength=len(STATUSES))
+    visits = np.bincount(states[valid], minlength=len(STATUSES))
+    return dict(zip(STATUSES, total / np.maximum(visits, 1)))
+
+
+def grouped_percentiles(codes, values, labels, percentiles=PERCENTILES):
+    """Percentiles of values per group code in one sort (linear interpolation, like np.percentile)"""
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order].astype(np.float64)
+    counts = np.bincount(codes, minlength=len(labels))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    result = {'label': np.asarray(labels, dtype=object)[present], 'count': counts[present],
+              'mean': np.bincount(codes, weights=values, minlength=len(labels))[present] / counts[present]}
+    for p in percentiles:
+        position = starts[present] + (counts[present] - 1) * (p / 100)
+        low, high = np.floor(position).astype(np.int64), np.ceil(position).astype(np.int64)
+        result[f'p{p}'] = values[low] + (values[high] - values[low]) * (position - low)
+    return result
+
+
+def _rows(groups, scale):
+    """Template-friendly rows, busiest group first, durations divided by scale"""
+    keys = [k for k in groups if k not in ('label', 'count')]
+    rows = [dict({'label': label, 'count': int(count)},
+                 **{k: round(float(groups[k][i]) / scale, 1) for k in keys})
+            for i, (label, count) in enumerate(zip(groups['label'], groups['count']))]
+    return sorted(rows, key=lambda row: -row['count'])
+
+
+def _dimension(values, missing):
+    """Group codes and labels for a column of keys, None counted as `missing`"""
+    keys = np.where(values == None, missing, values).astype(str)  # noqa: E711 (elementwise)
+    labels, codes = np.unique(keys, return_inverse=True)
+    return codes.ravel(), labels.tolist()
+
+
+def resolution_report(since=None):
+    """Resolution-time percentiles (hours) overall and by category, block and staff, from the event log"""
+    log = load_event_log(since)
+    ids, seconds = resolution_times(log)
+    time_in_status = {k: round(float(v) / 3600, 1) for k, v in status_seconds(log).items() if k != 'resolved'}
+    report = {'resolved': 0, 'overall': None, 'by_category': [], 'by_block': [], 'by_staff': [],
+              'hours_in_status': time_in_status}
+    if not len(ids):
+        return report
+
+    staff_names = dict(db.session.execute(select(MaintenanceStaff.staff_id, MaintenanceStaff.name)).all())
+    dims = db.session.execute(
+        select(Complaint.complaintid, Complaint.category, Room.block, Complaint.assigned_staff_id)
+        .outerjoin(Room, Room.roomid == Complaint.roomid)
+        .where(Complaint.complaintid.in_(select(ComplaintEvent.complaintid)
+                                         .where(ComplaintEvent.to_status == 'resolved')))
+        .order_by(Complaint.complaintid)
+    ).all()
+    if not dims:
+        return report
+    dim_ids, category, block, staff_id = (np.array(column, dtype=object) for column in zip(*dims))
+    # Line each resolved complaint up with its row (complaints deleted since have none)
+    pos = np.searchsorted(dim_ids.astype(np.int64), ids)
+    keep = (pos < len(dim_ids)) & (dim_ids[np.minimum(pos, len(dim_ids) - 1)] == ids)
+    ids, seconds, pos = ids[keep], seconds[keep], pos[keep]
+    staff = np.array([staff_names.get(s) for s in staff_id], dtype=object)
+    if not len(ids):
+        return report
+
+    report['resolved'] = int(len(ids))
+    overall = grouped_percentiles(np.zeros(len(ids), dtype=np.int64), seconds, ['All'])
+    report['overall'] = _rows(overall, 3600)[0]
+    for name, column, missing in (('by_category', category, 'uncategorised'),
+                                  ('by_block', block, 'general area'),
+                                  ('by_staff', staff, 'unassigned')):
+        codes, labels = _dimension(column[pos], missing)
+        report[name] = _rows(grouped_percentiles(codes, seconds, labels), 3600)
+    return report
@@ -0,0 +1,124 @@
+from datetime import datetime
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import event, inspect, insert, select, update, bindparam
+from sqlalchemy.orm import Session
+from models import db, Complaint, ComplaintEvent
+
+# Status -> Complaint column accumulating the seconds spent in it
+DURATION_COLUMNS = {
+    'open': 'open_seconds',
+    'forwarded': 'forwarded_seconds',
+    'assigned': 'assigned_seconds',
+    'in_progress': 'in_progress_seconds',
+}
+BACKFILL_BATCH = 1000
+
+
+def _seconds(since, now):
+    return max(int((now - since).total_seconds()), 0) if since else 0
+
+
+def _actor():
+    if has_request_context() and current_user and current_user.is_authenticated:
+        return current_user.userid
+    return None
+
+
+@event.listens_for(Complaint.status, 'set', active_history=True)
+def _load_previous_status(target, value, oldvalue, initiator):
+    # Registered for active_history: the old status is loaded when status is
+    # set on an expired instance (e.g. after a commit), so the flush below
+    # still sees the transition in the attribute history
+    pass
+
+
+@event.listens_for(Session, 'before_flush')
+def _record_status_changes(session, flush_context, instances):
+    now = datetime.utcnow()
+    for obj in session.new:
+        if isinstance(obj, Complaint):
+            obj.status = obj.status or 'open'
+            obj.status_changed_at = obj.created_at = obj.created_at or now
+            session.add(ComplaintEvent(complaint=obj, to_status=obj.status, staff_id=obj.assigned_staff_id,
+                                       actor_userid=_actor(), created_at=obj.created_at))
+    for obj in session.dirty:
+        if not isinstance(obj, Complaint):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes() or not history.deleted or history.deleted[0] == obj.status:
+            continue
+        previous = history.deleted[0]
+        column = DURATION_COLUMNS.get(previous)
+        if column:
+            setattr(obj, column, (getattr(obj, column) or 0) +
+                    _seconds(obj.status_changed_at or obj.created_at, now))
+        obj.status_changed_at = now
+        if obj.status == 'resolved':
+            obj.resolution_seconds = _seconds(obj.created_at, now)
+        session.add(ComplaintEvent(complaint=obj, from_status=previous, to_status=obj.status,
+                                   staff_id=obj.assigned_staff_id, actor_userid=_actor(), created_at=now))
+
+
+def record_transitions(rows, to_status, now, staff_id=None):
+    """Log a transition made by a bulk UPDATE, which skips the flush hook.
+
+    rows are (complaintid, from_status, status_changed_at) as they were before the update.
+    """
+    if not rows:
+        return
+    table = Complaint.__table__
+    by_status = {}
+    for complaintid, from_status, changed_at in rows:
+        by_status.setdefault(from_status, []).append({'id': complaintid, 'secs': _seconds(changed_at, now)})
+    for from_status, params in by_status.items():
+        values = {'status_changed_at': now}
+        column = DURATION_COLUMNS.get(from_status)
+        if column:
+            values[column] = table.c[column] + bindparam('secs')
+        db.session.execute(update(table).where(table.c.complaintid == bindparam('id')).values(values), params)
+    db.session.execute(insert(ComplaintEvent), [
+        {'complaintid': complaintid, 'from_status': from_status, 'to_status': to_status,
+         'staff_id': staff_id, 'created_at': now}
+        for complaintid, from_status, _ in rows
+    ])
+
+
+def backfill_events(connection):
+    """Give complaints lodged before the event log a lodged (and resolved) event; returns complaints done.
+
+    Their intermediate history was never recorded: the time up to resolution
+    is counted as open, and an unresolved complaint is taken to have been in
+    its current status since it was lodged.
+    """
+    table, events = Complaint.__table__, ComplaintEvent.__table__
+    rows = connection.execute(
+        select(table.c.complaintid, table.c.created_at, table.c.resolvedat, table.c.status)
+        .where(~select(events.c.eventid).where(events.c.complaintid == table.c.complaintid).exists())
+    ).all()
+    now = datetime.utcnow()
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        batch = rows[start:start + BACKFILL_BATCH]
+        new_events, durations = [], []
+        for complaintid, created_at, resolvedat, status in batch:
+            created_at = created_at or now
+            new_events.append({'complaintid': complaintid, 'from_status': None, 'to_status': 'open',
+                               'created_at': created_at})
+            if resolvedat:
+                new_events.append({'complaintid': complaintid, 'from_status': 'open', 'to_status': 'resolved',
+                                   'created_at': resolvedat})
+                durations.append({'id': complaintid, 'open': _seconds(created_at, resolvedat),
+                                  'resolution': _seconds(created_at, resolvedat), 'changed': resolvedat})
+            else:
+                if status and status != 'open':
+                    new_events.append({'complaintid': complaintid, 'from_status': 'open', 'to_status': status,
+                                       'created_at': created_at})
+                durations.append({'id': complaintid, 'open': 0, 'resolution': None,
+                                  'changed': created_at})
+        connection.execute(insert(events), new_events)
+        connection.execute(
+            update(table).where(table.c.complaintid == bindparam('id')).values(
+                open_seconds=bindparam('open'), resolution_seconds=bindparam('resolution'),
+                status_changed_at=bindparam('changed')),
+            durations)
+    return len(rows)
@@ -0,0 +1,68 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+from models import db, Notification
+
+
+def conditional(version_fn, badge=True):
+    """Answer 304 Not Modified before running the view when the client's copy is current.
+
+    version_fn takes the view's arguments and returns a cheap version key (a tuple
+    of counts and timestamps), or None to skip validation for this request.
+    Pages that extend base.html also depend on the unread notification badge.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Pending flash messages would be lost on a 304
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            version = version_fn(*args, **kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+            version = tuple(version)
+            if badge:
+                version += (unread_count(),)
+
+            user_key = current_user.get_id() if current_user.is_authenticated else None
+            etag = hashlib.sha1(repr((user_key, request.full_path, version)).encode()).hexdigest()
+            timestamps = [v for v in version if isinstance(v, datetime)]
+            last_modified = max(timestamps).replace(microsecond=0) if timestamps else None
+
+            if request.if_none_match:
+                not_modified = etag in request.if_none_match
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since.replace(tzinfo=None))
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def unread_count():
+    if not current_user.is_authenticated:
+        return 0
+    return Notification.query.filter_by(userid=current_user.userid, is_read=False).count()
+
+
+def table_version(model, *criteria):
+    """(row count, latest updated_at) for a model, optionally scoped by criteria"""
+    return db.session.query(
+        db.func.count(),
+        db.func.max(model.updated_at)
+    ).select_from(model).filter(*criteria).one()
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, NullPool
+
+# Checkout wait histogram buckets (seconds), Prometheus style
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+class PoolMetrics:
+    """Per-worker connection pool counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * len(WAIT_BUCKETS)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    _local = threading.local()
+
+    def _do_get(self):
+        # QueuePool._do_get recurses; only time the outermost call
+        if getattr(self._local, 'timing', False):
+            return super()._do_get()
+        self._local.timing = True
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            self._local.timing = False
+        pool_metrics.record_wait(time.perf_counter() - started)
+        return conn
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for a server database (PostgreSQL) from DB_* settings"""
+    if config.get('DB_PGBOUNCER'):
+        # PgBouncer in transaction mode does the pooling; a client-side pool would
+        # pin server connections, and it rejects unknown startup parameters.
+        return {
+            'poolclass': NullPool,
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        }
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+def install_engine_hooks(engine, config):
+    """Per-transaction settings that cannot go in the connection startup packet"""
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+    if config.get('DB_PGBOUNCER') and timeout:
+        # SET LOCAL only lasts for the transaction, so it is safe under transaction pooling
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def render_metrics(engine):
+    """Prometheus text exposition of this worker's pool state"""
+    pool = engine.pool
+    pid = os.getpid()
+    lines = []
+
+    def metric(name, value, labels=''):
+        label_str = f'{{pid="{pid}"{labels}}}'
+        lines.append(f'hostelhub_db_pool_{name}{label_str} {value}')
+
+    if isinstance(pool, QueuePool):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        metric('size', pool.size())
+        metric('checked_out', pool.checkedout())
+        metric('overflow', pool.overflow())
+        metric('saturation', round(pool.checkedout() / capacity, 4) if capacity else 0)
+
+    metric('checkouts_total', pool_metrics.checkouts)
+    metric('timeouts_total', pool_metrics.timeouts)
+    metric('checkout_wait_seconds_max', round(pool_metrics.wait_max, 6))
+    for bound, count in zip(WAIT_BUCKETS, pool_metrics.buckets):
+        metric('checkout_wait_seconds_bucket', count, f',le="{bound}"')
+    metric('checkout_wait_seconds_bucket', pool_metrics.checkouts, ',le="+Inf"')
+    metric('checkout_wait_seconds_sum', round(pool_metrics.wait_sum, 6))
+    metric('checkout_wait_seconds_count', pool_metrics.checkouts)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_request_context, current_app, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, Select
+from sqlalchemy.orm import Session as BaseSession
+
+REPLICA_BIND = 'replica'
+
+# Postgres standby: seconds since the last replayed transaction (0 when fully caught up)
+PG_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class ReplicaHealth:
+    """Per-worker cached view of replica lag, refreshed at most every check interval"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_at = 0.0
+        self.healthy = False
+        self.lag = None
+
+    def ok(self, engine, max_lag, interval):
+        now = time.monotonic()
+        if now - self.checked_at >= interval:
+            with self._lock:
+                if now - self.checked_at >= interval:
+                    self.checked_at = now
+                    self.lag = self._measure(engine)
+                    self.healthy = self.lag is not None and self.lag <= max_lag
+        return self.healthy
+
+    def _measure(self, engine):
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    return float(conn.exec_driver_sql(PG_LAG_SQL).scalar() or 0)
+                # Local testing with a second SQLite file: just check it answers
+                conn.exec_driver_sql('SELECT 1')
+                return 0.0
+        except Exception as e:
+            print(f"Replica check error: {e}")
+            return None
+
+
+replica_health = ReplicaHealth()
+
+
+class RoutingSession(Session):
+    """Sends reads from @read_only views to the replica bind, everything else to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or not has_request_context() or not g.get('read_only') or g.get('primary_only'):
+            return False
+        if not isinstance(clause, Select):
+            # INSERT/UPDATE/DELETE, and session.connection() (clause None), always go to the primary
+            return False
+        if REPLICA_BIND not in self._db.engines:
+            return False
+
+        config = current_app.config
+        # Read-your-writes: right after this user's own write, stay on the primary
+        last_write = flask_session.get('_last_write', 0)
+        if time.time() - last_write < config['REPLICA_RYW_WINDOW']:
+            return False
+        return replica_health.ok(self._db.engines[REPLICA_BIND],
+                                 config['REPLICA_MAX_LAG'],
+                                 config['REPLICA_LAG_CHECK_INTERVAL'])
+
+
+def read_only(f):
+    """Mark a view as read-only so its queries may be served by the replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextmanager
+def on_primary():
+    """Read from the primary inside a @read_only view, e.g. for results that outlive the request"""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('primary_only', False)
+    g.primary_only = True
+    try:
+        yield
+    finally:
+        g.primary_only = previous
+
+
+# ============= WRITE TRACKING (read-your-writes) =============
+@event.listens_for(BaseSession, 'after_flush')
+def _mark_flush_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(BaseSession, 'do_orm_execute')
+def _mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(BaseSession, 'after_commit')
+def _remember_write(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.wrote = True
+
+
+@event.listens_for(BaseSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+
+def init_routing(app):
+    @app.after_request
+    def stamp_last_write(response):
+        if g.get('wrote'):
+            flask_session['_last_write'] = time.time()
+        return response
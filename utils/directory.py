@@ -0,0 +1,232 @@
+import re
+from sqlalchemy import event, func, select, delete, insert, inspect
+from sqlalchemy.orm import Session
+from models import db, User, Student, DirectoryNgram
+
+# Query words shorter than a trigram match the start of a word ('jo' -> John, Jones)
+PREFIX_LENGTH = 2
+REBUILD_BATCH = 1000
+
+# PostgreSQL: pg_trgm GIN indexes let ILIKE '%x%' use an index
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING GIN (username gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING GIN (email gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_fullname_trgm ON students USING GIN (fullname gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_rollnumber_trgm ON students USING GIN (rollnumber gin_trgm_ops)",
+]
+
+
+def _tokens(text):
+    return re.findall(r'[a-z0-9]+', (text or '').lower())
+
+
+def index_grams(*values):
+    """Grams stored for a user: every trigram of every word, plus short word prefixes"""
+    grams = set()
+    for token in _tokens(' '.join(v for v in values if v)):
+        for k in range(1, min(len(token), PREFIX_LENGTH) + 1):
+            grams.add('^' + token[:k])
+        for i in range(len(token) - 2):
+            grams.add(token[i:i + 3])
+    return grams
+
+
+def query_grams(q):
+    """Grams a user must have for every query word to possibly match"""
+    grams = set()
+    for token in _tokens(q):
+        if len(token) <= PREFIX_LENGTH:
+            grams.add('^' + token)
+        else:
+            grams.update(token[i:i + 3] for i in range(len(token) - 2))
+    return grams
+
+
+# ============= SQLITE SIDE TABLE =============
+def reindex_users(connection, userids):
+    """Recompute the n-gram rows of the given users (no-op outside SQLite)"""
+    userids = [u for u in userids if u is not None]
+    if not userids or connection.dialect.name != 'sqlite':
+        return
+    ngrams = DirectoryNgram.__table__
+    connection.execute(delete(ngrams).where(ngrams.c.userid.in_(userids)))
+    rows = connection.execute(
+        select(User.userid, User.username, User.email, Student.fullname, Student.rollnumber)
+        .outerjoin(Student, Student.userid == User.userid)
+        .where(User.userid.in_(userids))
+    ).all()
+    grams = {}
+    for userid, *values in rows:
+        grams.setdefault(userid, set()).update(index_grams(*values))
+    params = [{'gram': g, 'userid': userid} for userid, gs in grams.items() for g in gs]
+    if params:
+        connection.execute(insert(ngrams), params)
+
+
+def rebuild_directory_index(connection):
+    """Create the search indexes and re-index every user; returns users indexed"""
+    if connection.dialect.name == 'postgresql':
+        for ddl in POSTGRES_TRGM_DDL:
+            connection.exec_driver_sql(ddl)
+        return 0
+    if connection.dialect.name != 'sqlite':
+        return 0
+    connection.execute(delete(DirectoryNgram.__table__))
+    userids = connection.execute(select(User.userid).order_by(User.userid)).scalars().all()
+    for start in range(0, len(userids), REBUILD_BATCH):
+        reindex_users(connection, userids[start:start + REBUILD_BATCH])
+    return len(userids)
+
+
+def install_directory_index(connection):
+    """Idempotent setup for init_db: PostgreSQL indexes, or a first SQLite build"""
+    for index in Student.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    if connection.dialect.name == 'postgresql':
+        rebuild_directory_index(connection)
+    elif connection.dialect.name == 'sqlite':
+        DirectoryNgram.__table__.create(connection, checkfirst=True)
+        empty = connection.execute(select(DirectoryNgram.userid).limit(1)).first() is None
+        if empty:
+            rebuild_directory_index(connection)
+
+
+def _changed(obj, *fields):
+    state = inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_directory_index(session, flush_context):
+    # Still the pre-flush view of new/dirty/deleted, with attribute history intact
+    changed, removed = set(), set()
+    for obj in session.new:
+        if isinstance(obj, (User, Student)):
+            changed.add(obj.userid)
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj, 'username', 'email'):
+            changed.add(obj.userid)
+        elif isinstance(obj, Student) and _changed(obj, 'fullname', 'rollnumber', 'userid'):
+            changed.add(obj.userid)
+            changed.update(inspect(obj).attrs.userid.history.deleted or ())
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            removed.add(obj.userid)
+        elif isinstance(obj, Student):
+            changed.add(obj.userid)
+    if not (changed or removed):
+        return
+    connection = session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    reindex_users(connection, changed - removed)
+    if removed:
+        ngrams = DirectoryNgram.__table__
+        connection.execute(delete(ngrams).where(ngrams.c.userid.in_(removed)))
+
+
+# ============= SEARCH =============
+def _score(q_tokens, fields):
+    """Relevance of one user, or None if some query word matches none of its words"""
+    words = _tokens(' '.join(f for f in fields if f))
+    score = 0
+    for t in q_tokens:
+        if t in words:
+            score += 3
+        elif any(w.startswith(t) for w in words):
+            score += 2
+        elif len(t) > PREFIX_LENGTH and any(t in w for w in words):
+            score += 1
+        else:
+            return None
+    return score
+
+
+def _ranked_userids(q, role=None, active=None):
+    """Ids of the users matching every word of q, best first"""
+    q_tokens = _tokens(q)
+    if not q_tokens:
+        return []
+
+    # Rank on the matched columns only; full rows are loaded for the page shown
+    query = (select(User.userid, User.username, User.email, Student.fullname, Student.rollnumber)
+             .outerjoin(Student, Student.userid == User.userid))
+    if role:
+        query = query.where(User.role == role)
+    if active is not None:
+        query = query.where(User.is_active == active)
+
+    if db.engine.dialect.name == 'sqlite':
+        grams = query_grams(q)
+        candidates = (select(DirectoryNgram.userid)
+                      .where(DirectoryNgram.gram.in_(grams))
+                      .group_by(DirectoryNgram.userid)
+                      .having(func.count() == len(grams)))
+        query = query.where(User.userid.in_(candidates))
+    else:
+        for t in q_tokens:
+            pattern = f'%{t}%'
+            query = query.where(db.or_(User.username.ilike(pattern), User.email.ilike(pattern),
+                                       Student.fullname.ilike(pattern), Student.rollnumber.ilike(pattern)))
+
+    # Candidates are a superset (grams may come from different words); verify and rank all of them
+    ranked = []
+    for userid, username, *fields in db.session.execute(query):
+        score = _score(q_tokens, (username, *fields))
+        if score is not None:
+            ranked.append((-score, username or '', userid))
+    ranked.sort()
+    return [userid for _, _, userid in ranked]
+
+
+def _load(userids):
+    """(User, Student or None) pairs in the order of userids"""
+    if not userids:
+        return []
+    rows = {user.userid: (user, student) for user, student in
+            db.session.query(User, Student).outerjoin(Student, Student.userid == User.userid)
+            .filter(User.userid.in_(userids))}
+    return [rows[userid] for userid in userids if userid in rows]
+
+
+def search_directory(q, role=None, active=None, limit=20):
+    """Users (with their Student row, if any) matching every word of q, best first.
+
+    Matches words of username, email, student full name and roll number: short
+    words by prefix, longer ones anywhere inside a word.
+    """
+    return _load(_ranked_userids(q, role, active)[:limit])
+
+
+class DirectoryPage:
+    """One page of ranked directory matches, shaped like a Flask-SQLAlchemy Pagination for pagination.html"""
+
+    def __init__(self, userids, page, per_page):
+        self.total = len(userids)
+        self.per_page = per_page
+        self.pages = max(1, -(-self.total // per_page))
+        self.page = min(max(page, 1), self.pages)
+        start = (self.page - 1) * per_page
+        self.items = _load(userids[start:start + per_page])
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+def search_directory_page(q, role=None, active=None, page=1, per_page=50):
+    """A page of search_directory's ranking, with the total number of matches"""
+    return DirectoryPage(_ranked_userids(q, role, active), page, per_page)
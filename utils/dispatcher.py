@@ -0,0 +1,171 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import func, update
+from models import db, Complaint, MaintenanceStaff, Notification, Student
+from utils.work_queue import QUEUE_STATUSES, queue_order
+from utils.complaint_events import record_transitions
+
+# Complaints whose category has no active specialist go to the general pool
+FALLBACK_SPECIALIZATION = 'other'
+
+
+class Dispatcher:
+    """Per-worker workload heaps: one min-heap of (open complaints, staff_id) per specialization.
+
+    Heap entries go stale when a load changes; the current load lives in `loads`
+    and stale entries are skipped when popped. Each worker keeps its own heaps,
+    so they are rebuilt from the database every DISPATCH_REBUILD_INTERVAL to
+    pick up other workers' assignments, resolved complaints and staff changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.heaps = {}
+        self.loads = {}
+        self.specializations = {}
+        self.built_at = None
+
+    def rebuild(self):
+        """Reload every active staff member's open workload from the database"""
+        open_count = (db.session.query(Complaint.assigned_staff_id, func.count().label('n'))
+                      .filter(Complaint.status.in_(QUEUE_STATUSES))
+                      .group_by(Complaint.assigned_staff_id)
+                      .subquery())
+        rows = (db.session.query(MaintenanceStaff.staff_id, MaintenanceStaff.specialization,
+                                 func.coalesce(open_count.c.n, 0))
+                .outerjoin(open_count, open_count.c.assigned_staff_id == MaintenanceStaff.staff_id)
+                .filter(MaintenanceStaff.is_active.is_(True))
+                .all())
+        heaps, loads, specializations = {}, {}, {}
+        for staff_id, specialization, load in rows:
+            specializations[staff_id] = (specialization or '').lower()
+            heaps.setdefault(specializations[staff_id], []).append((load, staff_id))
+            loads[staff_id] = load
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        with self._lock:
+            self.heaps, self.loads, self.specializations = heaps, loads, specializations
+            self.built_at = time.monotonic()
+
+    def stale(self, max_age):
+        return self.built_at is None or time.monotonic() - self.built_at >= max_age
+
+    def placeable(self):
+        """Lower-cased categories pick() can place, or None when the fallback pool takes any category"""
+        with self._lock:
+            if self.heaps.get(FALLBACK_SPECIALIZATION):
+                return None
+            return [specialization for specialization, heap in self.heaps.items() if heap]
+
+    def pick(self, category):
+        """Least-loaded active staff member for a category (counted as one more open complaint)"""
+        with self._lock:
+            heap = self.heaps.get((category or '').lower()) or self.heaps.get(FALLBACK_SPECIALIZATION)
+            while heap:
+                load, staff_id = heap[0]
+                if self.loads.get(staff_id) != load:
+                    heapq.heappop(heap)  # stale entry
+                    continue
+                self.loads[staff_id] = load + 1
+                heapq.heapreplace(heap, (load + 1, staff_id))
+                return staff_id
+            return None
+
+    def adjust(self, staff_id, delta):
+        """Record complaints entering (+) or leaving (-) a staff member's queue outside pick()"""
+        with self._lock:
+            if staff_id not in self.loads:
+                return
+            self.loads[staff_id] = max(self.loads[staff_id] + delta, 0)
+            heapq.heappush(self.heaps[self.specializations[staff_id]], (self.loads[staff_id], staff_id))
+
+
+dispatcher = Dispatcher()
+
+
+def dispatch_statuses(config):
+    return ('open', 'forwarded') if config['DISPATCH_OPEN_COMPLAINTS'] else ('forwarded',)
+
+
+def dispatch_pending(config, batch_size=None):
+    """Assign one batch of unassigned complaints, most urgent first; returns the number assigned.
+
+    Each staff member's share of the batch is claimed with one conditional
+    UPDATE (still unassigned), so workers ticking at the same time never
+    assign a complaint twice.
+    """
+    if dispatcher.stale(config['DISPATCH_REBUILD_INTERVAL']):
+        dispatcher.rebuild()
+
+    pending = (db.session.query(Complaint.complaintid, Complaint.category, Complaint.title, Student.userid,
+                                Complaint.status, Complaint.status_changed_at)
+               .join(Student, Student.studentid == Complaint.studentid)
+               .filter(Complaint.assigned_staff_id.is_(None),
+                       Complaint.status.in_(dispatch_statuses(config)),
+                       Complaint.duplicate_of.is_(None)))  # suspected duplicates wait for a warden
+    # Without a fallback pool, complaints no one can take would fill every batch
+    # and starve the ones behind them, so only read categories that have staff
+    placeable = dispatcher.placeable()
+    if placeable is not None:
+        if not placeable:
+            return 0
+        pending = pending.filter(func.lower(func.coalesce(Complaint.category, '')).in_(placeable))
+    pending = (pending.order_by(*queue_order())
+               .limit(batch_size or config['DISPATCH_BATCH_SIZE'])
+               .all())
+    if not pending:
+        return 0
+
+    picks = {}
+    for complaint in pending:
+        staff_id = dispatcher.pick(complaint.category)
+        if staff_id is not None:
+            picks.setdefault(staff_id, []).append(complaint)
+
+    staff_names = dict(db.session.query(MaintenanceStaff.staff_id, MaintenanceStaff.name)
+                       .filter(MaintenanceStaff.staff_id.in_(picks)))
+    now = datetime.utcnow()
+    assigned, notifications = 0, []
+    for staff_id, complaints in picks.items():
+        claimed = set(db.session.scalars(
+            update(Complaint)
+            .where(Complaint.complaintid.in_([c.complaintid for c in complaints]),
+                   Complaint.assigned_staff_id.is_(None))
+            .values(assigned_staff_id=staff_id, status='assigned', updated_at=now)
+            .returning(Complaint.complaintid)
+            .execution_options(synchronize_session=False)
+        ))
+        if len(claimed) < len(complaints):
+            dispatcher.adjust(staff_id, len(claimed) - len(complaints))
+        assigned += len(claimed)
+        record_transitions([(c.complaintid, c.status, c.status_changed_at) for c in complaints
+                            if c.complaintid in claimed], 'assigned', now, staff_id)
+        notifications.extend(Notification(
+            userid=c.userid,
+            title="🔧 Complaint Assigned",
+            message=f"Your complaint '{c.title}' has been assigned to {staff_names.get(staff_id, 'maintenance staff')}.",
+            type='info',
+            link='/student/complaints'
+        ) for c in complaints if c.complaintid in claimed)
+    db.session.add_all(notifications)
+    db.session.commit()
+    return assigned
+
+
+def assign_to_staff(complaint, staff):
+    """Manual assignment, keeping this worker's workload heaps in step"""
+    previous = complaint.assigned_staff_id if complaint.status in QUEUE_STATUSES else None
+    complaint.assigned_staff_id = staff.staff_id
+    complaint.status = 'assigned'
+    if previous != staff.staff_id:
+        if previous is not None:
+            dispatcher.adjust(previous, -1)
+        dispatcher.adjust(staff.staff_id, 1)
+
+
+def init_dispatcher(app):
+    from utils.scheduler import start_periodic
+    start_periodic(app, 'complaint-dispatch', app.config['DISPATCH_INTERVAL'],
+                   lambda app: dispatch_pending(app.config))
@@ -0,0 +1,195 @@
+import hashlib
+import re
+import zlib
+from datetime import datetime, timedelta
+from functools import cache
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from models import db, Complaint, ComplaintBucket, Notification, Student
+
+# MinHash over word tokens: NUM_PERM hashes h(x) = (a*x + b) mod PRIME, split into
+# BANDS bands of ROWS values for locality-sensitive bucketing. Two rows per band
+# makes complaints around Jaccard 0.2 and up share a bucket with high probability;
+# candidates are then checked against DUPLICATE_THRESHOLD on the full signature.
+NUM_PERM = 64
+BANDS, ROWS = 32, 2
+PRIME = (1 << 31) - 1
+
+TOKEN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset('a an and are as at be been but by for from has have i in is it its my of on or our '
+                      'please so that the their there this to was we were with'.split())
+
+
+@cache
+def _permutations():
+    """The NUM_PERM (a, b) hash parameters, built on first use so numpy loads with the first complaint"""
+    import numpy as np
+    rng = np.random.default_rng(0x686f7374)  # fixed seed: signatures must agree across workers and restarts
+    return rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64), rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def tokens(text):
+    """Lowercased words minus stopwords, with a plural 's' dropped ('taps' and 'tap' match)"""
+    words = set()
+    for word in TOKEN.findall((text or '').lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+def signature(text):
+    """MinHash signature (NUM_PERM uint32) of a text's token set, or None when it has no tokens"""
+    words = tokens(text)
+    if not words:
+        return None
+    import numpy as np
+    a, b = _permutations()
+    x = np.fromiter((zlib.crc32(w.encode()) % PRIME for w in words), dtype=np.uint64, count=len(words))
+    return ((np.outer(a, x) + b[:, None]) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return float((a == b).mean())
+
+
+def scope(complaint):
+    """Duplicates are only looked for among complaints about the same category and place"""
+    place = f'room:{complaint.roomid}' if complaint.roomid else ' '.join((complaint.location or '').lower().split())
+    return f'{(complaint.category or "").lower()}|{place}'
+
+
+def buckets(sig, key):
+    """Signed 64-bit LSH bucket ids, one per band, namespaced by scope"""
+    return [int.from_bytes(hashlib.blake2b(f'{key}|{band}|'.encode() + sig[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                           digest_size=8).digest(), 'big', signed=True)
+            for band in range(BANDS)]
+
+
+def flag_duplicate(complaint):
+    """Index a new complaint and mark it as a suspected duplicate; returns the original or None.
+
+    The complaint is added to the session and flushed (its bucket rows need its
+    id); the caller commits. Only unresolved complaints lodged in the last
+    DUPLICATE_WINDOW_HOURS are considered, so the index is a sliding window that
+    prune_buckets() trims.
+    """
+    config = current_app.config
+    sig = signature(f'{complaint.title or ""} {complaint.description or ""}')
+    complaint.minhash = sig.tobytes() if sig is not None else None
+    db.session.add(complaint)
+    if sig is None:
+        return None
+
+    import numpy as np
+    now = datetime.utcnow()
+    ids = buckets(sig, scope(complaint))
+    candidates = db.session.execute(
+        select(Complaint.complaintid, Complaint.minhash, Complaint.duplicate_of)
+        .where(Complaint.complaintid.in_(
+                   select(ComplaintBucket.complaintid)
+                   .where(ComplaintBucket.bucket.in_(ids),
+                          ComplaintBucket.created_at >= now - timedelta(hours=config['DUPLICATE_WINDOW_HOURS']))),
+               Complaint.resolvedat.is_(None))
+    ).all()
+    best, best_score = None, config['DUPLICATE_THRESHOLD']
+    for complaintid, minhash, duplicate_of in candidates:
+        if minhash is None:
+            continue
+        score = similarity(sig, np.frombuffer(minhash, dtype=np.uint32))
+        if score >= best_score:
+            # A match that is itself a suspected duplicate points at its original
+            best, best_score = duplicate_of or complaintid, score
+
+    original = db.session.get(Complaint, best) if best else None
+    if original is not None and original.resolvedat is None:
+        complaint.duplicate_of = original.complaintid
+    else:
+        original = None
+
+    db.session.flush()
+    db.session.execute(insert(ComplaintBucket), [
+        {'bucket': bucket, 'complaintid': complaint.complaintid, 'created_at': now} for bucket in set(ids)
+    ])
+    return original
+
+
+def merge_duplicate(complaint, note=None):
+    """Close a suspected duplicate into its original; the caller commits"""
+    original = complaint.primary
+    complaint.status = 'merged'
+    complaint.resolvedat = datetime.utcnow()
+    complaint.resolutionnotes = note or f'Merged into complaint #{original.complaintid}'
+    db.session.add(Notification(
+        userid=complaint.student.userid,
+        title="🔗 Complaint Merged",
+        message=f"Your complaint '{complaint.title}' has been merged with complaint #{original.complaintid}, "
+                f"which already reports the same issue. You'll be notified when it is resolved.",
+        type='info',
+        link='/student/complaints'
+    ))
+    return original
+
+
+def notify_merged(original):
+    """Tell the students whose complaints were merged into `original` that it is resolved; caller commits"""
+    rows = db.session.execute(
+        select(Student.userid, Complaint.title)
+        .join(Student, Student.studentid == Complaint.studentid)
+        .where(Complaint.duplicate_of == original.complaintid, Complaint.status == 'merged')
+    ).all()
+    db.session.add_all(Notification(
+        userid=userid,
+        title="✅ Complaint Resolved",
+        message=f"Complaint #{original.complaintid}, which your complaint '{title}' was merged into, has been resolved.",
+        type='success',
+        link='/student/complaints'
+    ) for userid, title in rows)
+    return len(rows)
+
+
+def prune_buckets(config, now=None):
+    """Drop index entries older than the duplicate window; returns rows deleted"""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=config['DUPLICATE_WINDOW_HOURS'])
+    deleted = db.session.execute(delete(ComplaintBucket).where(ComplaintBucket.created_at < cutoff)).rowcount
+    db.session.commit()
+    return deleted
+
+
+def backfill_signatures(connection):
+    """Compute MinHash signatures for complaints lodged before detection existed; returns rows updated.
+
+    Only complaints inside the current window are put in the bucket index.
+    """
+    table, index = Complaint.__table__, ComplaintBucket.__table__
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config['DUPLICATE_WINDOW_HOURS'])
+    rows = connection.execute(
+        select(table.c.complaintid, table.c.title, table.c.description, table.c.category,
+               table.c.roomid, table.c.location, table.c.created_at)
+        .where(table.c.minhash.is_(None))
+    ).all()
+    signatures, entries = [], []
+    for row in rows:
+        sig = signature(f'{row.title or ""} {row.description or ""}')
+        if sig is None:
+            continue
+        signatures.append({'id': row.complaintid, 'minhash': sig.tobytes()})
+        if row.created_at and row.created_at >= cutoff:
+            entries.extend({'bucket': bucket, 'complaintid': row.complaintid, 'created_at': row.created_at}
+                           for bucket in set(buckets(sig, scope(row))))
+    if signatures:
+        connection.execute(update(table).where(table.c.complaintid == db.bindparam('id'))
+                           .values(minhash=db.bindparam('minhash')), signatures)
+    if entries:
+        connection.execute(delete(index).where(index.c.complaintid.in_({e['complaintid'] for e in entries})))
+        connection.execute(insert(index), entries)
+    return len(signatures)
+
+
+def init_duplicates(app):
+    from utils.scheduler import start_periodic
+    start_periodic(app, 'duplicate-index-prune', app.config['DUPLICATE_PRUNE_INTERVAL'],
+                   lambda app: prune_buckets(app.config))
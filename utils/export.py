@@ -89,10 +89,10 @@ def export_payments_to_csv(payments):
     for p in payments:
         data.append([
             p.paymentid,
-            p.student.name,
+            p.student.fullname,
             f'₹{p.amount}',
-            p.payment_type,
-            p.payment_mode,
+            (p.payment_type or '').replace('_', ' '),
+            p.paymentmethod,
             p.status,
             p.payment_date.strftime('%d-%m-%Y') if p.payment_date else 'N/A',
             p.verification_date.strftime('%d-%m-%Y') if p.verification_date else 'Pending'
@@ -0,0 +1,335 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, select, func, update
+from werkzeug.security import generate_password_hash
+from models import db, User, Student, Room, ImportJob
+from utils.validators import validate_email, validate_phone, validate_rollnumber
+from utils.directory import reindex_users
+
+USERNAME_PATTERN = r'^[A-Za-z0-9_.-]{3,50}$'
+STAFF_ROLES = ('admin', 'warden', 'accountant', 'maintenance')
+GENDERS = ('male', 'female', 'other')
+MIN_PASSWORD_LENGTH = 6
+
+# Columns each import kind needs; anything else in the file is ignored
+REQUIRED_COLUMNS = {
+    'students': ('username', 'email', 'password', 'fullname', 'rollnumber'),
+    'users': ('username', 'email', 'password', 'role'),
+    'rooms': ('block', 'roomnumber', 'capacity', 'monthly_rent'),
+}
+
+
+class ImportReport:
+    """Outcome of one import: inserted count plus row-level errors by CSV line number"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.inserted = 0
+        self.errors = []  # (line, [messages])
+
+    def fail(self, line, messages):
+        self.errors.append((line, messages))
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+
+# ============= ROW VALIDATION =============
+def _clean(row):
+    return {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+
+
+def _to_int(value, field, errors, minimum=None, maximum=None):
+    try:
+        number = int(value)
+    except ValueError:
+        errors.append(f'{field} must be a whole number')
+        return None
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        errors.append(f'{field} is out of range')
+    return number
+
+
+def _validate_account(row, keys, errors):
+    username, email = row.get('username', ''), row.get('email', '')
+    if not re.match(USERNAME_PATTERN, username):
+        errors.append('username must be 3-50 letters, digits, dots, dashes or underscores')
+    elif username.lower() in keys['username']:
+        errors.append(f'username "{username}" already exists')
+    if not validate_email(email):
+        errors.append('invalid email')
+    elif email.lower() in keys['email']:
+        errors.append(f'email "{email}" already registered')
+    if len(row.get('password', '')) < MIN_PASSWORD_LENGTH:
+        errors.append(f'password must be at least {MIN_PASSWORD_LENGTH} characters')
+
+
+def validate_student(row, keys):
+    errors = []
+    _validate_account(row, keys, errors)
+    rollnumber = row.get('rollnumber', '')
+    if not validate_rollnumber(rollnumber):
+        errors.append('roll number must be at least 3 letters or digits')
+    elif rollnumber.upper() in keys['rollnumber']:
+        errors.append(f'roll number "{rollnumber}" already exists')
+    if not row.get('fullname') or len(row['fullname']) > 100:
+        errors.append('full name is required (max 100 characters)')
+    if row.get('phone') and not validate_phone(row['phone']):
+        errors.append('invalid phone number')
+    if row.get('gender') and row['gender'].lower() not in GENDERS:
+        errors.append('gender must be male, female or other')
+    year = _to_int(row['year'], 'year', errors, 1, 6) if row.get('year') else None
+    if errors:
+        return None, errors
+    return {
+        'user': {'username': row['username'], 'email': row['email'], 'role': 'student',
+                 'is_active': row.get('is_active', 'true').lower() not in ('0', 'false', 'no')},
+        'password': row['password'],
+        'student': {'rollnumber': rollnumber, 'fullname': row['fullname'], 'email': row['email'],
+                    'phone': row.get('phone') or None, 'course': row.get('course') or None,
+                    'year': year, 'gender': row.get('gender', '').lower() or None},
+    }, []
+
+
+def validate_user(row, keys):
+    errors = []
+    _validate_account(row, keys, errors)
+    role = row.get('role', '').lower()
+    if role not in STAFF_ROLES:
+        errors.append(f'role must be one of {", ".join(STAFF_ROLES)} (import students as students)')
+    if errors:
+        return None, errors
+    return {
+        'user': {'username': row['username'], 'email': row['email'], 'role': role,
+                 'is_active': row.get('is_active', 'true').lower() not in ('0', 'false', 'no')},
+        'password': row['password'],
+    }, []
+
+
+def validate_room(row, keys):
+    errors = []
+    block, roomnumber = row.get('block', ''), row.get('roomnumber', '')
+    if not block or len(block) > 10 or not roomnumber or len(roomnumber) > 10:
+        errors.append('block and room number are required (max 10 characters each)')
+    elif (block.upper(), roomnumber.upper()) in keys['room']:
+        errors.append(f'room {block}-{roomnumber} already exists')
+    capacity = _to_int(row.get('capacity', ''), 'capacity', errors, 1, 20)
+    floor = _to_int(row['floor'], 'floor', errors, 0, 200) if row.get('floor') else None
+    try:
+        rent = float(row.get('monthly_rent', ''))
+        if rent < 0:
+            errors.append('monthly rent cannot be negative')
+    except ValueError:
+        errors.append('monthly rent must be a number')
+    if row.get('gender') and row['gender'].lower() not in GENDERS:
+        errors.append('gender must be male, female or other')
+    if errors:
+        return None, errors
+    return {
+        'room': {'block': block, 'roomnumber': roomnumber, 'capacity': capacity, 'floor': floor,
+                 'monthly_rent': rent, 'gender': row.get('gender', '').lower() or None,
+                 'facilities': row.get('facilities') or None, 'amenities': row.get('amenities') or None,
+                 'current_occupancy': 0, 'status': 'vacant'},
+    }, []
+
+
+VALIDATORS = {'students': validate_student, 'users': validate_user, 'rooms': validate_room}
+
+
+def _remember(record, keys):
+    """Reserve an accepted row's keys so later rows in the same file are caught too"""
+    if 'user' in record:
+        keys['username'].add(record['user']['username'].lower())
+        keys['email'].add(record['user']['email'].lower())
+    if 'student' in record:
+        keys['rollnumber'].add(record['student']['rollnumber'].upper())
+    if 'room' in record:
+        keys['room'].add((record['room']['block'].upper(), record['room']['roomnumber'].upper()))
+
+
+def load_keys(kind):
+    """Existing unique keys, loaded once per import instead of one query per row"""
+    keys = {'username': set(), 'email': set(), 'rollnumber': set(), 'room': set()}
+    if kind in ('students', 'users'):
+        keys['username'] = set(db.session.scalars(select(func.lower(User.username))))
+        keys['email'] = set(db.session.scalars(select(func.lower(User.email))))
+    if kind == 'students':
+        keys['rollnumber'] = set(db.session.scalars(select(func.upper(Student.rollnumber))))
+    if kind == 'rooms':
+        keys['room'] = set(db.session.execute(select(func.upper(Room.block), func.upper(Room.roomnumber))).tuples())
+    return keys
+
+
+# ============= BULK INSERT =============
+def _insert_batch(kind, records, pool):
+    """Hash passwords in parallel and insert one chunk in a single transaction"""
+    if kind == 'rooms':
+        db.session.execute(insert(Room), [r['room'] for r in records])
+        return
+
+    passwords = [r['password'] for r in records]
+    hashes = pool.map(generate_password_hash, passwords, chunksize=8) if pool else map(generate_password_hash, passwords)
+    users = [dict(r['user'], password=h) for r, h in zip(records, hashes)]
+    userids = db.session.scalars(
+        insert(User).returning(User.userid, sort_by_parameter_order=True), users
+    ).all()
+    if kind == 'students':
+        db.session.execute(insert(Student), [dict(r['student'], userid=userid)
+                                             for r, userid in zip(records, userids)])
+    # Bulk inserts skip the flush hooks, so index the new accounts for directory search here
+    reindex_users(db.session.connection(), userids)
+
+
+def _hash_pool(workers):
+    # spawn, not fork: the web worker has threads and open database connections
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context('spawn'))
+
+
+def import_csv(stream, kind, chunk_size=500, hash_workers=0):
+    """Stream a CSV of students, users or rooms into the database.
+
+    Rows are validated a chunk at a time; valid rows are bulk inserted and
+    committed per chunk, invalid ones are reported by line number. A failing
+    chunk is rolled back and reported without stopping the rest of the file.
+    """
+    report = ImportReport(kind)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') if not isinstance(stream, io.TextIOBase) else stream
+    reader = csv.DictReader(text)
+    header = [h.strip().lower() for h in (reader.fieldnames or [])]
+    missing = [c for c in REQUIRED_COLUMNS[kind] if c not in header]
+    if missing:
+        report.fail(1, [f'missing column(s): {", ".join(missing)}'])
+        return report
+
+    keys = load_keys(kind)
+    validate = VALIDATORS[kind]
+    pool = _hash_pool(hash_workers) if kind in ('students', 'users') else None
+    try:
+        batch = []
+        for row in reader:
+            report.rows += 1
+            line = reader.line_num
+            record, errors = validate(_clean(row), keys)
+            if errors:
+                report.fail(line, errors)
+                continue
+            _remember(record, keys)
+            batch.append((line, record))
+            if len(batch) >= chunk_size:
+                _commit_batch(kind, batch, pool, report)
+                batch = []
+        if batch:
+            _commit_batch(kind, batch, pool, report)
+    finally:
+        if pool:
+            pool.shutdown()
+    return report
+
+
+def _commit_batch(kind, batch, pool, report):
+    try:
+        _insert_batch(kind, [record for _, record in batch], pool)
+        db.session.commit()
+        report.inserted += len(batch)
+    except Exception as e:
+        db.session.rollback()
+        message = f'not imported, batch failed: {str(e).splitlines()[0]}'
+        for line, _ in batch:
+            report.fail(line, [message])
+
+
+# ============= BACKGROUND JOBS =============
+def _import_dir():
+    # Relative to the app, so the web worker and the runner process agree
+    return os.path.join(current_app.root_path, current_app.config['IMPORT_DIR'])
+
+
+def _job_path(jobid):
+    return os.path.join(_import_dir(), f'{jobid}.csv')
+
+
+def queue_import(upload, kind, userid):
+    """Save an uploaded CSV and queue it; returns the ImportJob. The caller starts the runner."""
+    job = ImportJob(kind=kind, filename=upload.filename, requested_by=userid, status='queued')
+    db.session.add(job)
+    db.session.flush()
+    os.makedirs(_import_dir(), exist_ok=True)
+    upload.save(_job_path(job.jobid))
+    db.session.commit()
+    return job
+
+
+def start_import_runner():
+    """Run `flask run-import-jobs` in its own process, so the upload request returns at once.
+
+    Returns False if it could not be started; the job then waits for the next
+    run (e.g. from cron).
+    """
+    try:
+        subprocess.Popen([sys.executable, '-m', 'flask', '--app', 'app', 'run-import-jobs'],
+                         cwd=current_app.root_path, stdin=subprocess.DEVNULL, start_new_session=True)
+        return True
+    except OSError as e:
+        print(f"Import runner error: {e}")
+        return False
+
+
+def _claim_next_job():
+    """Mark the oldest queued job running; the conditional UPDATE keeps two runners off one job"""
+    jobid = db.session.scalar(select(ImportJob.jobid).where(ImportJob.status == 'queued')
+                              .order_by(ImportJob.jobid).limit(1))
+    if jobid is None:
+        return None
+    claimed = db.session.execute(
+        update(ImportJob).where(ImportJob.jobid == jobid, ImportJob.status == 'queued')
+        .values(status='running', started_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return db.session.get(ImportJob, jobid) if claimed else _claim_next_job()
+
+
+def run_import_job(job):
+    """Import a claimed job's file and store its report on the job"""
+    from utils.audit import log_bulk_import
+    config = current_app.config
+    path = _job_path(job.jobid)
+    try:
+        with open(path, 'rb') as stream:
+            report = import_csv(stream, job.kind, chunk_size=config['IMPORT_CHUNK_SIZE'],
+                                hash_workers=config['IMPORT_HASH_WORKERS'])
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.message = (str(e).splitlines() or [type(e).__name__])[0][:500]
+    else:
+        job.status = 'done'
+        job.rows, job.inserted, job.failed = report.rows, report.inserted, report.failed
+        job.errors_json = json.dumps(report.errors[:config['IMPORT_REPORT_ERRORS']])
+        log_bulk_import(job.kind, report.inserted, report.failed, userid=job.requested_by)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    if os.path.exists(path):
+        os.remove(path)
+    return job
+
+
+def run_import_jobs():
+    """Run queued imports one after another until none are left; returns jobs run"""
+    count = 0
+    while (job := _claim_next_job()) is not None:
+        run_import_job(job)
+        count += 1
+    return count
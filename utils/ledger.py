@@ -0,0 +1,188 @@
+from datetime import datetime
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, LedgerAccount, LedgerEntry, Payment, StudentBalance
+
+RECEIVABLE, INCOME, DEPOSITS, BANK = 'receivable', 'rent_income', 'deposits_held', 'bank'
+
+# Entry type -> (debit account, credit account)
+POSTINGS = {
+    'charge': (RECEIVABLE, INCOME),      # rent billed to the student
+    'deposit': (RECEIVABLE, DEPOSITS),   # security deposit billed, held until refunded
+    'payment': (BANK, RECEIVABLE),       # money received (payment verified)
+    'refund': (DEPOSITS, BANK),          # deposit paid back
+}
+DEPOSIT_MULTIPLE = 2  # Approval bills one month's rent plus this many months as deposit
+BACKFILL_BATCH = 1000
+CENT = 0.005
+
+
+def entry(studentid, entry_type, amount, paymentid=None, memo=None):
+    debit, credit = POSTINGS[entry_type]
+    return {'studentid': studentid, 'paymentid': paymentid, 'entry_type': entry_type,
+            'debit_account': debit, 'credit_account': credit, 'amount': round(amount, 2), 'memo': memo}
+
+
+def payment_entries(studentid, paymentid, amount, payment_type):
+    """The charge entries for a bill: approval bills split into rent and deposit"""
+    if payment_type in (None, 'rent_and_deposit'):
+        rent = round(amount / (1 + DEPOSIT_MULTIPLE), 2)
+        return [entry(studentid, 'charge', rent, paymentid, 'Rent'),
+                entry(studentid, 'deposit', amount - rent, paymentid, 'Security deposit')]
+    return [entry(studentid, 'charge', amount, paymentid, 'Monthly rent')]
+
+
+def _deltas(entries):
+    """Per-student (balance, deposit_held) and per-account changes from a set of entries"""
+    students, accounts = {}, {}
+    for e in entries:
+        amount, debit, credit = e['amount'], e['debit_account'], e['credit_account']
+        accounts[debit] = accounts.get(debit, 0) + amount
+        accounts[credit] = accounts.get(credit, 0) - amount
+        balance, held = students.get(e['studentid'], (0, 0))
+        balance += (amount if debit == RECEIVABLE else 0) - (amount if credit == RECEIVABLE else 0)
+        held += (amount if credit == DEPOSITS else 0) - (amount if debit == DEPOSITS else 0)
+        students[e['studentid']] = (balance, held)
+    return students, accounts
+
+
+def _ensure_rows(model, key, keys, connection=None):
+    """Create missing zero rows for keys (insert-or-ignore, so concurrent postings don't collide)"""
+    executor = connection or db.session
+    dialect = (connection or db.session.get_bind()).dialect.name
+    rows = [{key.name: k} for k in sorted(keys)]
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(model).on_conflict_do_nothing(
+            index_elements=[key.name])
+        executor.execute(stmt, rows)
+        return
+    existing = set(executor.scalars(select(key).where(key.in_(keys))))
+    missing = [row for row in rows if row[key.name] not in existing]
+    if missing:
+        executor.execute(insert(model), missing)
+
+
+def _add(model, key, deltas, now, connection=None):
+    """One UPDATE adding each key's deltas ({key: {column: delta}}) to its row"""
+    if not deltas:
+        return
+    _ensure_rows(model, key, deltas, connection)
+    columns = {column for changes in deltas.values() for column in changes}
+    values = {column: getattr(model, column) + case({k: changes.get(column, 0) for k, changes in deltas.items()},
+                                                    value=key, else_=0)
+              for column in columns}
+    (connection or db.session).execute(
+        update(model).where(key.in_(deltas)).values(updated_at=now, **values)
+        .execution_options(synchronize_session=False))
+
+
+def post(entries, now=None):
+    """Record entries and apply them to student and account balances in the caller's transaction"""
+    if not entries:
+        return
+    now = now or datetime.utcnow()
+    db.session.execute(insert(LedgerEntry), [dict(e, created_at=now) for e in entries])
+    students, accounts = _deltas(entries)
+    _add(StudentBalance, StudentBalance.studentid,
+         {sid: {'balance': balance, 'deposit_held': held} for sid, (balance, held) in students.items()}, now)
+    _add(LedgerAccount, LedgerAccount.account, {account: {'balance': d} for account, d in accounts.items()}, now)
+
+
+def adjust_submitted(amounts, now=None):
+    """Move payments into (+) or out of (-) students' awaiting-verification totals; caller commits"""
+    _add(StudentBalance, StudentBalance.studentid,
+         {sid: {'submitted': amount} for sid, amount in amounts.items() if amount}, now or datetime.utcnow())
+
+
+def student_balance(studentid):
+    """The student's balance row, or an all-zero one if nothing was ever billed"""
+    return db.session.get(StudentBalance, studentid) or StudentBalance(studentid=studentid, balance=0,
+                                                                       deposit_held=0, submitted=0)
+
+
+def account_balances():
+    return dict(db.session.execute(select(LedgerAccount.account, LedgerAccount.balance)).all())
+
+
+# ============= BACKFILL AND RECONCILIATION =============
+def backfill_ledger(connection):
+    """Post entries for payments raised before the ledger existed, then rebuild balances; returns payments done"""
+    table = Payment.__table__
+    entries = LedgerEntry.__table__
+    rows = connection.execute(
+        select(table.c.paymentid, table.c.studentid, table.c.amount, table.c.payment_type, table.c.status,
+               table.c.verification_date, table.c.created_at)
+        .where(~select(entries.c.entryid).where(entries.c.paymentid == table.c.paymentid).exists())
+        .order_by(table.c.paymentid)
+    ).all()
+    now = datetime.utcnow()
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        batch = []
+        for paymentid, studentid, amount, payment_type, status, verified_at, created_at in rows[start:start + BACKFILL_BATCH]:
+            batch.extend(dict(e, created_at=created_at or now)
+                         for e in payment_entries(studentid, paymentid, amount or 0, payment_type))
+            if status == 'verified':
+                batch.append(dict(entry(studentid, 'payment', amount or 0, paymentid, 'Payment received'),
+                                  created_at=verified_at or created_at or now))
+        connection.execute(insert(entries), batch)
+    reconcile_balances(connection, fix=True)
+    return len(rows)
+
+
+def reconcile_balances(connection, fix=False):
+    """Check every stored balance against the ledger in one pass; returns the mismatches found.
+
+    Student balances and deposits are recomputed from ledger_entries, the
+    awaiting-verification totals from submitted payments, and account balances
+    from both sides of every entry. fix=True overwrites stored rows that differ.
+    """
+    entries = LedgerEntry.__table__
+    amount = entries.c.amount
+    expected = {}
+    for studentid, balance, held in connection.execute(
+            select(entries.c.studentid,
+                   func.sum(case((entries.c.debit_account == RECEIVABLE, amount),
+                                 (entries.c.credit_account == RECEIVABLE, -amount), else_=0)),
+                   func.sum(case((entries.c.credit_account == DEPOSITS, amount),
+                                 (entries.c.debit_account == DEPOSITS, -amount), else_=0)))
+            .group_by(entries.c.studentid)):
+        expected[studentid] = {'balance': balance or 0, 'deposit_held': held or 0, 'submitted': 0}
+    payments = Payment.__table__
+    for studentid, submitted in connection.execute(
+            select(payments.c.studentid, func.sum(payments.c.amount))
+            .where(payments.c.status == 'paid').group_by(payments.c.studentid)):
+        expected.setdefault(studentid, {'balance': 0, 'deposit_held': 0, 'submitted': 0})['submitted'] = submitted or 0
+
+    balances = StudentBalance.__table__
+    stored = {row.studentid: row for row in connection.execute(
+        select(balances.c.studentid, balances.c.balance, balances.c.deposit_held, balances.c.submitted))}
+    mismatches = []
+    for studentid in expected.keys() | stored.keys():
+        want = expected.get(studentid, {'balance': 0, 'deposit_held': 0, 'submitted': 0})
+        have = stored.get(studentid)
+        diff = {column: (getattr(have, column) if have else None, round(value, 2))
+                for column, value in want.items()
+                if have is None or abs((getattr(have, column) or 0) - value) > CENT}
+        if diff and (have is not None or any(abs(v) > CENT for v in want.values())):
+            mismatches.append(('student', studentid, diff))
+
+    accounts = LedgerAccount.__table__
+    expected_accounts = {}
+    for side, sign in ((entries.c.debit_account, 1), (entries.c.credit_account, -1)):
+        for account, total in connection.execute(select(side, func.sum(amount)).group_by(side)):
+            expected_accounts[account] = expected_accounts.get(account, 0) + sign * (total or 0)
+    stored_accounts = dict(connection.execute(select(accounts.c.account, accounts.c.balance)).all())
+    for account in expected_accounts.keys() | stored_accounts.keys():
+        want, have = expected_accounts.get(account, 0), stored_accounts.get(account)
+        if have is None or abs(have - want) > CENT:
+            mismatches.append(('account', account, {'balance': (have, round(want, 2))}))
+
+    if fix and mismatches:
+        now = datetime.utcnow()
+        fixes = {key: {column: want - (have or 0) for column, (have, want) in diff.items()}
+                 for kind, key, diff in mismatches if kind == 'student'}
+        _add(StudentBalance, StudentBalance.studentid, fixes, now, connection)
+        account_fixes = {key: {'balance': diff['balance'][1] - (diff['balance'][0] or 0)}
+                         for kind, key, diff in mismatches if kind == 'account'}
+        _add(LedgerAccount, LedgerAccount.account, account_fixes, now, connection)
+    return mismatches
@@ -0,0 +1,214 @@
+"""Pooled, batched email delivery on top of Flask-Mail.
+
+Messages are queued on a MailDispatcher and sent in batches over persistent
+SMTP connections, so a run of thousands of statements pays for one TLS
+handshake per pooled connection instead of one per message.
+
+`python check_mail_delivery.py` runs the round trip against an in-process
+aiosmtpd server. For a manual end-to-end run, start a stand-in server and
+point the app at it:
+
+    python -m aiosmtpd -n -l localhost:8025
+    MAIL_SERVER=localhost MAIL_PORT=8025 flask --app app send-notification-digests
+"""
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from flask import current_app
+
+
+def get_mail(app=None):
+    """The app's Flask-Mail extension, imported and initialised on first use"""
+    app = app or current_app._get_current_object()
+    if 'mail' not in app.extensions:
+        from flask_mail import Mail
+        Mail(app)
+    return app.extensions['mail']
+
+
+class SMTPConnectionPool:
+    """Keeps up to `size` open Flask-Mail connections for reuse across batches"""
+
+    def __init__(self, mail, size=2, timeout=30):
+        self.mail = mail
+        self.size = size
+        self.timeout = timeout
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """An idle or new connection; raises on connect failure or if none frees up within timeout"""
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            reserved = self._created < self.size
+            if reserved:
+                self._created += 1
+        if reserved:
+            try:
+                return self._open()
+            except Exception:
+                self.discard()  # give the slot back so a later acquire can retry
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except Empty:
+            raise TimeoutError('No SMTP connection became available') from None
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def discard(self):
+        """Forget a slot whose connection is gone"""
+        with self._lock:
+            self._created -= 1
+
+    def reconnect(self, conn):
+        """Replace a connection the server dropped"""
+        self._close(conn)
+        try:
+            return self._open()
+        except Exception:
+            self.discard()
+            raise
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except Empty:
+                break
+        self._created = 0
+
+    def _open(self):
+        conn = self.mail.connect()
+        conn.__enter__()
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.__exit__(None, None, None)
+        except smtplib.SMTPException:
+            pass
+
+
+class RateLimiter:
+    """Simple shared limiter: at most `per_second` sends across all threads"""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class MailDispatcher:
+    """Queues messages and sends them in batches over a pooled SMTP connection set"""
+
+    def __init__(self, batch_size=None, rate_limit=None, pool_size=None):
+        config = current_app.config
+        self.app = current_app._get_current_object()
+        self.batch_size = batch_size or config.get('MAIL_BATCH_SIZE', 50)
+        self.pool_size = pool_size or config.get('MAIL_POOL_SIZE', 2)
+        self.limiter = RateLimiter(rate_limit if rate_limit is not None else config.get('MAIL_RATE_LIMIT', 0))
+        self.pool = SMTPConnectionPool(get_mail(self.app), self.pool_size, config.get('MAIL_POOL_TIMEOUT', 30))
+        self.messages = []
+        self.failed = []
+        self.stats = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # Deliver whatever was queued in the block, unless the block itself failed
+        try:
+            if exc_type is None and self.messages:
+                self.flush()
+        finally:
+            self.close()
+
+    def queue(self, to, subject, body):
+        """Add a message to the next flush; returns the Message"""
+        from flask_mail import Message
+        msg = Message(
+            subject=subject,
+            recipients=[to],
+            body=body,
+            sender=self.app.config['MAIL_DEFAULT_SENDER']
+        )
+        self.messages.append(msg)
+        return msg
+
+    def flush(self):
+        """Send everything queued so far; returns per-batch timing stats"""
+        messages, self.messages = self.messages, []
+        batches = [messages[i:i + self.batch_size] for i in range(0, len(messages), self.batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            results = list(executor.map(self._send_batch, range(len(batches)), batches))
+
+        self.stats.extend(results)
+        return results
+
+    def close(self):
+        self.pool.close()
+
+    def _send_batch(self, number, batch):
+        started = time.perf_counter()
+        sent = 0
+        with self.app.app_context():
+            conn, position = None, 0
+            try:
+                conn = self.pool.acquire()
+                for position, msg in enumerate(batch):
+                    self.limiter.wait()
+                    conn, delivered = self._send(conn, msg)
+                    if delivered:
+                        sent += 1
+                    else:
+                        self.failed.append(msg)
+            except Exception as e:
+                # No connection to send on (SMTP down or the reconnect failed): the rest of the batch fails
+                print(f"Email error: {e}")
+                self.failed.extend(batch[position:])
+                conn = None
+            finally:
+                if conn is not None:
+                    self.pool.release(conn)
+
+        return {
+            'batch': number,
+            'sent': sent,
+            'failed': len(batch) - sent,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    def _send(self, conn, msg):
+        """(connection, delivered); a message the server rejects fails alone, a lost connection raises"""
+        try:
+            conn.send(msg)
+        except smtplib.SMTPServerDisconnected:
+            conn = self.pool.reconnect(conn)
+            try:
+                conn.send(msg)
+            except Exception as e:
+                print(f"Email error: {e}")
+                return conn, False
+        except Exception as e:
+            print(f"Email error: {e}")
+            return conn, False
+        return conn, True
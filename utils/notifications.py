@@ -1,27 +1,56 @@
 from flask import current_app
-from flask_mail import Mail, Message
-from models import db, Notification
-from datetime import datetime
+from models import db, Notification, User
+from datetime import datetime, timedelta
+from itertools import groupby
+from utils.mailer import MailDispatcher, get_mail
 
-mail = Mail()
+# Events of the same group for the same recipient inside the coalesce window are
+# merged into one rolling digest row instead of one row per event.
+DIGEST_GROUPS = {
+    'room_request': ('🏠 Room Requests Pending', '{count} new room requests awaiting approval'),
+    'complaint_lodged': ('⚠️ New Complaints Lodged', '{count} new complaints lodged'),
+    'complaint_duplicate': ('🔗 Possible Duplicate Complaints', '{count} new complaints look like duplicates of open ones'),
+    'complaint_forwarded': ('🔧 Complaints Forwarded', '{count} complaints forwarded for assignment'),
+    'sla_breach': ('⏰ Complaints Past Their SLA', '{count} complaints breached their resolution deadline and were escalated'),
+    'payment_submitted': ('💰 Payments Awaiting Verification', '{count} new payments awaiting verification'),
+    'student_registered': ('👤 New Student Registrations', '{count} new students registered and awaiting approval'),
+}
+
+# Where a digest row of several events points: the group's list page, not the first event's item
+DIGEST_LINKS = {
+    'room_request': '/warden/pending-requests',
+    'complaint_lodged': '/warden/complaints',
+    'complaint_duplicate': '/warden/complaints',
+    'complaint_forwarded': '/maintenance/queue',
+    'sla_breach': '/warden/complaints',
+    'payment_submitted': '/accountant/pending-payments',
+    'student_registered': '/admin/users',
+}
+
+# Roles that receive the periodic email digest
+DIGEST_ROLES = ('admin', 'warden', 'accountant', 'maintenance')
 
 # ============= EMAIL FUNCTIONS (Your existing code) =============
-def send_email(to, subject, body):
-    """Send email notification"""
+def send_email(to, subject, body, dispatcher=None):
+    """Send email notification, or queue it on a MailDispatcher for batched delivery"""
+    if dispatcher is not None:
+        dispatcher.queue(to, subject, body)
+        return True
     try:
+        from flask_mail import Message
         msg = Message(
             subject=subject,
             recipients=[to],
             body=body,
             sender=current_app.config['MAIL_DEFAULT_SENDER']
         )
-        mail.send(msg)
+        get_mail().send(msg)
         return True
     except Exception as e:
         print(f"Email error: {e}")
         return False
 
-def send_room_allocation_email(student_email, student_name, room_details):
+def send_room_allocation_email(student_email, student_name, room_details, dispatcher=None):
     """Send room allocation confirmation email"""
     subject = "Room Allocation Confirmation"
     body = f"""
@@ -39,9 +68,9 @@ Please contact the hostel office for further instructions.
 Best regards,
 Hostel Management
 """
-    return send_email(student_email, subject, body)
+    return send_email(student_email, subject, body, dispatcher)
 
-def send_complaint_update_email(student_email, student_name, complaint_title, status):
+def send_complaint_update_email(student_email, student_name, complaint_title, status, dispatcher=None):
     """Send complaint status update email"""
     subject = f"Complaint Update: {complaint_title}"
     body = f"""
@@ -56,21 +85,24 @@ Thank you for your patience.
 Best regards,
 Hostel Management
 """
-    return send_email(student_email, subject, body)
+    return send_email(student_email, subject, body, dispatcher)
 
 
 # ============= IN-APP NOTIFICATION FUNCTIONS (NEW - ADD THESE) =============
-def create_notification(user_id, title, message, type='info', link=None):
-    """Create in-app notification for user"""
+def create_notification(user_id, title, message, type='info', link=None, group=None):
+    """Create in-app notification for user, folding grouped events into a rolling digest"""
     try:
-        notification = Notification(
-            userid=user_id,
-            title=title,
-            message=message,
-            type=type,
-            link=link
-        )
-        db.session.add(notification)
+        notification = _coalesce_notification(user_id, group) if group else None
+        if notification is None:
+            notification = Notification(
+                userid=user_id,
+                title=title,
+                message=message,
+                type=type,
+                link=link,
+                group_key=group
+            )
+            db.session.add(notification)
         db.session.commit()
         return notification
     except Exception as e:
@@ -78,6 +110,103 @@ def create_notification(user_id, title, message, type='info', link=None):
         db.session.rollback()
         return None
 
+def notify_role(role, group, count, type='warning', link=None):
+    """Add `count` events of a digest group for every active user of a role.
+
+    Folds into each recipient's open digest row where there is one and inserts
+    the rest in one go; the caller commits, so the notifications land in the
+    same transaction as the change they report.
+    """
+    title, template = DIGEST_GROUPS[group]
+    user_ids = db.session.scalars(
+        db.select(User.userid).filter_by(role=role, is_active=True)
+    ).all()
+    for user_id in user_ids:
+        notification = _coalesce_notification(user_id, group, count)
+        if notification is None:
+            db.session.add(Notification(
+                userid=user_id,
+                title=title,
+                message=template.format(count=count),
+                type=type,
+                link=link,
+                group_key=group,
+                group_count=count
+            ))
+    return len(user_ids)
+
+def _coalesce_notification(user_id, group, count=1):
+    """Merge events into the recipient's open digest row for this group, if any"""
+    window = current_app.config.get('NOTIFICATION_COALESCE_WINDOW', 0)
+    if not window or group not in DIGEST_GROUPS:
+        return None
+    
+    now = datetime.utcnow()
+    notification = Notification.query.filter(
+        Notification.userid == user_id,
+        Notification.group_key == group,
+        Notification.is_read == False,
+        Notification.created_at >= now - timedelta(seconds=window)
+    ).order_by(Notification.created_at.desc()).first()
+    
+    if notification is None:
+        return None
+    
+    title, template = DIGEST_GROUPS[group]
+    notification.group_count = (notification.group_count or 1) + count
+    notification.title = title
+    notification.message = template.format(count=notification.group_count)
+    notification.link = DIGEST_LINKS.get(group, notification.link)
+    notification.created_at = now
+    notification.emailed_at = None  # Re-include the updated count in the next digest
+    return notification
+
+def send_notification_digests():
+    """Email each staff member one summary of their unread, not yet emailed notifications"""
+    pending = Notification.query.join(User, Notification.userid == User.userid).filter(
+        User.role.in_(DIGEST_ROLES),
+        User.is_active == True,
+        Notification.is_read == False,
+        Notification.emailed_at == None
+    ).order_by(Notification.userid, Notification.created_at.desc()).all()
+    
+    queued = []
+    dispatcher = MailDispatcher()
+    for _, items in groupby(pending, key=lambda n: n.userid):
+        items = list(items)
+        user = items[0].user
+        lines = [f"- {n.title}: {n.message}" for n in items]
+        body = f"""
+Dear {user.username},
+
+You have {len(items)} unread notification(s) on HostelHub:
+
+{chr(10).join(lines)}
+
+Please log in to review them.
+
+Best regards,
+Hostel Management
+"""
+        msg = dispatcher.queue(user.email, f"HostelHub digest: {len(items)} unread notification(s)", body)
+        queued.append((msg, items))
+    
+    with dispatcher:
+        dispatcher.flush()
+    
+    failed = {id(msg) for msg in dispatcher.failed}
+    sent = 0
+    now = datetime.utcnow()
+    for msg, items in queued:
+        if id(msg) in failed:
+            continue
+        for n in items:
+            n.emailed_at = now
+        sent += 1
+    
+    db.session.commit()
+    return sent
+
 def notify_room_allocation(student, room, status='approved'):
     """Notify student about room allocation"""
     if status == 'approved':
@@ -147,7 +276,8 @@ def notify_room_request_submission(student, room):
             '🏠 New Room Request',
             f'{student.fullname} has submitted a room request for {room.block}-{room.roomnumber}.',
             'info',
-            '/warden/pending-requests'
+            '/warden/pending-requests',
+            group='room_request'
         )
 
 def notify_complaint_submission(complaint, student):
@@ -162,7 +292,8 @@ def notify_complaint_submission(complaint, student):
             '⚠️ New Complaint',
             f'{student.fullname} reported: {complaint.title}',
             'warning',
-            f'/warden/complaint/{complaint.complaintid}'
+            f'/warden/complaint/{complaint.complaintid}',
+            group='complaint_lodged'
         )
     
     # Notify maintenance staff
@@ -186,5 +317,6 @@ def notify_payment_submission(payment, student):
             '💰 New Payment Submitted',
             f'{student.fullname} submitted ₹{payment.amount} for verification.',
             'info',
-            '/accountant/pending-payments'
+            '/accountant/pending-payments',
+            group='payment_submitted'
         )
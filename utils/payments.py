@@ -0,0 +1,109 @@
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import case, func, insert, select, update
+from models import db, AuditLog, Notification, Payment, Room, RoomAllocation, Student
+from utils.ledger import adjust_submitted, entry, post
+
+# Upper bound on one bulk verification (one form post)
+BULK_VERIFY_LIMIT = 500
+
+
+def normalize_reference(value):
+    """Bank transaction references compare without case or spacing ('utr 1234 ab' == 'UTR1234AB')"""
+    return ''.join((value or '').split()).upper() or None
+
+
+def reference_in_use(transactionid, payment_id=None):
+    """The payment already submitted or verified under this bank reference, if any"""
+    query = Payment.query.filter(Payment.transactionid == normalize_reference(transactionid),
+                                 Payment.status.in_(('paid', 'verified')))
+    if payment_id is not None:
+        query = query.filter(Payment.paymentid != payment_id)
+    return query.first()
+
+
+def verify_payments(payment_ids, verifier_id, now=None, commit=True):
+    """Verify submitted payments in one transaction; returns {paymentid: room label or None}.
+
+    Only payments still 'paid' are verified, so a payment verified by another
+    accountant in the meantime is skipped rather than counted twice. Each
+    verified student's pending_payment allocation is activated and the rooms'
+    occupancy raised with one grouped UPDATE; the receipts are posted to the
+    ledger, and notifications and audit entries go in as single bulk inserts
+    in the same commit (commit=False leaves the commit to the caller).
+    """
+    now = now or datetime.utcnow()
+    verified = db.session.execute(
+        update(Payment)
+        .where(Payment.paymentid.in_(payment_ids), Payment.status == 'paid')
+        .values(status='verified', verified_by=verifier_id, verification_date=now, updated_at=now)
+        .returning(Payment.paymentid, Payment.studentid, Payment.amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not verified:
+        return {}
+    student_ids = {studentid for _, studentid, _ in verified}
+    received = {}
+    for _, studentid, amount in verified:
+        received[studentid] = received.get(studentid, 0) + amount
+    post([entry(studentid, 'payment', amount, paymentid, 'Payment received')
+          for paymentid, studentid, amount in verified], now)
+    adjust_submitted({studentid: -amount for studentid, amount in received.items()}, now)
+
+    # One allocation per student, as with single verification (the oldest pending one)
+    pending = (select(func.min(RoomAllocation.allocationid))
+               .where(RoomAllocation.studentid.in_(student_ids), RoomAllocation.status == 'pending_payment')
+               .group_by(RoomAllocation.studentid))
+    activated = db.session.execute(
+        update(RoomAllocation)
+        .where(RoomAllocation.allocationid.in_(pending))
+        .values(status='active', allocationdate=now)
+        .returning(RoomAllocation.studentid, RoomAllocation.roomid)
+        .execution_options(synchronize_session=False)
+    ).all()
+    room_of = dict(activated)
+
+    per_room = {}
+    for roomid in room_of.values():
+        per_room[roomid] = per_room.get(roomid, 0) + 1
+    if per_room:
+        db.session.execute(
+            update(Room)
+            .where(Room.roomid.in_(per_room))
+            .values(current_occupancy=func.coalesce(Room.current_occupancy, 0) +
+                    case(per_room, value=Room.roomid, else_=0))
+            .execution_options(synchronize_session=False)
+        )
+    labels = dict(db.session.execute(
+        select(Room.roomid, Room.block + '-' + Room.roomnumber).where(Room.roomid.in_(per_room))
+    ).all()) if per_room else {}
+    students = {studentid: (userid, fullname) for studentid, userid, fullname in db.session.execute(
+        select(Student.studentid, Student.userid, Student.fullname).where(Student.studentid.in_(student_ids))
+    )}
+
+    results, notifications, audit = {}, [], []
+    ipaddress = request.remote_addr if has_request_context() else None
+    for paymentid, studentid, _ in verified:
+        userid, fullname = students.get(studentid, (None, 'unknown student'))
+        room = labels.get(room_of.pop(studentid, None))  # a student's second payment allocates nothing
+        results[paymentid] = room
+        if userid is not None:
+            if room:
+                notifications.append({
+                    'userid': userid, 'title': "🎉 Payment Verified & Room Allocated!",
+                    'message': f"Your payment has been verified and Room {room} has been allocated to you. Welcome!",
+                    'type': 'success', 'link': '/student/my-room', 'created_at': now})
+            else:
+                notifications.append({
+                    'userid': userid, 'title': "✅ Payment Verified",
+                    'message': "Your payment has been verified. Thank you!",
+                    'type': 'success', 'link': '/student/payments', 'created_at': now})
+        audit.append({'userid': verifier_id, 'action': 'payment_verification', 'entity_type': 'payment',
+                      'entity_id': paymentid, 'details': f'Payment verified for student {fullname}',
+                      'ipaddress': ipaddress, 'timestamp': now})
+    if notifications:
+        db.session.execute(insert(Notification), notifications)
+    db.session.execute(insert(AuditLog), audit)
+    if commit:
+        db.session.commit()
+    return results
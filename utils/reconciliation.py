@@ -0,0 +1,332 @@
+import csv
+import hashlib
+import io
+import re
+import uuid
+from functools import lru_cache
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select
+from models import db, BankStatementLine, Payment
+from utils.payments import normalize_reference, verify_payments
+
+# Statement column names seen in bank CSV exports, matched case-insensitively
+DATE_COLUMNS = ('date', 'posted date', 'posting date', 'transaction date', 'txn date', 'value date')
+AMOUNT_COLUMNS = ('amount', 'credit', 'credit amount', 'deposit', 'deposits', 'deposit amt.', 'cr')
+DEBIT_COLUMNS = ('debit', 'debit amount', 'withdrawal', 'withdrawals', 'withdrawal amt.', 'dr')
+REFERENCE_COLUMNS = ('reference', 'transaction id', 'transactionid', 'txn id', 'ref', 'ref no', 'reference no',
+                     'utr', 'utr no', 'chq/ref no', 'chq./ref.no.', 'cheque/ref no')
+PAYER_COLUMNS = ('payer', 'payer name', 'name', 'remitter', 'remitter name')
+DESCRIPTION_COLUMNS = ('description', 'narration', 'details', 'particulars', 'memo', 'remarks')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y')
+OFX_TAG = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+WORD = re.compile(r'[a-z]+')
+REFERENCE_TOKEN = re.compile(r'[A-Z0-9]{6,}')
+MAX_CANDIDATES = 5
+
+
+class ReconciliationReport:
+    """Outcome of one statement: lines by result plus unreadable lines by line number"""
+
+    def __init__(self):
+        self.import_id = uuid.uuid4().hex
+        self.rows = 0
+        self.duplicates = 0   # already imported from an earlier statement
+        self.skipped = 0      # debits and zero amounts
+        self.verified = 0
+        self.review = 0
+        self.unmatched = 0
+        self.errors = []      # (line, [messages])
+
+    def fail(self, line, messages):
+        self.errors.append((line, messages))
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+
+# ============= STATEMENT PARSING =============
+def _amount(value):
+    value = (value or '').strip().replace(',', '').replace('₹', '').replace('INR', '').strip()
+    if not value:
+        return None
+    negative = value.startswith('(') and value.endswith(')')
+    value = value.strip('()')
+    suffix = value[-2:].upper()
+    if suffix in ('CR', 'DR'):
+        value, negative = value[:-2].strip(), suffix == 'DR'
+    number = float(value)
+    return -number if negative else number
+
+
+@lru_cache(maxsize=4096)  # a statement repeats the same few dates on thousands of lines
+def _date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognised date "{value}"')
+
+
+def _column(header, names):
+    return next((h for h in header if h in names), None)
+
+
+def read_csv(stream):
+    """Yield (line, fields or error) for each row of a bank statement CSV, one row at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='') if not isinstance(stream, io.TextIOBase) else stream
+    reader = csv.reader(text)
+    header = [h.strip().lower() for h in next(reader, [])]
+    columns = {key: _column(header, names) for key, names in (
+        ('date', DATE_COLUMNS), ('amount', AMOUNT_COLUMNS), ('debit', DEBIT_COLUMNS),
+        ('reference', REFERENCE_COLUMNS), ('payer', PAYER_COLUMNS), ('description', DESCRIPTION_COLUMNS))}
+    if not columns['amount']:
+        yield 1, f'no amount column (expected one of: {", ".join(AMOUNT_COLUMNS)})'
+        return
+    index = {key: header.index(name) for key, name in columns.items() if name}
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        get = lambda key: row[index[key]].strip() if key in index and index[key] < len(row) else ''
+        try:
+            amount = _amount(get('amount'))
+            if amount is None and _amount(get('debit')):
+                amount = -_amount(get('debit'))
+            yield reader.line_num, {'posted_date': _date(get('date')), 'amount': amount,
+                                    'reference': get('reference'), 'payer': get('payer'),
+                                    'description': get('description')}
+        except ValueError as e:
+            yield reader.line_num, str(e)
+
+
+def read_ofx(stream):
+    """Yield (line, fields or error) for each <STMTTRN> of an OFX/QFX statement (SGML or XML)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace') if not isinstance(stream, io.TextIOBase) else stream
+    transaction, start = None, 0
+    for number, raw in enumerate(text, 1):
+        for closing, tag, value in OFX_TAG.findall(raw):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and transaction is not None:
+                    yield start, _ofx_fields(transaction)
+                    transaction = None
+                elif not closing:
+                    transaction, start = {}, number
+            elif transaction is not None and not closing and value.strip():
+                transaction[tag] = value.strip()
+
+
+def _ofx_fields(transaction):
+    try:
+        posted = transaction.get('DTPOSTED', '')[:8]
+        return {'posted_date': datetime.strptime(posted, '%Y%m%d').date() if posted else None,
+                'amount': _amount(transaction.get('TRNAMT')),
+                'reference': transaction.get('REFNUM') or transaction.get('CHECKNUM') or transaction.get('FITID', ''),
+                'payer': transaction.get('NAME', ''),
+                'description': transaction.get('MEMO', '')}
+    except ValueError as e:
+        return str(e)
+
+
+# ============= MATCHING =============
+def _cents(amount):
+    return int(round(amount * 100))
+
+
+def _words(*texts):
+    return {w for text in texts for w in WORD.findall((text or '').lower()) if len(w) > 1}
+
+
+class PendingPayments:
+    """Hash tables over submitted ('paid') payments: by bank reference and by (paise, date).
+
+    The payments are the build side of the join; statement lines stream past
+    as the probe side, so each line costs a handful of dictionary lookups (one
+    per day of the date window for a fuzzy match) whatever the payment count.
+    """
+
+    def __init__(self):
+        self.by_reference, self.by_amount, self.claimed = {}, {}, set()
+        rows = db.session.execute(
+            select(Payment.paymentid, Payment.transactionid, Payment.amount, Payment.payment_date,
+                   Payment.paymentdate, Payment.payer_name)
+            .where(Payment.status == 'paid')
+        ).all()
+        for paymentid, transactionid, amount, payment_date, paymentdate, payer_name in rows:
+            payment = {'id': paymentid, 'cents': _cents(amount or 0),
+                       'date': payment_date or (paymentdate.date() if paymentdate else None),
+                       'words': _words(payer_name)}
+            reference = normalize_reference(transactionid)
+            if reference:
+                self.by_reference.setdefault(reference, []).append(payment)
+            self.by_amount.setdefault((payment['cents'], payment['date']), []).append(payment)
+
+    def by_references(self, fields):
+        """Unclaimed payments whose reference is the line's reference or appears in its narration"""
+        keys = {normalize_reference(fields['reference'])}
+        keys.update(REFERENCE_TOKEN.findall(f"{fields['description']} {fields['payer']}".upper()))
+        found = {}
+        for key in keys:
+            for payment in self.by_reference.get(key, ()):
+                if payment['id'] not in self.claimed:
+                    found[payment['id']] = payment
+        return list(found.values())
+
+    def match(self, fields, window, threshold):
+        """(status, match_type, paymentid, candidate ids, note) for one statement credit"""
+        cents = _cents(fields['amount'])
+        referenced = self.by_references(fields)
+        if referenced:
+            exact = [p for p in referenced if p['cents'] == cents]
+            if len(exact) == 1:
+                self.claimed.add(exact[0]['id'])
+                return 'matched', 'transaction', exact[0]['id'], [], None
+            note = 'reference used by several payments' if exact else 'amount differs from the submitted payment'
+            return 'review', 'transaction', None, [p['id'] for p in (exact or referenced)][:MAX_CANDIDATES], note
+
+        posted, words = fields['posted_date'], _words(fields['payer'], fields['description'])
+        if posted is None:
+            return 'unmatched', None, None, [], None
+        scored = []
+        nearby = (payment for offset in range(-window, window + 1)
+                  for payment in self.by_amount.get((cents, posted + timedelta(days=offset)), ()))
+        for payment in nearby:
+            if payment['id'] in self.claimed:
+                continue
+            score = len(payment['words'] & words) / len(payment['words']) if payment['words'] else 0
+            if score >= threshold:
+                scored.append((score, payment['id']))
+        if not scored:
+            return 'unmatched', None, None, [], None
+        scored.sort(reverse=True)
+        ids = [paymentid for _, paymentid in scored[:MAX_CANDIDATES]]
+        if len(ids) == 1:
+            return 'review', 'fuzzy', ids[0], ids, 'amount, date and payer name match'
+        return 'review', 'fuzzy', None, ids, f'{len(scored)} payments match amount, date and payer name'
+
+
+def _fingerprint(fields, seen):
+    """Stable id of a statement line; repeats within one statement are numbered so each is kept"""
+    key = '|'.join(str(fields[k] or '') for k in ('posted_date', 'amount', 'reference', 'payer', 'description'))
+    seen[key] = seen.get(key, 0) + 1
+    return hashlib.sha256(f'{key}|{seen[key]}'.encode()).hexdigest()
+
+
+def reconcile_statement(stream, kind, config, verifier_id=None, auto_verify=True):
+    """Stream a CSV or OFX statement through the matcher, one chunk per transaction.
+
+    Lines whose reference and amount match exactly one submitted payment are
+    verified in bulk (through verify_payments, in the chunk's transaction);
+    lines with a near match or several candidates are queued for review, and
+    lines already imported from an earlier statement are skipped.
+    """
+    report = ReconciliationReport()
+    pending = PendingPayments()
+    window, threshold = config['RECONCILE_DATE_WINDOW_DAYS'], config['RECONCILE_NAME_THRESHOLD']
+    chunk_size = config['RECONCILE_CHUNK_SIZE']
+    seen, batch = {}, []
+    for line, fields in (read_ofx(stream) if kind == 'ofx' else read_csv(stream)):
+        if isinstance(fields, str):
+            report.fail(line, [fields])
+            continue
+        report.rows += 1
+        if fields['amount'] is None or fields['amount'] <= 0:
+            report.skipped += 1
+            continue
+        batch.append((line, fields, _fingerprint(fields, seen)))
+        if len(batch) >= chunk_size:
+            _commit_chunk(batch, pending, report, window, threshold, verifier_id, auto_verify)
+            batch = []
+    if batch:
+        _commit_chunk(batch, pending, report, window, threshold, verifier_id, auto_verify)
+    return report
+
+
+def _commit_chunk(batch, pending, report, window, threshold, verifier_id, auto_verify):
+    try:
+        known = set(db.session.scalars(select(BankStatementLine.fingerprint).where(
+            BankStatementLine.fingerprint.in_([fingerprint for _, _, fingerprint in batch]))))
+        rows = []
+        for line, fields, fingerprint in batch:
+            if fingerprint in known:
+                report.duplicates += 1
+                continue
+            status, match_type, paymentid, candidates, note = pending.match(fields, window, threshold)
+            if status == 'matched' and not auto_verify:
+                status, candidates, note = 'review', [paymentid], 'reference and amount match'
+            rows.append({'import_id': report.import_id, 'fingerprint': fingerprint,
+                         'posted_date': fields['posted_date'], 'amount': fields['amount'],
+                         'transactionid': fields['reference'][:100] or None,
+                         'payer_name': fields['payer'][:200] or None, 'description': fields['description'] or None,
+                         'status': status, 'match_type': match_type, 'paymentid': paymentid,
+                         'candidate_ids': ','.join(map(str, candidates)) or None, 'note': note,
+                         'reviewed_by': None, 'created_at': datetime.utcnow()})
+
+        exact = [row['paymentid'] for row in rows if row['status'] == 'matched']
+        verified = verify_payments(exact, verifier_id, commit=False) if exact else {}
+        for row in rows:
+            if row['status'] == 'matched' and row['paymentid'] not in verified:
+                # Verified or rejected by an accountant since the payments were loaded
+                row.update(status='review', candidate_ids=str(row['paymentid']), note='payment already processed')
+        if rows:
+            db.session.execute(insert(BankStatementLine), rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        message = f'not imported, batch failed: {str(e).splitlines()[0]}'
+        for line, _, _ in batch:
+            report.fail(line, [message])
+        return
+    for row in rows:
+        if row['status'] == 'matched':
+            report.verified += 1
+        elif row['status'] == 'review':
+            report.review += 1
+        else:
+            report.unmatched += 1
+
+
+# ============= REVIEW QUEUE =============
+def candidates(line):
+    """Payment ids reconciliation offered for a queued line"""
+    return [int(i) for i in (line.candidate_ids or '').split(',') if i]
+
+
+def review_queue(limit=200):
+    """Queued statement lines with their candidate payments, oldest first"""
+    lines = (BankStatementLine.query.filter_by(status='review')
+             .order_by(BankStatementLine.lineid).limit(limit).all())
+    ids = {i for line in lines for i in candidates(line)}
+    payments = {p.paymentid: p for p in Payment.query.options(db.joinedload(Payment.student))
+                .filter(Payment.paymentid.in_(ids))} if ids else {}
+    return [(line, [payments[i] for i in candidates(line) if i in payments]) for line in lines]
+
+
+def confirm_line(line, payment_id, user_id):
+    """Verify the payment an accountant picked for a queued line; returns the room allocated or None.
+
+    Only one of the line's candidates can be picked. Raises ValueError for any
+    other payment, or when the payment is no longer awaiting verification.
+    """
+    if line.status != 'review':
+        raise ValueError('This statement line has already been reviewed')
+    if payment_id not in candidates(line):
+        raise ValueError(f'Payment #{payment_id} was not offered as a match for this statement line')
+    results = verify_payments([payment_id], user_id, commit=False)
+    if payment_id not in results:
+        db.session.rollback()
+        raise ValueError('That payment is no longer awaiting verification')
+    line.status, line.paymentid, line.reviewed_by = 'matched', payment_id, user_id
+    line.match_type = line.match_type or 'manual'
+    db.session.commit()
+    return results[payment_id]
+
+
+def ignore_line(line, user_id):
+    line.status, line.reviewed_by = 'ignored', user_id
+    db.session.commit()
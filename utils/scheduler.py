@@ -0,0 +1,60 @@
+import threading
+
+
+class PeriodicTask:
+    """Runs func(app) every `interval` seconds on a daemon thread, inside an app context"""
+
+    def __init__(self, app, name, interval, func):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        from models import db
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.func(self.app)
+                except Exception as e:
+                    print(f"{self.name} error: {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+def start_periodic(app, name, interval, func):
+    """Register a per-worker background task unless disabled, testing, or interval is 0.
+
+    The thread starts with the worker's first request, so only processes that
+    serve the web app run it; `flask` commands, init_db.py and other scripts
+    that build the app never do.
+    """
+    if not interval or app.testing or not app.config.get('SCHEDULER_ENABLED', True):
+        return None
+    task = PeriodicTask(app, name, interval, func)
+    tasks = app.extensions.setdefault('periodic_tasks', {})
+    if not tasks:
+        lock = threading.Lock()
+
+        @app.before_request
+        def start_periodic_tasks():
+            if app.extensions.get('periodic_tasks_started'):
+                return
+            with lock:
+                if not app.extensions.get('periodic_tasks_started'):
+                    for pending in app.extensions['periodic_tasks'].values():
+                        pending.start()
+                    app.extensions['periodic_tasks_started'] = True
+    tasks[name] = task
+    return task
@@ -0,0 +1,186 @@
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, literal_column, text
+from models import db, Complaint
+
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5(
+        title, description, location, resolutionnotes,
+        content='complaints', content_rowid='complaintid',
+        tokenize='porter unicode61', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_ai AFTER INSERT ON complaints BEGIN
+        INSERT INTO complaints_fts(rowid, title, description, location, resolutionnotes)
+        VALUES (new.complaintid, new.title, new.description, new.location, new.resolutionnotes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_ad AFTER DELETE ON complaints BEGIN
+        INSERT INTO complaints_fts(complaints_fts, rowid, title, description, location, resolutionnotes)
+        VALUES ('delete', old.complaintid, old.title, old.description, old.location, old.resolutionnotes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_au
+        AFTER UPDATE OF title, description, location, resolutionnotes ON complaints BEGIN
+        INSERT INTO complaints_fts(complaints_fts, rowid, title, description, location, resolutionnotes)
+        VALUES ('delete', old.complaintid, old.title, old.description, old.location, old.resolutionnotes);
+        INSERT INTO complaints_fts(rowid, title, description, location, resolutionnotes)
+        VALUES (new.complaintid, new.title, new.description, new.location, new.resolutionnotes);
+    END""",
+]
+# A hit in the title or location outranks one buried in the description
+SQLITE_BM25_WEIGHTS = (10.0, 2.0, 5.0, 1.0)  # title, description, location, resolutionnotes
+
+# A generated column keeps itself in sync; no triggers needed
+POSTGRES_FTS_DDL = [
+    """ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(resolutionnotes, '')), 'D')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_complaints_search ON complaints USING GIN (search_vector)",
+]
+
+FACET_MONTHS = 12
+
+
+def install_search_index(connection, rebuild=False):
+    """Create the complaint full-text and facet indexes (idempotent); rebuild re-indexes existing rows"""
+    for index in Complaint.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'complaints_fts'"
+        ).first()
+        for ddl in SQLITE_FTS_DDL:
+            connection.exec_driver_sql(ddl)
+        if rebuild or not exists:
+            connection.exec_driver_sql("INSERT INTO complaints_fts(complaints_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        for ddl in POSTGRES_FTS_DDL:
+            connection.exec_driver_sql(ddl)
+
+
+@event.listens_for(Complaint.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    install_search_index(connection)
+
+
+def _terms(q):
+    """Words of the query; punctuation and search operators are dropped"""
+    return re.findall(r'\w+', (q or '').lower())[:16]
+
+
+def _text_match(terms):
+    """(restrict, rank, order) for the current dialect, or None for an empty query.
+
+    restrict(query) limits a query over Complaint to the matching rows (cheap,
+    used for counts and facets); rank(query) also makes `order` available for
+    ordering the page of results by relevance.
+    """
+    if not terms:
+        return None
+    if db.engine.dialect.name == 'postgresql':
+        # Every word must match; the last one may be a prefix of a word still being typed
+        tsquery = func.to_tsquery('english', ' & '.join(terms[:-1] + [terms[-1] + ':*']))
+        vector = literal_column('complaints.search_vector')
+        restrict = lambda query: query.filter(vector.op('@@')(tsquery))
+        return restrict, restrict, func.ts_rank_cd(vector, tsquery).desc()
+    if db.engine.dialect.name == 'sqlite':
+        match = ' '.join([f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*'])
+        ids = text('SELECT rowid FROM complaints_fts WHERE complaints_fts MATCH :match').bindparams(match=match)
+        weights = ', '.join(str(w) for w in SQLITE_BM25_WEIGHTS)
+        fts = text(
+            f"SELECT rowid AS complaintid, bm25(complaints_fts, {weights}) AS rank "
+            "FROM complaints_fts WHERE complaints_fts MATCH :match"
+        ).bindparams(match=match).columns(complaintid=db.Integer, rank=db.Float).cte('fts')
+        if sqlite3.sqlite_version_info >= (3, 35):
+            # Run the MATCH once; otherwise the planner may drive from a facet index
+            # and re-run it for every candidate row
+            fts = fts.prefix_with('MATERIALIZED')
+        return (lambda query: query.filter(Complaint.complaintid.in_(ids.columns(rowid=db.Integer))),
+                lambda query: query.join(fts, fts.c.complaintid == Complaint.complaintid),
+                fts.c.rank.asc())
+    # Other databases: plain substring search
+    clauses = [db.or_(Complaint.title.ilike(f'%{t}%'), Complaint.description.ilike(f'%{t}%'),
+                      Complaint.location.ilike(f'%{t}%')) for t in terms]
+    restrict = lambda query: query.filter(*clauses)
+    return restrict, restrict, Complaint.created_at.desc()
+
+
+def _month(column):
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
+
+
+def _filters(category=None, status=None, priority=None, period=None, staff_id=None):
+    filters = {}
+    if category:
+        filters['category'] = Complaint.category == category
+    if status:
+        filters['status'] = Complaint.status == status
+    if priority:
+        filters['priority'] = Complaint.priority == priority
+    if period:
+        filters['period'] = _month(Complaint.created_at) == period
+    if staff_id:
+        filters['staff'] = Complaint.assigned_staff_id == staff_id
+    return filters
+
+
+def search_complaints(q=None, category=None, status=None, priority=None, period=None,
+                      staff_id=None, page=1, per_page=25):
+    """Ranked, paginated complaint search with category/status/month facet counts.
+
+    Returns (pagination, facets). Each facet is counted over the text match and
+    every other active filter, so choosing a status still shows the other statuses.
+    """
+    match = _text_match(_terms(q))
+    filters = _filters(category, status, priority, period, staff_id)
+
+    query = Complaint.query.options(db.joinedload(Complaint.student))
+    count = db.session.query(func.count(Complaint.complaintid))
+    if match is not None:
+        restrict, rank, order = match
+        query = rank(query).order_by(order, Complaint.created_at.desc())
+        count = restrict(count)
+    else:
+        query = query.order_by(Complaint.created_at.desc())
+    for clause in filters.values():
+        query = query.filter(clause)
+        count = count.filter(clause)
+    results = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    results.total = count.scalar()
+
+    facets = {}
+    since = datetime.utcnow().replace(day=1) - timedelta(days=31 * (FACET_MONTHS - 1))
+    for name, column in (('category', Complaint.category), ('status', Complaint.status),
+                         ('period', _month(Complaint.created_at))):
+        facet = db.session.query(column, func.count(Complaint.complaintid)).select_from(Complaint)
+        if match is not None:
+            facet = restrict(facet)
+        for key, clause in filters.items():
+            if key != name:
+                facet = facet.filter(clause)
+        if name == 'period':
+            facet = facet.filter(Complaint.created_at >= since)
+        rows = facet.group_by(column).all()
+        if name == 'period':
+            rows.sort(reverse=True)
+        else:
+            rows.sort(key=lambda row: -row[1])
+        facets[name] = [(value, n) for value, n in rows if value]
+    return results, facets
+
+
+def search_args(args):
+    """search_complaints() keyword arguments from a request's query string"""
+    return {
+        'q': args.get('q', '').strip() or None,
+        'category': args.get('category') or None,
+        'status': args.get('status') or None,
+        'priority': args.get('priority') or None,
+        'period': args.get('period') or None,
+        'page': args.get('page', 1, type=int),
+    }
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, update
+from config import Config
+from models import db, Complaint, PRIORITY_RANKS
+from utils.notifications import notify_role
+
+# Escalation raises a breached complaint one priority step, up to urgent
+ESCALATE_TO = {'low': 'medium', 'medium': 'high', 'high': 'urgent', 'urgent': 'urgent'}
+BACKFILL_BATCH = 1000
+
+
+def _sla_hours():
+    return current_app.config['SLA_HOURS'] if has_app_context() else Config.SLA_HOURS
+
+
+def due_at(created_at, priority):
+    """Resolution deadline for a complaint lodged at created_at with this priority"""
+    hours = _sla_hours().get(priority, _sla_hours()['medium'])
+    return created_at + timedelta(hours=hours)
+
+
+@event.listens_for(Complaint, 'before_insert')
+def _set_due_at(mapper, connection, target):
+    if target.due_at is None:
+        target.due_at = due_at(target.created_at or datetime.utcnow(), target.priority or 'medium')
+
+
+@event.listens_for(Complaint, 'before_update')
+def _reset_due_at(mapper, connection, target):
+    # A re-prioritised complaint gets the new priority's deadline, unless already escalated
+    if target.escalated_at is None and inspect(target).attrs.priority.history.has_changes():
+        target.due_at = due_at(target.created_at or datetime.utcnow(), target.priority)
+
+
+def escalate_breaches(config, now=None):
+    """Escalate one batch of complaints past their deadline; returns the number escalated.
+
+    ix_complaints_sla_pending holds only complaints still on the clock, ordered
+    by deadline, so it acts as the timer heap: each tick reads just the due
+    entries and escalated or resolved complaints drop out of it.
+    """
+    now = now or datetime.utcnow()
+    due = db.session.execute(
+        select(Complaint.complaintid, Complaint.priority)
+        .where(Complaint.escalated_at.is_(None), Complaint.resolvedat.is_(None),
+               Complaint.due_at <= now)
+        .order_by(Complaint.due_at)
+        .limit(config['SLA_BATCH_SIZE'])
+    ).all()
+    if not due:
+        return 0
+
+    # One conditional UPDATE per target priority; another worker's tick may have claimed some
+    by_priority = {}
+    for complaintid, priority in due:
+        by_priority.setdefault(ESCALATE_TO.get(priority, 'high'), []).append(complaintid)
+    escalated = 0
+    for priority, ids in by_priority.items():
+        escalated += len(db.session.scalars(
+            update(Complaint)
+            .where(Complaint.complaintid.in_(ids), Complaint.escalated_at.is_(None))
+            .values(escalated_at=now, priority=priority, priority_rank=PRIORITY_RANKS[priority],
+                    updated_at=now)
+            .returning(Complaint.complaintid)
+            .execution_options(synchronize_session=False)
+        ).all())
+
+    if escalated:
+        notify_role('warden', 'sla_breach', escalated, link='/warden/complaints')
+    db.session.commit()
+    return escalated
+
+
+def backfill_due_dates(connection):
+    """Set due_at on unresolved complaints lodged before SLAs existed; returns rows updated"""
+    table = Complaint.__table__
+    rows = connection.execute(
+        select(table.c.complaintid, table.c.created_at, table.c.priority)
+        .where(table.c.due_at.is_(None), table.c.resolvedat.is_(None))
+    ).all()
+    stmt = update(table).where(table.c.complaintid == db.bindparam('id')).values(due_at=db.bindparam('due'))
+    for start in range(0, len(rows), BACKFILL_BATCH):
+        connection.execute(stmt, [
+            {'id': complaintid, 'due': due_at(created_at or datetime.utcnow(), (priority or 'medium').lower())}
+            for complaintid, created_at, priority in rows[start:start + BACKFILL_BATCH]
+        ])
+    return len(rows)
+
+
+def init_sla(app):
+    from utils.scheduler import start_periodic
+    start_periodic(app, 'sla-escalation', app.config['SLA_CHECK_INTERVAL'],
+                   lambda app: escalate_breaches(app.config))
@@ -0,0 +1,51 @@
+import sqlite3
+from sqlalchemy import event
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements for the production SQLite profile"""
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA synchronous = {config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 0))}",
+        f"PRAGMA cache_size = {int(config.get('SQLITE_CACHE_SIZE', -2000))}",
+    ]
+    if config.get('SQLITE_WAL', True):
+        # Readers no longer block the writer (and vice versa); persists in the file
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, config):
+    """Run the profile's PRAGMAs on a raw sqlite3 connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas(config):
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def sqlite_engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for SQLite: let the driver wait for locks too"""
+    return {
+        'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000},
+    }
+
+
+def install_sqlite_hooks(engine, config):
+    """Apply the PRAGMA profile to every new pooled connection"""
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            apply_pragmas(dbapi_connection, config)
+
+
+def run_maintenance(engine, checkpoint='PASSIVE'):
+    """Checkpoint the WAL back into the main file and refresh planner statistics"""
+    with engine.connect() as conn:
+        busy, log_frames, checkpointed = conn.exec_driver_sql(
+            f'PRAGMA wal_checkpoint({checkpoint})'
+        ).one()
+        conn.exec_driver_sql('PRAGMA optimize')
+    return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
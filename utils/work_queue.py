@@ -0,0 +1,96 @@
+from sqlalchemy import case, func, update
+from models import db, Complaint, MaintenanceStaff, PRIORITY_RANKS
+
+# Statuses of complaints that sit in a staff member's queue
+QUEUE_STATUSES = ('assigned', 'in_progress')
+# Statuses that need no more work (a merged complaint is tracked through its original)
+CLOSED_STATUSES = ('resolved', 'merged')
+# 'urgent' and 'high' complaints count as urgent issues
+URGENT_RANK = PRIORITY_RANKS['high']
+
+
+def queue_order():
+    return (Complaint.priority_rank.asc(), Complaint.created_at.asc())
+
+
+def status_counts(start_of_day):
+    """Every dashboard stat from one grouped query instead of loading complaint lists"""
+    rows = db.session.query(
+        Complaint.status,
+        func.count(Complaint.complaintid),
+        func.sum(case((Complaint.assigned_staff_id.is_(None), 1), else_=0)),
+        func.sum(case((Complaint.priority_rank <= URGENT_RANK, 1), else_=0)),
+        func.sum(case((Complaint.resolvedat >= start_of_day, 1), else_=0)),
+    ).group_by(Complaint.status).all()
+
+    by_status = {status: n for status, n, *_ in rows}
+    open_rows = [r for r in rows if r[0] not in CLOSED_STATUSES]
+    return dict(
+        total_complaints_count=sum(by_status.values()),
+        resolved_count=by_status.get('resolved', 0),
+        resolved_today_count=sum(r[4] or 0 for r in rows if r[0] == 'resolved'),
+        assigned_count=by_status.get('assigned', 0),
+        in_progress_count=by_status.get('in_progress', 0),
+        my_assigned_count=sum(by_status.get(s, 0) for s in QUEUE_STATUSES),
+        unassigned_count=sum(r[2] or 0 for r in open_rows),
+        urgent_count=sum(r[3] or 0 for r in open_rows),
+    )
+
+
+def staff_loads():
+    """Active maintenance staff with the number of complaints in each one's queue"""
+    open_count = (db.session.query(Complaint.assigned_staff_id, func.count().label('n'))
+                  .filter(Complaint.status.in_(QUEUE_STATUSES))
+                  .group_by(Complaint.assigned_staff_id)
+                  .subquery())
+    return (db.session.query(MaintenanceStaff, func.coalesce(open_count.c.n, 0))
+            .outerjoin(open_count, open_count.c.assigned_staff_id == MaintenanceStaff.staff_id)
+            .filter(MaintenanceStaff.is_active.is_(True))
+            .order_by(MaintenanceStaff.specialization, MaintenanceStaff.name)
+            .all())
+
+
+def staff_queue(staff_id, page=1, per_page=20):
+    """One page of a staff member's queue, most urgent then oldest first"""
+    return (Complaint.query
+            .filter(Complaint.assigned_staff_id == staff_id,
+                    Complaint.status.in_(QUEUE_STATUSES))
+            .order_by(*queue_order())
+            .paginate(page=page, per_page=per_page, error_out=False))
+
+
+def assigned_queue(page=1, per_page=20):
+    """Assigned and in-progress complaints across all staff, most urgent first"""
+    return (Complaint.query
+            .filter(Complaint.status.in_(QUEUE_STATUSES))
+            .order_by(*queue_order())
+            .paginate(page=page, per_page=per_page, error_out=False))
+
+
+def next_up(limit=10):
+    """Head of the combined queue, without the count query a page needs"""
+    return (Complaint.query
+            .filter(Complaint.status.in_(QUEUE_STATUSES))
+            .order_by(*queue_order())
+            .limit(limit)
+            .all())
+
+
+def urgent_queue(page=1, per_page=20):
+    return (Complaint.query
+            .filter(Complaint.priority_rank <= URGENT_RANK,
+                    Complaint.status.notin_(CLOSED_STATUSES))
+            .order_by(*queue_order())
+            .paginate(page=page, per_page=per_page, error_out=False))
+
+
+def normalize_priorities(connection):
+    """Lowercase legacy priorities ('High') and set priority_rank on existing rows"""
+    table = Complaint.__table__
+    lowered = func.lower(func.trim(table.c.priority))
+    updated = connection.execute(update(table).values(
+        priority=case(*((lowered == name, name) for name in PRIORITY_RANKS), else_='medium'),
+        priority_rank=case(*((lowered == name, rank) for name, rank in PRIORITY_RANKS.items()),
+                           else_=PRIORITY_RANKS['medium']),
+    )).rowcount
+    return updated